@@ -2,7 +2,8 @@ import streamlit as st
 import os
 import tempfile
 import json
-from engine import EvaluadorEngine
+import threading
+from pool_evaluadores import obtener_evaluador
 
 st.set_page_config(
     page_title="Evaluador Universal de Exámenes Orales",
@@ -42,13 +43,27 @@ with st.sidebar:
     st.subheader("🤖 Modelo de Evaluación")
     proveedor_llm = st.selectbox(
         "Proveedor LLM",
-        options=["groq", "google"],
+        options=["groq", "google", "multi"],
         format_func=lambda x: {
             "groq": "🚀 Groq (Llama 3.3 70B)",
-            "google": "🔷 Google AI (Gemini 1.5 Flash)"
+            "google": "🔷 Google AI (Gemini 1.5 Flash)",
+            "multi": "🔀 Groq + Gemini (respaldo automático)"
         }.get(x, x),
         index=0,
-        help="Selecciona el modelo para evaluar. Groq siempre se usa para transcripción."
+        help="Selecciona el modelo para evaluar. "
+             "Con ambos proveedores, si uno tarda o falla se usa la respuesta del otro."
+    )
+    
+    transcriptor = st.selectbox(
+        "Transcripción",
+        options=["groq", "local", "balanceado"],
+        format_func=lambda x: {
+            "groq": "☁️ Whisper en Groq",
+            "local": "💻 Whisper local (CPU, el audio no sale del equipo)",
+            "balanceado": "⚖️ Local + Groq (reparto según carga)"
+        }.get(x, x),
+        index=0,
+        help="Whisper local requiere `pip install faster-whisper`; el modelo se descarga la primera vez"
     )
     
     st.divider()
@@ -65,7 +80,7 @@ with st.sidebar:
         st.success("✅ Groq API Key configurada")
     
     google_api_key = os.getenv("GOOGLE_API_KEY")
-    if proveedor_llm == "google":
+    if proveedor_llm in ("google", "multi"):
         if not google_api_key:
             st.warning("⚠️ GOOGLE_API_KEY requerida para Gemini")
             google_key_input = st.text_input("Google API Key:", type="password", key="google_key")
@@ -75,6 +90,18 @@ with st.sidebar:
         else:
             st.success("✅ Google API Key configurada")
     
+    # El evaluador se crea y precalienta mientras se llena el formulario, y se reutiliza entre reruns y sesiones
+    if groq_api_key and (proveedor_llm == "groq" or google_api_key):
+        try:
+            obtener_evaluador(
+                api_key=groq_api_key,
+                proveedor=proveedor_llm,
+                google_api_key=google_api_key if proveedor_llm in ("google", "multi") else None,
+                transcriptor=transcriptor
+            )
+        except (ValueError, ImportError) as e:
+            st.error(f"❌ {e}")
+    
     st.divider()
     
     st.subheader("🔧 Opciones de Procesamiento")
@@ -85,6 +112,32 @@ with st.sidebar:
         help="Elimina muletillas como 'eh', 'mmm', 'este' antes de evaluar"
     )
     
+    modo_limpieza = st.selectbox(
+        "Modo de limpieza",
+        options=["auto", "local", "llm"],
+        format_func=lambda x: {
+            "auto": "🤖 Automático (local + LLM si hay errores)",
+            "local": "⚡ Solo local (reglas)",
+            "llm": "🧠 Siempre con LLM"
+        }.get(x, x),
+        index=0,
+        disabled=not limpiar_transcripcion,
+        help="La limpieza local quita muletillas y repeticiones en milisegundos; el LLM solo se usa si se detectan posibles errores de transcripción"
+    )
+    
+    modo_evaluacion = st.selectbox(
+        "Modo de evaluación",
+        options=["completo", "rapido", "por_preguntas"],
+        format_func=lambda x: {
+            "completo": "🔬 Completo (4 pasos)",
+            "rapido": "⚡ Rápido (1 llamada)",
+            "por_preguntas": "🧩 Por preguntas (en paralelo)"
+        }.get(x, x),
+        index=0,
+        help="El modo rápido analiza, califica y genera el feedback en una sola llamada al modelo. "
+             "El modo por preguntas divide el examen según los ítems de la rúbrica y califica cada pregunta a la vez"
+    )
+    
     idioma_audio = st.selectbox(
         "Idioma del audio",
         options=["es", "en", "fr", "de", "pt", "it"],
@@ -175,7 +228,7 @@ with col_audio1:
     audio_file = st.file_uploader(
         "Sube el archivo de audio del examen",
         type=["mp3", "wav", "m4a", "ogg", "flac", "webm"],
-        help="Formatos: MP3, WAV, M4A, OGG, FLAC, WEBM (máx. 25MB)"
+        help="Formatos: MP3, WAV, M4A, OGG, FLAC, WEBM. Los audios de más de 25MB se dividen en segmentos"
     )
 
 with col_audio2:
@@ -190,7 +243,7 @@ if audio_file is not None:
         st.caption(f"� Archivo: {audio_file.name}")
     with col_info2:
         if file_size_mb > 25:
-            st.warning(f"⚠️ {file_size_mb:.1f} MB - Excede límite de 25MB")
+            st.info(f"✂️ {file_size_mb:.1f} MB - Se transcribirá por segmentos en paralelo")
         else:
             st.caption(f"📊 Tamaño: {file_size_mb:.2f} MB")
 
@@ -205,7 +258,7 @@ if st.button("🚀 Evaluar Examen", type="primary", use_container_width=True):
         st.error("❌ Sube un archivo de audio")
     elif not groq_api_key:
         st.error("❌ Configura tu GROQ_API_KEY (requerida para transcripción)")
-    elif proveedor_llm == "google" and not google_api_key:
+    elif proveedor_llm in ("google", "multi") and not google_api_key:
         st.error("❌ Configura tu GOOGLE_API_KEY para usar Gemini")
     else:
         try:
@@ -213,31 +266,69 @@ if st.button("🚀 Evaluar Examen", type="primary", use_container_width=True):
                 tmp_file.write(audio_file.getvalue())
                 tmp_file_path = tmp_file.name
             
-            evaluador = EvaluadorEngine(
+            evaluador = obtener_evaluador(
                 api_key=groq_api_key,
                 proveedor=proveedor_llm,
-                google_api_key=google_api_key if proveedor_llm == "google" else None
+                google_api_key=google_api_key if proveedor_llm in ("google", "multi") else None,
+                transcriptor=transcriptor
             )
             
             with st.status("🔄 Evaluando examen...", expanded=True) as status:
-                st.write("🎧 **Paso 1/4**: Transcribiendo audio con Whisper...")
+                st.write("🎧 **Paso 1/6**: Transcribiendo audio con Whisper...")
+                hilo_script = threading.get_ident()
+                avance = {}
+                
+                def mostrar_parcial(datos):
+                    # Campos que llegan mientras el modelo aún está respondiendo
+                    if datos["ruta"] == "calificacion_final":
+                        st.write(f"⏳ Calificación preliminar: **{datos['valor']}/10**")
+                    elif datos["ruta"] == "feedback_alumno.resumen":
+                        st.write(f"💬 {datos['valor']}")
+                    elif datos["ruta"].startswith("conceptos_correctos."):
+                        if "conceptos" not in avance:
+                            avance["conceptos"] = st.empty()
+                        avance["conceptos"].write(f"🔎 Concepto identificado: {datos['valor']}")
+                
+                def mostrar_progreso(evento):
+                    datos = evento.datos
+                    if evento.etapa == "parcial":
+                        # En modo multi los campos pueden llegar desde otro hilo, donde Streamlit no dibuja
+                        if threading.get_ident() == hilo_script:
+                            mostrar_parcial(datos)
+                    elif evento.etapa == "transcripcion":
+                        origen = " (desde caché)" if datos.get("desde_cache") else ""
+                        st.write(f"✅ Transcripción lista{origen}")
+                        with st.expander("🎤 Ver transcripción"):
+                            st.write(datos.get("transcripcion", ""))
+                        st.write("✨ **Paso 2/6**: Limpiando transcripción...")
+                    elif evento.etapa == "limpieza":
+                        st.write("✅ Transcripción limpia" if datos.get("limpiada") else "⏭️ Limpieza omitida")
+                        st.write("🔍 **Paso 3/6**: Extrayendo conceptos clave...")
+                    elif evento.etapa == "conceptos":
+                        st.write(f"✅ {len(datos.get('conceptos_principales', []))} conceptos principales")
+                        st.write("📊 **Paso 4/6**: Analizando respuesta del alumno...")
+                    elif evento.etapa == "analisis":
+                        st.write(f"✅ Análisis completado: {len(datos.get('conceptos_correctos', []))} conceptos correctos")
+                        st.write("🎯 **Paso 5/6**: Calculando calificación...")
+                    elif evento.etapa == "calificacion":
+                        st.write(f"✅ Calificación: **{datos.get('calificacion_final', 'N/A')}/10**")
+                        st.write("💬 **Paso 6/6**: Generando feedback...")
+                        status.update(label=f"🔄 Calificación {datos.get('calificacion_final', 'N/A')}/10 — generando feedback...")
+                    elif evento.etapa == "feedback":
+                        st.write("✅ Feedback generado")
                 
                 resultado = evaluador.proceso_completo(
                     tmp_file_path,
                     material_referencia,
                     rubrica,
                     limpiar=limpiar_transcripcion,
-                    idioma=idioma_audio
+                    idioma=idioma_audio,
+                    modo=modo_evaluacion,
+                    modo_limpieza=modo_limpieza,
+                    al_progresar=mostrar_progreso
                 )
                 
                 if resultado["success"]:
-                    st.write("✅ Transcripción completada")
-                    st.write("🔍 **Paso 2/4**: Extrayendo conceptos clave...")
-                    st.write("✅ Conceptos extraídos")
-                    st.write("📊 **Paso 3/4**: Analizando respuesta del alumno...")
-                    st.write("✅ Análisis completado")
-                    st.write("🎯 **Paso 4/4**: Calculando calificación y generando feedback...")
-                    st.write("✅ Evaluación finalizada")
                     status.update(label="✅ Evaluación completada", state="complete")
                 else:
                     status.update(label="❌ Error en el proceso", state="error")
@@ -493,6 +584,13 @@ if st.session_state.evaluacion_resultado:
             else:
                 st.success("✅ No se omitieron conceptos importantes")
         
+        sin_evidencia = analisis.get("conceptos_sin_evidencia", [])
+        if sin_evidencia:
+            st.subheader("🔎 Conceptos sin respaldo en la transcripción")
+            st.caption("El modelo los marcó como mencionados, pero no aparecen en lo que dijo el alumno")
+            for c in sin_evidencia:
+                st.warning(f"? {c}")
+        
         citas = evaluacion.get("citas_destacadas", [])
         if citas:
             st.subheader("💬 Citas Destacadas del Alumno")
@@ -544,6 +642,27 @@ if st.session_state.evaluacion_resultado:
             label_visibility="collapsed"
         )
         
+        metricas = resultado.get("metricas_rendimiento")
+        if metricas:
+            with st.expander("⏱️ Métricas de Rendimiento"):
+                col_r1, col_r2, col_r3 = st.columns(3)
+                col_r1.metric("Tiempo total", f"{metricas['duracion_total_s']:.1f}s")
+                col_r2.metric("Tokens (entrada / salida)", f"{metricas['tokens_prompt']} / {metricas['tokens_completion']}")
+                col_r3.metric("Reintentos", metricas.get("reintentos", 0))
+                
+                st.table([
+                    {
+                        "Etapa": e["etapa"],
+                        "Proveedor": e["proveedor"],
+                        "Modelo": e["modelo"],
+                        "Duración (s)": round(e["duracion_s"], 2),
+                        "Tokens entrada": e["tokens_prompt"],
+                        "Tokens salida": e["tokens_completion"],
+                        "Resultado": e["resultado"]
+                    }
+                    for e in metricas["etapas"]
+                ])
+        
         with st.expander("📥 Exportar Evaluación Completa (JSON)"):
             st.json(evaluacion)
             st.download_button(
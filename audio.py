@@ -0,0 +1,263 @@
+"""
+Utilidades de audio para la transcripción
+Preprocesado antes de subir (mono 16 kHz, silencios recortados, códec compacto), división de
+grabaciones largas en segmentos solapados y unión de sus transcripciones
+"""
+import os
+import re
+import bisect
+import logging
+import tempfile
+import unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from pydub import AudioSegment
+    PYDUB_AVAILABLE = True
+except ImportError:
+    PYDUB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Límite de subida de la API de Whisper en Groq
+LIMITE_BYTES_WHISPER = 25 * 1024 * 1024
+
+# Preprocesado: Whisper remuestrea a 16 kHz mono de todos modos
+FRECUENCIA_WHISPER = 16000
+# VAD por energía: marcos de 30 ms con voz si superan el volumen medio del audio menos 16 dB
+MARCO_VAD_MS = 30
+UMBRAL_RELATIVO_DB = -16.0
+# Solo se recortan los silencios de al menos 0.7 s; cada pausa queda en 0.3 s para que
+# Whisper siga viendo dónde acaban las frases
+SILENCIO_MINIMO_MS = 700
+MARGEN_VOZ_MS = 200
+PAUSA_CONSERVADA_MS = 300
+# Opus a 24 kbps basta para voz; MP3 si ffmpeg no tiene libopus
+CODEC_PREPROCESADO = {"format": "ogg", "codec": "libopus", "bitrate": "24k"}
+CODEC_ALTERNATIVO = {"format": "mp3", "bitrate": "32k"}
+
+
+def detectar_voz(
+    audio: "AudioSegment",
+    marco_ms: int = MARCO_VAD_MS,
+    umbral_relativo_db: float = UMBRAL_RELATIVO_DB,
+    silencio_minimo_ms: int = SILENCIO_MINIMO_MS,
+    margen_ms: int = MARGEN_VOZ_MS
+) -> List[Tuple[int, int]]:
+    """
+    Tramos (inicio, fin) en ms con voz. Los silencios más cortos que `silencio_minimo_ms`
+    quedan dentro del tramo y cada tramo se amplía `margen_ms` para no cortar sílabas
+    """
+    if audio.rms == 0:
+        return []
+    umbral = audio.max_possible_amplitude * 10 ** ((audio.dBFS + umbral_relativo_db) / 20)
+
+    tramos: List[List[int]] = []
+    for inicio in range(0, len(audio), marco_ms):
+        if audio[inicio:inicio + marco_ms].rms <= umbral:
+            continue
+        fin = min(inicio + marco_ms, len(audio))
+        if tramos and inicio - tramos[-1][1] < silencio_minimo_ms:
+            tramos[-1][1] = fin
+        else:
+            tramos.append([inicio, fin])
+
+    resultado: List[Tuple[int, int]] = []
+    for inicio, fin in tramos:
+        inicio, fin = max(0, inicio - margen_ms), min(len(audio), fin + margen_ms)
+        if resultado and inicio <= resultado[-1][1]:
+            resultado[-1] = (resultado[-1][0], fin)
+        else:
+            resultado.append((inicio, fin))
+    return resultado
+
+
+def _exportar(audio: "AudioSegment", base: str) -> str:
+    for opciones in (CODEC_PREPROCESADO, CODEC_ALTERNATIVO):
+        ruta = f"{base}.{opciones['format']}"
+        try:
+            audio.export(ruta, **opciones)
+            return ruta
+        except Exception as e:
+            if opciones is CODEC_ALTERNATIVO:
+                raise
+            logger.debug(f"No se pudo codificar con {opciones.get('codec')}, se usa MP3: {e}")
+
+
+def preprocesar_audio(
+    ruta_audio: str,
+    directorio: Optional[str] = None,
+    pausa_ms: int = PAUSA_CONSERVADA_MS
+) -> Dict[str, Any]:
+    """
+    Reduce el audio antes de transcribirlo: mono 16 kHz, sin silencios al principio ni al final,
+    pausas largas acortadas a `pausa_ms` y recodificado con un códec compacto.
+    Devuelve {"ruta", "mapa", "duracion_original", "duracion", "bytes_original", "bytes"};
+    con `mapa` los tiempos de la transcripción se llevan al audio original (remapear_segmentos)
+    """
+    if not PYDUB_AVAILABLE:
+        raise ImportError("pydub no está instalado. Ejecuta: pip install pydub")
+
+    audio = AudioSegment.from_file(ruta_audio)
+    audio = audio.set_channels(1).set_frame_rate(FRECUENCIA_WHISPER).set_sample_width(2)
+    tramos = detectar_voz(audio) or [(0, len(audio))]
+
+    pausa = AudioSegment.silent(pausa_ms, frame_rate=FRECUENCIA_WHISPER).raw_data
+    piezas: List[bytes] = []
+    mapa: List[Dict[str, float]] = []
+    posicion = 0
+    for inicio, fin in tramos:
+        if piezas:
+            piezas.append(pausa)
+            posicion += pausa_ms
+        piezas.append(audio[inicio:fin].raw_data)
+        mapa.append({"inicio": posicion / 1000, "fin": (posicion + fin - inicio) / 1000, "original": inicio / 1000})
+        posicion += fin - inicio
+
+    reducido = AudioSegment(data=b"".join(piezas), sample_width=2, frame_rate=FRECUENCIA_WHISPER, channels=1)
+    directorio = directorio or tempfile.mkdtemp(prefix="evaluador_preprocesado_")
+    ruta = _exportar(reducido, os.path.join(directorio, "preprocesado"))
+
+    return {
+        "ruta": ruta,
+        "mapa": mapa,
+        "duracion_original": round(len(audio) / 1000, 2),
+        "duracion": round(len(reducido) / 1000, 2),
+        "bytes_original": os.path.getsize(ruta_audio),
+        "bytes": os.path.getsize(ruta)
+    }
+
+
+def mapear_tiempo(mapa: List[Dict[str, float]], segundo: float, inicios: Optional[List[float]] = None) -> float:
+    """Segundo del audio preprocesado -> segundo del audio original. En una pausa acortada, su inicio"""
+    if not mapa:
+        return segundo
+    inicios = inicios or [tramo["inicio"] for tramo in mapa]
+    tramo = mapa[max(bisect.bisect_right(inicios, segundo) - 1, 0)]
+    desplazamiento = min(max(segundo - tramo["inicio"], 0.0), tramo["fin"] - tramo["inicio"])
+    return round(tramo["original"] + desplazamiento, 2)
+
+
+def remapear_segmentos(segmentos: List[Dict[str, Any]], mapa: List[Dict[str, float]]) -> List[Dict[str, Any]]:
+    """Segmentos normalizados con los tiempos del audio original"""
+    inicios = [tramo["inicio"] for tramo in mapa]
+    return [
+        {**s, "inicio": mapear_tiempo(mapa, s["inicio"], inicios), "fin": mapear_tiempo(mapa, s["fin"], inicios)}
+        for s in segmentos
+    ]
+
+
+def dividir_audio(
+    ruta_audio: str,
+    duracion_segmento: float = 300.0,
+    solape: float = 5.0,
+    directorio: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Divide el audio en segmentos solapados exportados como MP3 mono de 16 kHz"""
+    if not PYDUB_AVAILABLE:
+        raise ImportError("pydub no está instalado. Ejecuta: pip install pydub")
+    if solape >= duracion_segmento:
+        raise ValueError("El solape debe ser menor que la duración del segmento")
+
+    audio = AudioSegment.from_file(ruta_audio)
+    # Whisper trabaja a 16 kHz mono: reducir aquí abarata la subida de cada segmento
+    audio = audio.set_channels(1).set_frame_rate(16000)
+
+    directorio = directorio or tempfile.mkdtemp(prefix="evaluador_segmentos_")
+    duracion_total = len(audio) / 1000.0
+    paso = duracion_segmento - solape
+
+    segmentos = []
+    inicio = 0.0
+    while inicio < duracion_total:
+        fin = min(inicio + duracion_segmento, duracion_total)
+        ruta = os.path.join(directorio, f"segmento_{len(segmentos):03d}.mp3")
+        audio[int(inicio * 1000):int(fin * 1000)].export(ruta, format="mp3", bitrate="64k")
+        segmentos.append({"ruta": ruta, "inicio": inicio, "fin": fin})
+        if fin >= duracion_total:
+            break
+        inicio += paso
+
+    return segmentos
+
+
+def _campo(segmento: Any, nombre: str, defecto: Any = None) -> Any:
+    if isinstance(segmento, dict):
+        return segmento.get(nombre, defecto)
+    return getattr(segmento, nombre, defecto)
+
+
+def normalizar_segmentos(segmentos: Optional[List[Any]], desplazamiento: float = 0.0) -> List[Dict[str, Any]]:
+    """Convierte los segmentos de Whisper a dicts con tiempos absolutos"""
+    resultado = []
+    for segmento in segmentos or []:
+        texto = (_campo(segmento, "text", "") or "").strip()
+        if not texto:
+            continue
+        resultado.append({
+            "inicio": round(float(_campo(segmento, "start", 0.0)) + desplazamiento, 2),
+            "fin": round(float(_campo(segmento, "end", 0.0)) + desplazamiento, 2),
+            "texto": texto
+        })
+    return resultado
+
+
+def _normalizar_palabra(palabra: str) -> str:
+    palabra = unicodedata.normalize("NFKD", palabra.lower())
+    palabra = "".join(c for c in palabra if not unicodedata.combining(c))
+    return re.sub(r"[^\w]", "", palabra)
+
+
+def quitar_solape_texto(anterior: str, siguiente: str, max_palabras: int = 40) -> str:
+    """Elimina del inicio de `siguiente` las palabras que repiten el final de `anterior`"""
+    previas = [_normalizar_palabra(p) for p in anterior.split()[-max_palabras:]]
+    palabras = siguiente.split()
+    nuevas = [_normalizar_palabra(p) for p in palabras[:max_palabras]]
+
+    for n in range(min(len(previas), len(nuevas)), 0, -1):
+        # Una sola palabra repetida solo cuenta si no es una palabra corta común
+        if n == 1 and len(nuevas[0]) < 4:
+            break
+        if previas[-n:] == nuevas[:n]:
+            return " ".join(palabras[n:])
+    return siguiente
+
+
+def unir_transcripciones(partes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Une las transcripciones de segmentos solapados.
+    Cada parte: {"inicio", "fin", "texto", "segmentos"} con segmentos en tiempo absoluto.
+    De cada parte se descartan los segmentos ya cubiertos por la anterior y los que
+    empiezan después de la mitad del solape con la siguiente; el texto repetido se elimina.
+    """
+    partes = sorted(partes, key=lambda p: p["inicio"])
+    texto_total = ""
+    segmentos_total: List[Dict[str, Any]] = []
+    ultimo_fin = float("-inf")
+
+    for i, parte in enumerate(partes):
+        corte_fin = None
+        if i < len(partes) - 1:
+            corte_fin = (partes[i + 1]["inicio"] + parte["fin"]) / 2
+
+        segmentos = parte.get("segmentos") or []
+        if segmentos:
+            elegidos = [
+                s for s in segmentos
+                if s["fin"] > ultimo_fin + 0.25
+                and (corte_fin is None or s["inicio"] < corte_fin)
+            ]
+            if elegidos:
+                ultimo_fin = max(s["fin"] for s in elegidos)
+            texto = " ".join(s["texto"] for s in elegidos)
+            segmentos_total.extend(elegidos)
+        else:
+            texto = parte.get("texto", "")
+
+        if texto_total:
+            texto = quitar_solape_texto(texto_total, texto)
+            texto_total = f"{texto_total} {texto}".strip()
+        else:
+            texto_total = texto.strip()
+
+    return {"texto": texto_total, "segmentos": segmentos_total}
@@ -0,0 +1,551 @@
+"""
+Backends de transcripción y de LLM
+El motor solo conoce dos operaciones: "transcribir" un audio y "completar" un prompt.
+Cada proveedor (Groq, Gemini, Whisper local con CTranslate2) las implementa aquí con su SDK
+y devuelve resultados normalizados; el ritmo y los reintentos siguen en el planificador
+"""
+import os
+import asyncio
+import inspect
+import logging
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Iterator, AsyncIterator, Protocol, Tuple, runtime_checkable
+
+from audio import LIMITE_BYTES_WHISPER
+
+try:
+    from groq import Groq, AsyncGroq
+    GROQ_AVAILABLE = True
+except ImportError:
+    GROQ_AVAILABLE = False
+
+try:
+    import google.generativeai as genai
+    GOOGLE_AI_AVAILABLE = True
+except ImportError:
+    GOOGLE_AI_AVAILABLE = False
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    from faster_whisper import WhisperModel
+    FASTER_WHISPER_AVAILABLE = True
+except ImportError:
+    FASTER_WHISPER_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MODELOS_LLM = {"groq": "llama-3.3-70b-versatile", "google": "gemini-1.5-flash"}
+MODELO_WHISPER = "whisper-large-v3"
+# "balanceado" reparte los audios entre Whisper local y Groq según la carga de cada uno
+TRANSCRIPTORES = ("groq", "local", "balanceado")
+
+
+@dataclass
+class SolicitudLLM:
+    system_prompt: str
+    user_prompt: str
+    temperature: float = 0.1
+    max_tokens: int = 4000
+    # Modo JSON del proveedor: la respuesta es un objeto JSON sin texto alrededor
+    formato_json: bool = False
+
+
+@dataclass
+class RespuestaLLM:
+    texto: str
+    tokens_prompt: int = 0
+    tokens_completion: int = 0
+
+
+@dataclass
+class FragmentoLLM:
+    """Trozo de una respuesta transmitida; el uso de tokens llega solo en el último"""
+    texto: str = ""
+    tokens_prompt: Optional[int] = None
+    tokens_completion: Optional[int] = None
+
+
+@dataclass
+class RespuestaTranscripcion:
+    texto: str
+    duracion: Optional[float] = None
+    # Segmentos de Whisper como dicts {"start", "end", "text"}
+    segmentos: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@runtime_checkable
+class BackendLLM(Protocol):
+    nombre: str
+    modelo: str
+    # Recurso del planificador que limita su ritmo
+    recurso: str
+
+    def completar(self, solicitud: SolicitudLLM) -> RespuestaLLM: ...
+
+    def transmitir(self, solicitud: SolicitudLLM) -> Iterator[FragmentoLLM]: ...
+
+    async def acompletar(self, solicitud: SolicitudLLM) -> RespuestaLLM: ...
+
+    def atransmitir(self, solicitud: SolicitudLLM) -> AsyncIterator[FragmentoLLM]: ...
+
+    def calentar(self): ...
+
+    def cerrar(self): ...
+
+
+@runtime_checkable
+class BackendTranscripcion(Protocol):
+    nombre: str
+    modelo: str
+    recurso: str
+    # Tamaño máximo de archivo que acepta (None: sin límite); por encima se segmenta el audio
+    limite_bytes: Optional[int]
+
+    def transcribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion: ...
+
+    async def atranscribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion: ...
+
+    def calentar(self): ...
+
+    def cerrar(self): ...
+
+
+def _limites_http() -> Optional["httpx.Limits"]:
+    # Conexiones persistentes: la conexión TLS se reutiliza entre etapas y evaluaciones
+    if not HTTPX_AVAILABLE:
+        return None
+    return httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=300)
+
+
+def _cliente_http() -> Optional["httpx.Client"]:
+    if not HTTPX_AVAILABLE:
+        return None
+    return httpx.Client(limits=_limites_http(), timeout=httpx.Timeout(120.0, connect=10.0))
+
+
+def _cliente_http_async() -> Optional["httpx.AsyncClient"]:
+    if not HTTPX_AVAILABLE:
+        return None
+    return httpx.AsyncClient(limits=_limites_http(), timeout=httpx.Timeout(120.0, connect=10.0))
+
+
+def _leer_archivo(ruta: str) -> bytes:
+    with open(ruta, "rb") as f:
+        return f.read()
+
+
+def _segmentos_whisper(segmentos: Optional[List[Any]]) -> List[Dict[str, Any]]:
+    resultado = []
+    for segmento in segmentos or []:
+        if isinstance(segmento, dict):
+            resultado.append({k: segmento.get(k) for k in ("start", "end", "text")})
+        else:
+            resultado.append({k: getattr(segmento, k, None) for k in ("start", "end", "text")})
+    return resultado
+
+
+class ClientesGroq:
+    """Cliente síncrono y un cliente asíncrono por event loop, compartidos por Whisper y el LLM de Groq"""
+
+    def __init__(self, api_key: str):
+        if not GROQ_AVAILABLE:
+            raise ImportError("groq no está instalado. Ejecuta: pip install groq")
+        self.api_key = api_key
+        # Los reintentos los gestiona el planificador, no el SDK
+        self.cliente = Groq(api_key=api_key, max_retries=0, http_client=_cliente_http())
+        self._asincronos: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+    def asincrono(self) -> "AsyncGroq":
+        loop = asyncio.get_running_loop()
+        cliente = self._asincronos.get(loop)
+        if cliente is None:
+            cliente = AsyncGroq(api_key=self.api_key, max_retries=0, http_client=_cliente_http_async())
+            self._asincronos[loop] = cliente
+        return cliente
+
+    def calentar(self):
+        self.cliente.models.list()
+
+    def cerrar(self):
+        self.cliente.close()
+        asincronos = list(self._asincronos.items())
+        self._asincronos.clear()
+        for loop, cliente in asincronos:
+            self._cerrar_asincrono(loop, cliente)
+
+    async def acerrar(self):
+        """Cierra el cliente asíncrono del event loop actual, antes de que el loop termine"""
+        cliente = self._asincronos.pop(asyncio.get_running_loop(), None)
+        if cliente is not None:
+            await cliente.close()
+
+    @staticmethod
+    def _cerrar_asincrono(loop: asyncio.AbstractEventLoop, cliente: "AsyncGroq"):
+        """Cierra un cliente asíncrono en su propio event loop, donde viven sus conexiones"""
+        if loop.is_closed():
+            logger.debug("Cliente asíncrono de Groq de un event loop ya cerrado; se descarta")
+            return
+        try:
+            actual = asyncio.get_running_loop()
+        except RuntimeError:
+            actual = None
+        try:
+            if loop is actual:
+                loop.create_task(cliente.close())
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(cliente.close(), loop).result(timeout=5)
+            elif actual is None:
+                loop.run_until_complete(cliente.close())
+            else:
+                # Desde otro loop en marcha no se puede correr este: se cierra en un hilo aparte
+                hilo = threading.Thread(target=lambda: loop.run_until_complete(cliente.close()), daemon=True)
+                hilo.start()
+                hilo.join(timeout=5)
+        except Exception as e:
+            logger.warning(f"No se pudo cerrar el cliente asíncrono de Groq: {e}")
+
+
+class BackendGroq:
+    nombre = "groq"
+    recurso = "groq"
+
+    def __init__(self, clientes: ClientesGroq, modelo: str = MODELOS_LLM["groq"]):
+        self.clientes = clientes
+        self.modelo = modelo
+
+    def _parametros(self, solicitud: SolicitudLLM) -> Dict[str, Any]:
+        parametros = {
+            "model": self.modelo,
+            "messages": [
+                {"role": "system", "content": solicitud.system_prompt},
+                {"role": "user", "content": solicitud.user_prompt}
+            ],
+            "temperature": solicitud.temperature,
+            "max_tokens": solicitud.max_tokens
+        }
+        if solicitud.formato_json:
+            parametros["response_format"] = {"type": "json_object"}
+        return parametros
+
+    @staticmethod
+    def _respuesta(response: Any) -> RespuestaLLM:
+        uso = getattr(response, "usage", None)
+        return RespuestaLLM(
+            response.choices[0].message.content.strip(),
+            getattr(uso, "prompt_tokens", 0) or 0,
+            getattr(uso, "completion_tokens", 0) or 0
+        )
+
+    @staticmethod
+    def _fragmento(fragmento: Any) -> FragmentoLLM:
+        choices = fragmento.choices
+        texto = (choices[0].delta.content or "") if choices else ""
+        # Groq informa el uso en el último fragmento (x_groq.usage o usage)
+        uso = getattr(fragmento, "usage", None) or getattr(getattr(fragmento, "x_groq", None), "usage", None)
+        if uso is None:
+            return FragmentoLLM(texto)
+        return FragmentoLLM(texto, getattr(uso, "prompt_tokens", 0) or 0, getattr(uso, "completion_tokens", 0) or 0)
+
+    def completar(self, solicitud: SolicitudLLM) -> RespuestaLLM:
+        return self._respuesta(self.clientes.cliente.chat.completions.create(**self._parametros(solicitud)))
+
+    def transmitir(self, solicitud: SolicitudLLM) -> Iterator[FragmentoLLM]:
+        stream = self.clientes.cliente.chat.completions.create(**self._parametros(solicitud), stream=True)
+        try:
+            for fragmento in stream:
+                yield self._fragmento(fragmento)
+        finally:
+            stream.close()
+
+    async def acompletar(self, solicitud: SolicitudLLM) -> RespuestaLLM:
+        response = await self.clientes.asincrono().chat.completions.create(**self._parametros(solicitud))
+        return self._respuesta(response)
+
+    async def atransmitir(self, solicitud: SolicitudLLM) -> AsyncIterator[FragmentoLLM]:
+        stream = await self.clientes.asincrono().chat.completions.create(**self._parametros(solicitud), stream=True)
+        try:
+            async for fragmento in stream:
+                yield self._fragmento(fragmento)
+        finally:
+            # También al cancelar la tarea: se libera la conexión del stream
+            cerrado = stream.close()
+            if inspect.isawaitable(cerrado):
+                await cerrado
+
+    def calentar(self):
+        self.clientes.calentar()
+
+    def cerrar(self):
+        self.clientes.cerrar()
+
+
+# genai.configure fija la API key para todo el proceso: los BackendGemini vivos comparten una sola clave
+_lock_genai = threading.Lock()
+_clave_genai: Optional[str] = None
+_backends_gemini: "weakref.WeakSet[BackendGemini]" = weakref.WeakSet()
+
+
+class BackendGemini:
+    nombre = "google"
+    recurso = "google"
+
+    def __init__(self, api_key: str, modelo: str = MODELOS_LLM["google"]):
+        global _clave_genai
+        if not GOOGLE_AI_AVAILABLE:
+            raise ImportError("google-generativeai no está instalado. Ejecuta: pip install google-generativeai")
+        with _lock_genai:
+            # Reconfigurar cambiaría la clave de los evaluadores de Gemini que ya existen
+            if _backends_gemini and api_key != _clave_genai:
+                raise ValueError(
+                    "Ya hay un evaluador de Gemini con otra GOOGLE_API_KEY en este proceso; "
+                    "google-generativeai solo admite una clave a la vez"
+                )
+            genai.configure(api_key=api_key)
+            _clave_genai = api_key
+            _backends_gemini.add(self)
+        self.modelo = modelo
+        self.modelo_genai = genai.GenerativeModel(modelo)
+
+    @staticmethod
+    def _prompt(solicitud: SolicitudLLM) -> str:
+        return f"{solicitud.system_prompt}\n\n---\n\nUSUARIO: {solicitud.user_prompt}"
+
+    @staticmethod
+    def _configuracion(solicitud: SolicitudLLM) -> Any:
+        return genai.types.GenerationConfig(
+            temperature=solicitud.temperature,
+            max_output_tokens=solicitud.max_tokens,
+            **({"response_mime_type": "application/json"} if solicitud.formato_json else {})
+        )
+
+    @staticmethod
+    def _uso(response: Any) -> Tuple[int, int]:
+        uso = getattr(response, "usage_metadata", None)
+        if not uso:
+            return 0, 0
+        return getattr(uso, "prompt_token_count", 0) or 0, getattr(uso, "candidates_token_count", 0) or 0
+
+    def completar(self, solicitud: SolicitudLLM) -> RespuestaLLM:
+        response = self.modelo_genai.generate_content(
+            self._prompt(solicitud),
+            generation_config=self._configuracion(solicitud)
+        )
+        return RespuestaLLM(response.text.strip(), *self._uso(response))
+
+    def transmitir(self, solicitud: SolicitudLLM) -> Iterator[FragmentoLLM]:
+        response = self.modelo_genai.generate_content(
+            self._prompt(solicitud),
+            generation_config=self._configuracion(solicitud),
+            stream=True
+        )
+        for fragmento in response:
+            yield FragmentoLLM(fragmento.text or "")
+        # Gemini deja usage_metadata en la propia respuesta al terminar de iterarla
+        yield FragmentoLLM("", *self._uso(response))
+
+    async def acompletar(self, solicitud: SolicitudLLM) -> RespuestaLLM:
+        response = await self.modelo_genai.generate_content_async(
+            self._prompt(solicitud),
+            generation_config=self._configuracion(solicitud)
+        )
+        return RespuestaLLM(response.text.strip(), *self._uso(response))
+
+    async def atransmitir(self, solicitud: SolicitudLLM) -> AsyncIterator[FragmentoLLM]:
+        response = await self.modelo_genai.generate_content_async(
+            self._prompt(solicitud),
+            generation_config=self._configuracion(solicitud),
+            stream=True
+        )
+        async for fragmento in response:
+            yield FragmentoLLM(fragmento.text or "")
+        yield FragmentoLLM("", *self._uso(response))
+
+    def calentar(self):
+        next(iter(genai.list_models()), None)
+
+    def cerrar(self):
+        # Cerrado, deja de retener la clave del proceso
+        with _lock_genai:
+            _backends_gemini.discard(self)
+
+
+class TranscriptorGroq:
+    """Whisper en la API de Groq"""
+    nombre = "groq"
+    recurso = "whisper"
+    limite_bytes = LIMITE_BYTES_WHISPER
+    # Transcripciones simultáneas que se le asignan al balancear
+    capacidad = 4
+
+    def __init__(self, clientes: ClientesGroq, modelo: str = MODELO_WHISPER):
+        self.clientes = clientes
+        self.modelo = modelo
+
+    @staticmethod
+    def _respuesta(transcription: Any) -> RespuestaTranscripcion:
+        return RespuestaTranscripcion(
+            transcription.text,
+            getattr(transcription, "duration", None),
+            _segmentos_whisper(getattr(transcription, "segments", None))
+        )
+
+    def transcribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion:
+        transcription = self.clientes.cliente.audio.transcriptions.create(
+            file=(os.path.basename(ruta), _leer_archivo(ruta)),
+            model=self.modelo,
+            response_format="verbose_json",
+            language=idioma,
+        )
+        return self._respuesta(transcription)
+
+    async def atranscribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion:
+        contenido = await asyncio.to_thread(_leer_archivo, ruta)
+        transcription = await self.clientes.asincrono().audio.transcriptions.create(
+            file=(os.path.basename(ruta), contenido),
+            model=self.modelo,
+            response_format="verbose_json",
+            language=idioma,
+        )
+        return self._respuesta(transcription)
+
+    def calentar(self):
+        self.clientes.calentar()
+
+    def cerrar(self):
+        self.clientes.cerrar()
+
+
+def modelo_transcriptor_local(modelo: Optional[str] = None, tipo_computo: str = "int8") -> str:
+    """Nombre del modelo de TranscriptorLocal (con el que se identifican sus transcripciones)"""
+    return f"faster-whisper-{modelo or os.getenv('WHISPER_LOCAL_MODELO', 'small')}-{tipo_computo}"
+
+
+class TranscriptorLocal:
+    """
+    Whisper en la CPU propia con faster-whisper (CTranslate2, pesos int8): el audio no sale
+    del equipo. El modelo se carga una vez, en el primer uso o al precalentar, y las
+    transcripciones simultáneas se limitan a `max_concurrentes` para no saturar la CPU
+    """
+    nombre = "local"
+    recurso = "local"
+    limite_bytes = None
+
+    def __init__(
+        self,
+        modelo: Optional[str] = None,
+        dispositivo: str = "cpu",
+        tipo_computo: str = "int8",
+        hilos: int = 0,
+        max_concurrentes: int = 1
+    ):
+        if not FASTER_WHISPER_AVAILABLE:
+            raise ImportError("faster-whisper no está instalado. Ejecuta: pip install faster-whisper")
+        self.modelo_base = modelo or os.getenv("WHISPER_LOCAL_MODELO", "small")
+        self.modelo = modelo_transcriptor_local(self.modelo_base, tipo_computo)
+        self.dispositivo = dispositivo
+        self.tipo_computo = tipo_computo
+        self.hilos = hilos
+        self.capacidad = max_concurrentes
+        self._modelo: Optional["WhisperModel"] = None
+        self._lock_carga = threading.Lock()
+        self._turnos = threading.Semaphore(max_concurrentes)
+
+    def _cargar(self) -> "WhisperModel":
+        with self._lock_carga:
+            if self._modelo is None:
+                logger.debug(f"Cargando Whisper local {self.modelo_base} ({self.dispositivo}, {self.tipo_computo})")
+                self._modelo = WhisperModel(
+                    self.modelo_base,
+                    device=self.dispositivo,
+                    compute_type=self.tipo_computo,
+                    cpu_threads=self.hilos
+                )
+            return self._modelo
+
+    def transcribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion:
+        modelo = self._cargar()
+        with self._turnos:
+            segmentos, info = modelo.transcribe(ruta, language=idioma, vad_filter=True)
+            # transcribe() devuelve un generador: la decodificación ocurre al recorrerlo
+            segmentos = [{"start": s.start, "end": s.end, "text": s.text} for s in segmentos]
+        return RespuestaTranscripcion(
+            " ".join(s["text"].strip() for s in segmentos).strip(),
+            getattr(info, "duration", None),
+            segmentos
+        )
+
+    async def atranscribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion:
+        return await asyncio.to_thread(self.transcribir, ruta, idioma)
+
+    def calentar(self):
+        self._cargar()
+
+    def cerrar(self):
+        pass
+
+
+class BalanceadorTranscripcion:
+    """
+    Reparte las transcripciones entre varios backends: cada audio va al menos ocupado en
+    proporción a su capacidad (a igualdad, el primero de la lista). Si falla, se intenta
+    con el siguiente, así que una caída de la conexión no detiene la corrección
+    """
+    nombre = "balanceado"
+    recurso = "balanceado"
+
+    def __init__(self, backends: List[BackendTranscripcion]):
+        if not backends:
+            raise ValueError("El balanceador necesita al menos un backend de transcripción")
+        self.backends = list(backends)
+        self.modelo = "+".join(b.modelo for b in self.backends)
+        limites = [b.limite_bytes for b in self.backends if b.limite_bytes]
+        # Se segmenta según el más restrictivo para que cualquiera pueda tomar cada parte
+        self.limite_bytes = min(limites) if limites else None
+        self._en_curso = {id(b): 0 for b in self.backends}
+        self._lock = threading.Lock()
+
+    def ordenar(self) -> List[BackendTranscripcion]:
+        """Backends del menos al más ocupado"""
+        with self._lock:
+            return sorted(
+                self.backends,
+                key=lambda b: self._en_curso[id(b)] / max(getattr(b, "capacidad", 1), 1)
+            )
+
+    def ocupar(self, backend: BackendTranscripcion, delta: int):
+        with self._lock:
+            self._en_curso[id(backend)] += delta
+
+    def calentar(self):
+        for backend in self.backends:
+            try:
+                backend.calentar()
+            except Exception as e:
+                logger.warning(f"No se pudo precalentar {backend.nombre}: {e}")
+
+    def cerrar(self):
+        for backend in self.backends:
+            backend.cerrar()
+
+
+def crear_transcriptor(
+    tipo: str,
+    clientes_groq: Optional[ClientesGroq] = None
+) -> BackendTranscripcion:
+    """Transcriptor "groq", "local" o "balanceado" (local primero, Groq cuando el local está ocupado)"""
+    if tipo not in TRANSCRIPTORES:
+        raise ValueError(f"Transcriptor desconocido: {tipo}. Opciones: {', '.join(TRANSCRIPTORES)}")
+    if tipo == "local":
+        return TranscriptorLocal()
+    if clientes_groq is None:
+        raise ValueError("GROQ_API_KEY no encontrada (requerida para transcripción)")
+    if tipo == "groq":
+        return TranscriptorGroq(clientes_groq)
+    return BalanceadorTranscripcion([TranscriptorLocal(), TranscriptorGroq(clientes_groq)])
@@ -0,0 +1,202 @@
+"""
+Evaluación por lotes: un material y una rúbrica contra una carpeta de audios
+Los resultados se escriben en JSONL a medida que termina cada alumno
+
+Uso:
+    python batch.py audios/ --material material.txt --rubrica rubrica.txt --salida resultados.jsonl
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Callable
+
+from engine import EvaluadorEngine, MODOS_EVALUACION, PROVEEDORES_LLM, TRANSCRIPTORES
+from limpieza import MODOS_LIMPIEZA
+from metricas import Trazador, SumideroLog, SumideroJSONL, AgregadorMemoria
+
+EXTENSIONES_AUDIO = (".mp3", ".wav", ".m4a", ".ogg", ".flac", ".webm")
+
+
+def listar_audios(directorio: str) -> List[str]:
+    """Devuelve los archivos de audio del directorio, ordenados por nombre"""
+    return sorted(
+        os.path.join(directorio, nombre)
+        for nombre in os.listdir(directorio)
+        if nombre.lower().endswith(EXTENSIONES_AUDIO)
+    )
+
+
+def _evaluar_archivo(
+    evaluador: EvaluadorEngine,
+    ruta_audio: str,
+    material_referencia: str,
+    rubrica: str,
+    limpiar: bool,
+    idioma: str,
+    modo: str,
+    modo_limpieza: str
+) -> Dict[str, Any]:
+    inicio = time.perf_counter()
+    try:
+        resultado = evaluador.proceso_completo(
+            ruta_audio,
+            material_referencia,
+            rubrica,
+            limpiar=limpiar,
+            idioma=idioma,
+            modo=modo,
+            modo_limpieza=modo_limpieza
+        )
+    except Exception as e:
+        resultado = {
+            "success": False,
+            "error": f"Error inesperado: {str(e)}"
+        }
+
+    return {
+        "archivo": os.path.basename(ruta_audio),
+        "tiempo_proceso": round(time.perf_counter() - inicio, 2),
+        **resultado
+    }
+
+
+def evaluar_lote(
+    evaluador: EvaluadorEngine,
+    directorio_audios: str,
+    material_referencia: str,
+    rubrica: str,
+    ruta_salida: str,
+    max_workers: int = 4,
+    limpiar: bool = True,
+    idioma: str = "es",
+    modo: str = "completo",
+    modo_limpieza: str = "auto",
+    al_terminar: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """Evalúa todos los audios de un directorio en paralelo y escribe cada resultado en JSONL"""
+    audios = listar_audios(directorio_audios)
+    if not audios:
+        return {
+            "success": False,
+            "error": f"No se encontraron audios en {directorio_audios}"
+        }
+
+    exitosos = 0
+    inicio = time.perf_counter()
+
+    with open(ruta_salida, "w", encoding="utf-8") as salida, \
+            ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futuros = [
+            pool.submit(
+                _evaluar_archivo,
+                evaluador,
+                ruta,
+                material_referencia,
+                rubrica,
+                limpiar,
+                idioma,
+                modo,
+                modo_limpieza
+            )
+            for ruta in audios
+        ]
+
+        for futuro in as_completed(futuros):
+            registro = futuro.result()
+            if registro.get("success"):
+                exitosos += 1
+
+            salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            salida.flush()
+
+            if al_terminar:
+                al_terminar(registro)
+
+    return {
+        "success": True,
+        "total": len(audios),
+        "exitosos": exitosos,
+        "fallidos": len(audios) - exitosos,
+        "tiempo_total": round(time.perf_counter() - inicio, 2),
+        "salida": ruta_salida
+    }
+
+
+def _leer_texto(ruta: str) -> str:
+    with open(ruta, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evalúa una carpeta de exámenes orales con el mismo material y rúbrica")
+    parser.add_argument("directorio", help="Carpeta con los audios de los alumnos")
+    parser.add_argument("--material", required=True, help="Archivo de texto con el material de referencia")
+    parser.add_argument("--rubrica", required=True, help="Archivo de texto con la rúbrica")
+    parser.add_argument("--salida", default="resultados.jsonl", help="Archivo JSONL de resultados")
+    parser.add_argument("--workers", type=int, default=4, help="Evaluaciones simultáneas")
+    parser.add_argument("--proveedor", default="groq", choices=PROVEEDORES_LLM, help="Proveedor LLM")
+    parser.add_argument("--transcriptor", default="groq", choices=TRANSCRIPTORES, help="Backend de transcripción")
+    parser.add_argument("--idioma", default="es", help="Idioma del audio")
+    parser.add_argument("--modo", default="completo", choices=MODOS_EVALUACION, help="Modo de evaluación")
+    parser.add_argument("--limpieza", default="auto", choices=MODOS_LIMPIEZA, help="Modo de limpieza de la transcripción")
+    parser.add_argument("--sin-limpiar", action="store_true", help="No limpiar la transcripción")
+    parser.add_argument("--trazas", help="Archivo JSONL donde registrar latencia y tokens de cada etapa")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar el detalle de cada etapa")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+
+    agregador = AgregadorMemoria()
+    sumideros = [SumideroLog(), agregador]
+    if args.trazas:
+        sumideros.append(SumideroJSONL(args.trazas))
+
+    try:
+        evaluador = EvaluadorEngine(proveedor=args.proveedor, trazador=Trazador(sumideros), transcriptor=args.transcriptor)
+    except (ValueError, ImportError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    def mostrar(registro: Dict[str, Any]):
+        if registro.get("success"):
+            calificacion = registro["evaluacion"].get("calificacion_final", "N/A")
+            print(f"✅ {registro['archivo']}: {calificacion}/10 ({registro['tiempo_proceso']}s)")
+        else:
+            print(f"❌ {registro['archivo']}: {registro.get('error', 'Error desconocido')}")
+
+    resumen = evaluar_lote(
+        evaluador,
+        args.directorio,
+        _leer_texto(args.material),
+        _leer_texto(args.rubrica),
+        args.salida,
+        max_workers=args.workers,
+        limpiar=not args.sin_limpiar,
+        idioma=args.idioma,
+        modo=args.modo,
+        modo_limpieza=args.limpieza,
+        al_terminar=mostrar
+    )
+
+    if not resumen["success"]:
+        print(f"❌ {resumen['error']}")
+        sys.exit(1)
+
+    print("=" * 50)
+    print(f"📊 {resumen['exitosos']}/{resumen['total']} exámenes evaluados en {resumen['tiempo_total']}s")
+    print(f"📄 Resultados en: {resumen['salida']}")
+
+    print(f"\n{'Etapa':<20}{'Llamadas':>10}{'Media':>10}{'p95':>10}{'Tokens in':>12}{'Tokens out':>12}{'Errores':>9}")
+    for etapa, datos in agregador.resumen().items():
+        print(
+            f"{etapa:<20}{datos['llamadas']:>10}{datos['duracion_media_s']:>9.2f}s{datos['duracion_p95_s']:>9.2f}s"
+            f"{datos['tokens_prompt']:>12}{datos['tokens_completion']:>12}{datos['errores']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
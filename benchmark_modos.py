@@ -0,0 +1,162 @@
+"""
+Benchmark de modos de evaluación: completo (4 llamadas) vs rápido (1 llamada)
+Compara latencia, tokens y concordancia de calificaciones sobre el mismo examen
+
+Uso:
+    python benchmark_modos.py --material material.txt --rubrica rubrica.txt --transcripcion respuesta.txt -n 5
+    # Sin red: se graba una vez y después se reproduce
+    python benchmark_modos.py ... --grabaciones grabaciones/ --modo-grabacion grabar
+    python benchmark_modos.py ... --grabaciones grabaciones/ --modo-grabacion reproducir
+"""
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from typing import Dict, Any, List
+
+from engine import EvaluadorEngine, MODOS_EVALUACION, PROVEEDORES_LLM
+from cache import CacheConceptos
+from grabacion import MODOS_GRABACION, evaluador_grabado
+
+
+def _leer_texto(ruta: str) -> str:
+    with open(ruta, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def medir_modo(
+    evaluador: EvaluadorEngine,
+    modo: str,
+    material: str,
+    rubrica: str,
+    transcripcion: str,
+    repeticiones: int
+) -> Dict[str, Any]:
+    """Ejecuta evaluar_examen varias veces en un modo y resume latencia, tokens y notas"""
+    latencias, prompt_tokens, completion_tokens, llamadas, notas = [], [], [], [], []
+
+    for _ in range(repeticiones):
+        uso_previo = dict(evaluador.uso_tokens)
+        inicio = time.perf_counter()
+        resultado = evaluador.evaluar_examen(material, rubrica, transcripcion, modo=modo)
+        latencias.append(time.perf_counter() - inicio)
+
+        prompt_tokens.append(evaluador.uso_tokens["prompt"] - uso_previo["prompt"])
+        completion_tokens.append(evaluador.uso_tokens["completion"] - uso_previo["completion"])
+        llamadas.append(evaluador.uso_tokens["llamadas"] - uso_previo["llamadas"])
+        notas.append(
+            float(resultado["evaluacion"].get("calificacion_final", 0)) if resultado["success"] else None
+        )
+
+    return {
+        "modo": modo,
+        "repeticiones": repeticiones,
+        "latencia_media_s": round(statistics.mean(latencias), 3),
+        "latencia_mediana_s": round(statistics.median(latencias), 3),
+        "latencia_p95_s": round(_percentil(latencias, 95), 3),
+        "llamadas_llm_media": round(statistics.mean(llamadas), 2),
+        "tokens_prompt_media": round(statistics.mean(prompt_tokens), 1),
+        "tokens_completion_media": round(statistics.mean(completion_tokens), 1),
+        "calificaciones": notas
+    }
+
+
+def concordancia(notas_a: List[float], notas_b: List[float]) -> Dict[str, Any]:
+    """Concordancia entre las calificaciones de dos modos sobre el mismo examen"""
+    validas_a = [n for n in notas_a if n is not None]
+    validas_b = [n for n in notas_b if n is not None]
+    if not validas_a or not validas_b:
+        return {"comparables": False}
+
+    media_a, media_b = statistics.mean(validas_a), statistics.mean(validas_b)
+    diferencias = [abs(a - b) for a in validas_a for b in validas_b]
+    return {
+        "comparables": True,
+        "media_completo": round(media_a, 2),
+        "media_rapido": round(media_b, 2),
+        "diferencia_medias": round(abs(media_a - media_b), 2),
+        "pares_dentro_0_5": round(sum(d <= 0.5 for d in diferencias) / len(diferencias) * 100, 1),
+        "pares_dentro_1_0": round(sum(d <= 1.0 for d in diferencias) / len(diferencias) * 100, 1),
+        "desviacion_completo": round(statistics.pstdev(validas_a), 2),
+        "desviacion_rapido": round(statistics.pstdev(validas_b), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara los modos de evaluación completo y rápido")
+    parser.add_argument("--material", required=True, help="Archivo con el material de referencia")
+    parser.add_argument("--rubrica", required=True, help="Archivo con la rúbrica")
+    parser.add_argument("--transcripcion", required=True, help="Archivo con la respuesta del alumno")
+    parser.add_argument("-n", "--repeticiones", type=int, default=3, help="Evaluaciones por modo")
+    parser.add_argument("--proveedor", default="groq", choices=PROVEEDORES_LLM, help="Proveedor LLM")
+    parser.add_argument("--salida", default="benchmark_modos.json", help="Archivo JSON de resultados")
+    parser.add_argument("--grabaciones", help="Directorio de respuestas grabadas (sin él se llama a la API)")
+    parser.add_argument("--modo-grabacion", default="auto", choices=MODOS_GRABACION, help="Grabar, reproducir o ambos")
+    args = parser.parse_args()
+
+    material = _leer_texto(args.material)
+    rubrica = _leer_texto(args.rubrica)
+    transcripcion = _leer_texto(args.transcripcion)
+
+    try:
+        # Caché temporal: los conceptos se extraen una vez y ambos modos parten de la misma lista
+        cache_conceptos = CacheConceptos(directorio=tempfile.mkdtemp(prefix="benchmark_conceptos_"))
+        if args.grabaciones:
+            evaluador = evaluador_grabado(
+                args.grabaciones,
+                args.modo_grabacion,
+                proveedor=args.proveedor,
+                usar_cache=True,
+                cache_conceptos=cache_conceptos
+            )
+        else:
+            evaluador = EvaluadorEngine(proveedor=args.proveedor, cache_conceptos=cache_conceptos)
+    except (ValueError, ImportError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    print("🔥 Extrayendo conceptos (calentamiento)...")
+    evaluador._extraer_conceptos_clave(material)
+
+    resultados = {}
+    for modo in MODOS_EVALUACION:
+        print(f"⏱️  Midiendo modo {modo} ({args.repeticiones} repeticiones)...")
+        resultados[modo] = medir_modo(evaluador, modo, material, rubrica, transcripcion, args.repeticiones)
+
+    informe = {
+        "proveedor": evaluador.proveedor,
+        "modelo": evaluador.llm_model,
+        "modos": resultados,
+        "concordancia": concordancia(
+            resultados["completo"]["calificaciones"],
+            resultados["rapido"]["calificaciones"]
+        )
+    }
+
+    print("=" * 60)
+    print(f"{'Modo':<10}{'Latencia media':>16}{'p95':>10}{'Llamadas':>10}{'Tokens in':>12}{'Tokens out':>12}")
+    for modo, r in resultados.items():
+        print(
+            f"{modo:<10}{r['latencia_media_s']:>15.2f}s{r['latencia_p95_s']:>9.2f}s"
+            f"{r['llamadas_llm_media']:>10}{r['tokens_prompt_media']:>12}{r['tokens_completion_media']:>12}"
+        )
+    c = informe["concordancia"]
+    if c["comparables"]:
+        print(f"\nCalificación media: completo {c['media_completo']} | rápido {c['media_rapido']}")
+        print(f"Pares con diferencia ≤ 0.5: {c['pares_dentro_0_5']}% | ≤ 1.0: {c['pares_dentro_1_0']}%")
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 Resultados en: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
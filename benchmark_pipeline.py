@@ -0,0 +1,448 @@
+"""
+Benchmark del pipeline de evaluación sin red
+Usa un backend LLM simulado con latencia configurable (respuestas válidas para cada etapa)
+y mide lo que cuesta el propio motor:
+  - sobrecosto por etapa de evaluar_examen con latencia 0 (todo el tiempo es del motor)
+  - _limpiar_json y la validación de esquema con respuestas de distintos tamaños
+  - _calcular_cobertura con cientos o miles de conceptos
+  - evaluaciones por segundo con 1, 8 y 64 evaluaciones simultáneas (hilos y asyncio)
+Los resultados se escriben en JSON para comparar entre versiones
+
+Uso:
+    python benchmark_pipeline.py
+    python benchmark_pipeline.py --latencia 0.3 --por-token 0.002 --concurrencias 1,8,64 --salida bench.json
+"""
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import platform
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Iterator, AsyncIterator, Callable
+
+from engine import EvaluadorEngine, MODOS_EVALUACION
+from backends import MODELO_WHISPER, SolicitudLLM, RespuestaLLM, FragmentoLLM, RespuestaTranscripcion
+from grabacion import LatenciaSimulada
+from esquemas import Analisis, validar_json
+from planificador import Planificador, estimar_tokens
+
+TAMANO_FRAGMENTO = 16
+
+TEMAS = [
+    "fotosíntesis", "cloroplastos", "fase luminosa", "ciclo de Calvin", "estomas", "tilacoides",
+    "fotólisis del agua", "ATP", "NADPH", "estroma", "clorofila", "glucosa", "dióxido de carbono",
+    "oxígeno", "respiración celular", "mitocondrias", "energía química", "luz solar"
+]
+
+
+def _conceptos(n: int, semilla: int = 0) -> List[str]:
+    """n conceptos distintos y deterministas a partir de los temas"""
+    azar = random.Random(semilla)
+    return [f"{TEMAS[i % len(TEMAS)]} {azar.choice(TEMAS)} {i}" if i >= len(TEMAS) else TEMAS[i] for i in range(n)]
+
+
+def texto_sintetico(caracteres: int, semilla: int = 0) -> str:
+    azar = random.Random(semilla)
+    oraciones = []
+    while sum(len(o) + 1 for o in oraciones) < caracteres:
+        a, b = azar.sample(TEMAS, 2)
+        oraciones.append(f"La {a} se relaciona con {b} durante el proceso, según el material.")
+    return " ".join(oraciones)[:caracteres]
+
+
+RUBRICA_SINTETICA = """- Nombra las fases de la fotosíntesis (4 puntos)
+- Explica dónde ocurre cada fase (4 puntos)
+- Claridad y vocabulario técnico (2 puntos)"""
+
+
+def transcripcion_sintetica(caracteres: int, semilla: int = 0) -> str:
+    """Respuesta con una parte por ítem de RUBRICA_SINTETICA, para que el modo por_preguntas la divida"""
+    ordinales = ("Primera", "Segunda", "Tercera")
+    return " ".join(
+        f"{ordinal} pregunta. {texto_sintetico(caracteres // len(ordinales), semilla + i)}."
+        for i, ordinal in enumerate(ordinales)
+    )
+
+
+def _respuestas_por_etapa(transcripcion: str) -> Dict[str, Dict[str, Any]]:
+    analisis = {
+        "conceptos_correctos": TEMAS[:6],
+        "conceptos_omitidos": TEMAS[6:9],
+        "errores_factuales": [{"error": "confunde estomas con estroma", "gravedad": "moderado", "cita_alumno": "los estomas del cloroplasto"}],
+        "informacion_inventada": [],
+        "claridad_explicacion": "buena",
+        "coherencia_argumentativa": "buena",
+        "uso_vocabulario_tecnico": "bueno",
+        "citas_destacadas": [transcripcion[:80]]
+    }
+    calificacion = {
+        "calificacion_final": 7.5,
+        "calificacion_por_criterio": [
+            {"criterio": "Precisión técnica", "puntaje": 3.0, "maximo": 4.0, "justificacion": "Nombra cloroplastos y tilacoides"},
+            {"criterio": "Dominio del proceso", "puntaje": 3.0, "maximo": 4.0, "justificacion": "Explica la fotólisis"},
+            {"criterio": "Claridad", "puntaje": 1.5, "maximo": 2.0, "justificacion": "Pocas muletillas"}
+        ],
+        "penalizaciones": [{"razon": "confunde estomas con estroma", "puntos_restados": 0.5}],
+        "bonificaciones": [],
+        "nivel_confianza": "alto",
+        "justificacion_general": "Respuesta sólida con un error menor"
+    }
+    feedback = {
+        "feedback_alumno": {
+            "resumen": "Buena explicación general de la fotosíntesis.",
+            "fortalezas": ["Ubica correctamente las fases"],
+            "areas_mejora": ["Diferenciar estomas y estroma"],
+            "errores_corregidos": [{"error": "estomas del cloroplasto", "correccion": "estroma del cloroplasto", "explicacion": "Los estomas están en la hoja"}],
+            "recomendaciones_estudio": ["Repasar la estructura del cloroplasto"],
+            "mensaje_motivacional": "¡Vas muy bien!"
+        },
+        "nota_docente": {"observaciones": "Error de vocabulario recurrente", "patron_errores": "", "sugerencia_refuerzo": "", "comparacion_esperado": ""}
+    }
+    return {"analisis": analisis, "calificacion": calificacion, "feedback": feedback}
+
+
+class BackendSimulado:
+    """
+    BackendLLM sin red: reconoce la etapa por el prompt de sistema y responde un JSON válido
+    tras la latencia indicada. `num_conceptos` controla el tamaño de la lista de conceptos
+    """
+    nombre = "groq"
+    recurso = "simulado"
+    modelo = "simulado"
+
+    def __init__(self, latencia: LatenciaSimulada, num_conceptos: int = 12):
+        self.latencia = latencia
+        self.num_conceptos = num_conceptos
+
+    def _texto(self, solicitud: SolicitudLLM) -> str:
+        sistema = solicitud.system_prompt
+        if "limpiar transcripciones" in sistema:
+            return solicitud.user_prompt.rsplit("\n\n", 1)[-1]
+        if "extraer los conceptos clave" in sistema:
+            conceptos = _conceptos(self.num_conceptos)
+            mitad = len(conceptos) // 2
+            return json.dumps({
+                "conceptos_principales": conceptos[:mitad],
+                "conceptos_secundarios": conceptos[mitad:],
+                "datos_especificos": ["6 CO2 + 6 H2O -> C6H12O6 + 6 O2"],
+                "relaciones_procesos": ["la fase luminosa produce el ATP que usa el ciclo de Calvin"],
+                "tema_detectado": "Biología",
+                "nivel_dificultad": "Intermedio"
+            }, ensure_ascii=False)
+        respuestas = _respuestas_por_etapa(solicitud.user_prompt[-400:])
+        if "Valora cada criterio" in sistema:
+            # Mitad del máximo de cada criterio de la lista "- [id] ... (máximo N)"
+            criterios = re.findall(r"^- \[([\d.]+)\] .*\(máximo ([\d.]+)\)$", sistema, re.MULTILINE)
+            return json.dumps({
+                "criterios": [{"id": i, "puntaje": float(m) / 2, "justificacion": "Parcial"} for i, m in criterios],
+                "ajustes": [],
+                "nivel_confianza": "alto"
+            }, ensure_ascii=False)
+        if "a UNA pregunta" in sistema:
+            return json.dumps({
+                "analisis": respuestas["analisis"], "puntaje": 1.5, "justificacion": "Respuesta parcial", "nivel_confianza": "alto"
+            }, ensure_ascii=False)
+        if "En una sola respuesta" in sistema:
+            return json.dumps(respuestas, ensure_ascii=False)
+        if "Analiza la respuesta del estudiante" in sistema:
+            return json.dumps(respuestas["analisis"], ensure_ascii=False)
+        if "calcular una calificación" in sistema:
+            return json.dumps(respuestas["calificacion"], ensure_ascii=False)
+        if "tutor académico" in sistema:
+            return json.dumps(respuestas["feedback"], ensure_ascii=False)
+        raise ValueError(f"Etapa no reconocida por el backend simulado: {sistema[:60]}")
+
+    def _respuesta(self, solicitud: SolicitudLLM) -> RespuestaLLM:
+        texto = self._texto(solicitud)
+        return RespuestaLLM(texto, estimar_tokens(solicitud.system_prompt, solicitud.user_prompt), estimar_tokens(texto))
+
+    def _fragmentos(self, respuesta: RespuestaLLM) -> Iterator[FragmentoLLM]:
+        texto = respuesta.texto
+        for i in range(0, len(texto), TAMANO_FRAGMENTO):
+            yield FragmentoLLM(texto[i:i + TAMANO_FRAGMENTO])
+        yield FragmentoLLM("", respuesta.tokens_prompt, respuesta.tokens_completion)
+
+    def completar(self, solicitud: SolicitudLLM) -> RespuestaLLM:
+        respuesta = self._respuesta(solicitud)
+        time.sleep(self.latencia.total(0.0, respuesta.tokens_completion))
+        return respuesta
+
+    def transmitir(self, solicitud: SolicitudLLM) -> Iterator[FragmentoLLM]:
+        respuesta = self._respuesta(solicitud)
+        time.sleep(self.latencia.total(0.0, respuesta.tokens_completion))
+        yield from self._fragmentos(respuesta)
+
+    async def acompletar(self, solicitud: SolicitudLLM) -> RespuestaLLM:
+        respuesta = self._respuesta(solicitud)
+        await asyncio.sleep(self.latencia.total(0.0, respuesta.tokens_completion))
+        return respuesta
+
+    async def atransmitir(self, solicitud: SolicitudLLM) -> AsyncIterator[FragmentoLLM]:
+        respuesta = self._respuesta(solicitud)
+        await asyncio.sleep(self.latencia.total(0.0, respuesta.tokens_completion))
+        for fragmento in self._fragmentos(respuesta):
+            yield fragmento
+
+    def calentar(self):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+class TranscriptorSimulado:
+    """Solo para que el motor no pida claves; el benchmark no transcribe audio"""
+    nombre = "simulado"
+    recurso = "simulado"
+    modelo = MODELO_WHISPER
+    limite_bytes = None
+
+    def transcribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion:
+        return RespuestaTranscripcion(texto_sintetico(500))
+
+    async def atranscribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion:
+        return self.transcribir(ruta, idioma)
+
+    def calentar(self):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+def crear_evaluador(latencia: LatenciaSimulada, num_conceptos: int = 12) -> EvaluadorEngine:
+    # Sin caché: cada evaluación recorre todas las etapas. Planificador propio, sin límites compartidos
+    return EvaluadorEngine(
+        proveedor="groq",
+        usar_cache=False,
+        planificador=Planificador(),
+        backends_llm={"groq": BackendSimulado(latencia, num_conceptos)},
+        backend_transcripcion=TranscriptorSimulado()
+    )
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def _resumen(valores: List[float], escala: float = 1.0, decimales: int = 3) -> Dict[str, float]:
+    return {
+        "media": round(statistics.mean(valores) * escala, decimales),
+        "mediana": round(statistics.median(valores) * escala, decimales),
+        "p95": round(_percentil(valores, 95) * escala, decimales)
+    }
+
+
+def _cronometrar(funcion: Callable[[], Any], repeticiones: int) -> List[float]:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def medir_etapas(material: str, rubrica: str, transcripcion: str, repeticiones: int) -> Dict[str, Any]:
+    """Sobrecosto del motor por etapa: con latencia 0 todo el tiempo medido es prompts, parseo y validación"""
+    evaluador = crear_evaluador(LatenciaSimulada())
+    resultado = {}
+    for modo in MODOS_EVALUACION:
+        por_etapa: Dict[str, List[float]] = {}
+        totales = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            evaluacion = evaluador.evaluar_examen(material, rubrica, transcripcion, modo=modo)
+            totales.append(time.perf_counter() - inicio)
+            if not evaluacion["success"]:
+                raise RuntimeError(f"La evaluación simulada falló: {evaluacion.get('error')}")
+            for etapa in evaluacion["metricas_rendimiento"]["etapas"]:
+                por_etapa.setdefault(etapa["etapa"], []).append(etapa["duracion_s"])
+        resultado[modo] = {
+            "total_ms": _resumen(totales, 1000),
+            "etapas_ms": {etapa: _resumen(tiempos, 1000) for etapa, tiempos in por_etapa.items()}
+        }
+    return resultado
+
+
+def medir_json(repeticiones: int) -> Dict[str, Any]:
+    """_limpiar_json sola y seguida de la validación de esquema, por tamaño y envoltura de la respuesta"""
+    evaluador = crear_evaluador(LatenciaSimulada())
+    base = _respuestas_por_etapa(texto_sintetico(200))["analisis"]
+    resultado = {}
+    for elementos in (10, 100, 1000):
+        analisis = {**base, "citas_destacadas": [texto_sintetico(120, i) for i in range(elementos)]}
+        crudo = json.dumps(analisis, ensure_ascii=False)
+        variantes = {
+            "plano": crudo,
+            "bloque_markdown": f"```json\n{crudo}\n```",
+            "con_preambulo": f"Aquí está el análisis solicitado:\n{crudo}\nEspero que sea útil."
+        }
+        for nombre, texto in variantes.items():
+            clave = f"{nombre}_{len(texto) // 1024}kb"
+            limpiar = _cronometrar(lambda: evaluador._limpiar_json(texto), repeticiones)
+            validar = _cronometrar(lambda: validar_json(Analisis, evaluador._limpiar_json(texto)), repeticiones)
+            resultado[clave] = {
+                "bytes": len(texto.encode("utf-8")),
+                "limpiar_json_us": _resumen(limpiar, 1e6, 1),
+                "limpiar_y_validar_us": _resumen(validar, 1e6, 1)
+            }
+    return resultado
+
+
+def medir_cobertura(repeticiones: int, tamanos: List[int]) -> Dict[str, Any]:
+    """_calcular_cobertura con listas de conceptos grandes y una transcripción de ~5000 caracteres"""
+    evaluador = crear_evaluador(LatenciaSimulada())
+    transcripcion = texto_sintetico(5000)
+    resultado = {}
+    for n in tamanos:
+        conceptos = _conceptos(n)
+        lista = {"conceptos_principales": conceptos[:n // 2], "conceptos_secundarios": conceptos[n // 2:]}
+        analisis = {"conceptos_correctos": conceptos[::3]}
+        tiempos = _cronometrar(lambda: evaluador._calcular_cobertura(lista, analisis, transcripcion), repeticiones)
+        resultado[str(n)] = {"ms": _resumen(tiempos, 1000)}
+    return resultado
+
+
+def medir_concurrencia(
+    material: str,
+    rubrica: str,
+    transcripcion: str,
+    latencia: LatenciaSimulada,
+    concurrencias: List[int],
+    modo: str
+) -> Dict[str, Any]:
+    """Evaluaciones por segundo con N evaluaciones a la vez, con hilos (como batch.py) y con asyncio"""
+    resultado = {}
+    for n in concurrencias:
+        total = max(2 * n, 8)
+
+        evaluador = crear_evaluador(latencia)
+        latencias: List[float] = []
+
+        def evaluar(_):
+            inicio = time.perf_counter()
+            evaluacion = evaluador.evaluar_examen(material, rubrica, transcripcion, modo=modo)
+            latencias.append(time.perf_counter() - inicio)
+            return evaluacion["success"]
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            exitos = sum(pool.map(evaluar, range(total)))
+        duracion_hilos = time.perf_counter() - inicio
+        hilos = {
+            "evaluaciones": total,
+            "exitosas": exitos,
+            "por_segundo": round(total / duracion_hilos, 2),
+            "latencia_s": _resumen(latencias)
+        }
+
+        evaluador = crear_evaluador(latencia)
+        alatencias: List[float] = []
+
+        async def lote() -> int:
+            limite = asyncio.Semaphore(n)
+
+            async def evaluar_async() -> bool:
+                async with limite:
+                    inicio = time.perf_counter()
+                    evaluacion = await evaluador.aevaluar_examen(material, rubrica, transcripcion, modo=modo)
+                    alatencias.append(time.perf_counter() - inicio)
+                    return evaluacion["success"]
+
+            return sum(await asyncio.gather(*(evaluar_async() for _ in range(total))))
+
+        inicio = time.perf_counter()
+        exitos = asyncio.run(lote())
+        duracion_async = time.perf_counter() - inicio
+        resultado[str(n)] = {
+            "hilos": hilos,
+            "asyncio": {
+                "evaluaciones": total,
+                "exitosas": exitos,
+                "por_segundo": round(total / duracion_async, 2),
+                "latencia_s": _resumen(alatencias)
+            }
+        }
+    return resultado
+
+
+def _leer_texto(ruta: str) -> str:
+    with open(ruta, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de evaluación con un proveedor simulado")
+    parser.add_argument("--material", help="Archivo con el material de referencia (por defecto, texto sintético)")
+    parser.add_argument("--rubrica", help="Archivo con la rúbrica")
+    parser.add_argument("--transcripcion", help="Archivo con la respuesta del alumno")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Segundos hasta la respuesta simulada")
+    parser.add_argument("--por-token", type=float, default=0.0, help="Segundos por token de salida simulado")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación aleatoria de la latencia (fracción)")
+    parser.add_argument("--concurrencias", default="1,8,64", help="Evaluaciones simultáneas, separadas por comas")
+    parser.add_argument("--modo", default="completo", choices=MODOS_EVALUACION, help="Modo para la prueba de concurrencia")
+    parser.add_argument("-n", "--repeticiones", type=int, default=20, help="Repeticiones de las mediciones por etapa")
+    parser.add_argument("--salida", default="benchmark_pipeline.json", help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    material = _leer_texto(args.material) if args.material else texto_sintetico(3000, 1)
+    rubrica = _leer_texto(args.rubrica) if args.rubrica else RUBRICA_SINTETICA
+    transcripcion = _leer_texto(args.transcripcion) if args.transcripcion else transcripcion_sintetica(1500, 2)
+    latencia = LatenciaSimulada(primer_token=args.latencia, por_token=args.por_token, jitter=args.jitter, semilla=0)
+    concurrencias = [int(c) for c in args.concurrencias.split(",") if c.strip()]
+
+    print("⏱️  Sobrecosto por etapa (latencia 0)...")
+    etapas = medir_etapas(material, rubrica, transcripcion, args.repeticiones)
+    print("⏱️  _limpiar_json y validación...")
+    json_ = medir_json(args.repeticiones * 10)
+    print("⏱️  _calcular_cobertura...")
+    cobertura = medir_cobertura(max(args.repeticiones // 4, 3), [100, 1000, 5000])
+    print(f"⏱️  Concurrencia {concurrencias} (latencia {args.latencia}s)...")
+    concurrencia = medir_concurrencia(material, rubrica, transcripcion, latencia, concurrencias, args.modo)
+
+    informe = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "plataforma": platform.platform(),
+        "parametros": {
+            "latencia_s": args.latencia,
+            "por_token_s": args.por_token,
+            "jitter": args.jitter,
+            "modo_concurrencia": args.modo,
+            "repeticiones": args.repeticiones,
+            "material_chars": len(material),
+            "transcripcion_chars": len(transcripcion)
+        },
+        "etapas": etapas,
+        "limpiar_json": json_,
+        "cobertura": cobertura,
+        "concurrencia": concurrencia
+    }
+
+    print("=" * 60)
+    for modo, r in etapas.items():
+        print(f"{modo}: {r['total_ms']['mediana']} ms de motor por evaluación (mediana)")
+        for etapa, t in r["etapas_ms"].items():
+            print(f"   {etapa:<28}{t['mediana']:>10.3f} ms{t['p95']:>10.3f} ms p95")
+    for n, r in cobertura.items():
+        print(f"cobertura con {n:>5} conceptos: {r['ms']['mediana']:.2f} ms")
+    print(f"{'Simultáneas':<12}{'hilos eval/s':>14}{'asyncio eval/s':>16}{'p95 hilos':>12}{'p95 async':>12}")
+    for n, r in concurrencia.items():
+        print(
+            f"{n:<12}{r['hilos']['por_segundo']:>14}{r['asyncio']['por_segundo']:>16}"
+            f"{r['hilos']['latencia_s']['p95']:>11.2f}s{r['asyncio']['latencia_s']['p95']:>11.2f}s"
+        )
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 Resultados en: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
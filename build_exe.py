@@ -18,6 +18,24 @@ PyInstaller.__main__.run([
     '--icon=NONE',
     '--add-data=app.py;.',
     '--add-data=engine.py;.',
+    '--add-data=cache.py;.',
+    '--add-data=audio.py;.',
+    '--add-data=indice_conceptos.py;.',
+    '--add-data=limpieza.py;.',
+    '--add-data=metricas.py;.',
+    '--add-data=planificador.py;.',
+    '--add-data=enrutador.py;.',
+    '--add-data=pool_evaluadores.py;.',
+    '--add-data=progreso.py;.',
+    '--add-data=json_incremental.py;.',
+    '--add-data=esquemas.py;.',
+    '--add-data=recuperacion.py;.',
+    '--add-data=backends.py;.',
+    '--add-data=grabacion.py;.',
+    '--add-data=preguntas.py;.',
+    '--add-data=rubrica.py;.',
+    '--add-data=batch.py;.',
+    '--add-data=servidor.py;.',
     '--add-data=.env.example;.',
     '--hidden-import=streamlit',
     '--hidden-import=groq',
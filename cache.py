@@ -0,0 +1,185 @@
+"""
+Caché persistente en disco para resultados del motor de evaluación
+Cada entrada es un archivo JSON; se expulsan las menos usadas al superar el límite
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_CACHE_DEFECTO = (
+    os.getenv("EVALUADOR_CACHE_DIR")
+    or os.path.join(os.path.expanduser("~"), ".evaluador_cache")
+)
+
+
+_locks_directorios: Dict[str, threading.Lock] = {}
+_lock_registro = threading.Lock()
+
+
+def _lock_directorio(directorio: str) -> threading.Lock:
+    """Un lock por directorio: las cachés de distintos motores sobre el mismo directorio se coordinan"""
+    with _lock_registro:
+        return _locks_directorios.setdefault(os.path.realpath(directorio), threading.Lock())
+
+
+def hash_texto(*partes: str) -> str:
+    """Hash SHA-256 estable de varias cadenas"""
+    h = hashlib.sha256()
+    for parte in partes:
+        h.update(parte.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def hash_archivo(ruta: str, tamano_bloque: int = 1024 * 1024) -> str:
+    """Hash SHA-256 del contenido de un archivo, leído por bloques"""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class CacheDisco:
+    """Caché clave -> dict en un directorio, con expulsión LRU por número de entradas"""
+
+    def __init__(self, directorio: str, max_entradas: int = 256):
+        self.directorio = directorio
+        self.max_entradas = max_entradas
+        self._lock = _lock_directorio(directorio)
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.json")
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._leer(clave)
+
+    def guardar(self, clave: str, valor: Dict[str, Any]) -> None:
+        with self._lock:
+            self._escribir(clave, valor)
+
+    def _leer(self, clave: str) -> Optional[Dict[str, Any]]:
+        """Como obtener, con el lock ya tomado"""
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                valor = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        try:
+            # La fecha de modificación marca el último uso (orden LRU)
+            os.utime(ruta, None)
+        except OSError:
+            pass
+        return valor
+
+    def _escribir(self, clave: str, valor: Dict[str, Any]) -> None:
+        """Como guardar, con el lock ya tomado"""
+        ruta = self._ruta(clave)
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(valor, f, ensure_ascii=False)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            logger.warning(f"No se pudo escribir en caché: {e}")
+            return
+        self._expulsar()
+
+    def _expulsar(self) -> None:
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(".json"):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                entradas.append((os.path.getmtime(ruta), ruta))
+            except OSError:
+                continue
+
+        sobrantes = len(entradas) - self.max_entradas
+        if sobrantes <= 0:
+            return
+
+        entradas.sort()
+        for _, ruta in entradas[:sobrantes]:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+    def invalidar(self, clave: str) -> bool:
+        with self._lock:
+            try:
+                os.remove(self._ruta(clave))
+                return True
+            except OSError:
+                return False
+
+    def limpiar(self) -> int:
+        eliminadas = 0
+        with self._lock:
+            for nombre in os.listdir(self.directorio):
+                if nombre.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(self.directorio, nombre))
+                        eliminadas += 1
+                    except OSError:
+                        pass
+        return eliminadas
+
+    def num_entradas(self) -> int:
+        return len([n for n in os.listdir(self.directorio) if n.endswith(".json")])
+
+
+class CacheConceptos(CacheDisco):
+    """Conceptos clave extraídos, indexados por material, proveedor y modelo"""
+
+    def __init__(self, directorio: Optional[str] = None, max_entradas: int = 128):
+        super().__init__(
+            directorio or os.path.join(DIRECTORIO_CACHE_DEFECTO, "conceptos"),
+            max_entradas
+        )
+
+    @staticmethod
+    def clave(material_referencia: str, proveedor: str, modelo: str) -> str:
+        return hash_texto(material_referencia.strip(), proveedor, modelo)
+
+    def invalidar_material(self, material_referencia: str, proveedor: str, modelo: str) -> bool:
+        return self.invalidar(self.clave(material_referencia, proveedor, modelo))
+
+
+class CacheTranscripciones(CacheDisco):
+    """Transcripciones cruda y limpia, indexadas por el contenido del audio, idioma y modelo"""
+
+    def __init__(self, directorio: Optional[str] = None, max_entradas: int = 512):
+        super().__init__(
+            directorio or os.path.join(DIRECTORIO_CACHE_DEFECTO, "transcripciones"),
+            max_entradas
+        )
+
+    @staticmethod
+    def clave(hash_audio: str, idioma: str, modelo: str) -> str:
+        return hash_texto(hash_audio, idioma, modelo)
+
+    def obtener_limpia(self, clave: str, variante: str) -> Optional[str]:
+        entrada = self.obtener(clave)
+        if entrada is None:
+            return None
+        return entrada.get("limpias", {}).get(variante)
+
+    def guardar_limpia(self, clave: str, variante: str, texto: str) -> None:
+        # Leer y reescribir bajo el mismo lock: dos limpiezas del mismo audio no se pisan la variante
+        with self._lock:
+            entrada = self._leer(clave)
+            if entrada is None:
+                return
+            entrada.setdefault("limpias", {})[variante] = texto
+            self._escribir(clave, entrada)
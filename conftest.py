@@ -0,0 +1,2 @@
+"""Configuración de pytest: test_evaluacion.py es un script de diagnóstico contra la API real, no una prueba"""
+collect_ignore = ["test_evaluacion.py"]
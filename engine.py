@@ -1,91 +1,660 @@
 import os
 import json
-import re
-from typing import Dict, Any, Optional, List
-from groq import Groq
+import logging
+import shutil
+import asyncio
+import contextvars
+import time
+import queue
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterator, AsyncIterator
 from dotenv import load_dotenv
 
-try:
-    import google.generativeai as genai
-    GOOGLE_AI_AVAILABLE = True
-except ImportError:
-    GOOGLE_AI_AVAILABLE = False
+from cache import CacheConceptos, CacheTranscripciones, hash_archivo
+from indice_conceptos import calcular_cobertura, deduplicar_conceptos
+from recuperacion import fragmentos_relevantes, dividir_material
+from preguntas import preguntas_del_examen
+from rubrica import Rubrica, Criterio, ReglaAjuste, parsear_rubrica, sumar_calificacion
+from limpieza import (
+    MODOS_LIMPIEZA, limpiar_local, detectar_problemas, dividir_en_bloques, unir_bloques, conserva_contenido
+)
+from audio import (
+    PYDUB_AVAILABLE, dividir_audio, normalizar_segmentos, unir_transcripciones, preprocesar_audio, remapear_segmentos
+)
+from metricas import Trazador, RegistroEtapa
+from planificador import Planificador, ErrorProveedor, LlamadaCancelada, planificador_compartido, estimar_tokens
+from enrutador import Enrutador
+from progreso import EventoProgreso, ProcesoCancelado, ETAPA_PARCIAL
+from json_incremental import ParserJSONIncremental
+from esquemas import (
+    ErrorEsquema, Conceptos, Analisis, Calificacion, Feedback, EvaluacionRapida, EvaluacionPregunta, ValoracionCriterios,
+    validar_json, describir
+)
+from backends import (
+    TRANSCRIPTORES, SolicitudLLM, FragmentoLLM, RespuestaTranscripcion, BackendLLM, BackendTranscripcion,
+    BalanceadorTranscripcion, ClientesGroq, BackendGroq, BackendGemini, crear_transcriptor
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# "por_preguntas" divide la transcripción por pregunta y califica cada una a la vez con su ítem de la rúbrica
+MODOS_EVALUACION = ("completo", "rapido", "por_preguntas")
+# "multi" usa Groq y Gemini a la vez: duplica las peticiones lentas y conmuta si uno falla
+PROVEEDORES_LLM = ("groq", "google", "multi")
+# Materiales largos: conceptos por secciones en paralelo y fusión local (map-reduce)
+UMBRAL_CONCEPTOS_POR_SECCIONES = 8000
+CARACTERES_SECCION_CONCEPTOS = 6000
+MAX_SECCIONES_PARALELAS = 4
+# Transcripciones largas: bloques limpiados a la vez por el LLM
+MAX_BLOQUES_LIMPIEZA = 4
+MAX_PREGUNTAS_PARALELAS = 6
+# Material por pregunta: menos fragmentos que para el examen entero
+MAX_CARACTERES_MATERIAL_PREGUNTA = 1600
+CONFIANZA_ORDEN = ("bajo", "medio", "alto")
+# Rúbrica con puntos: el LLM valora los criterios en grupos (en paralelo) y la nota se suma localmente
+HOJAS_POR_LLAMADA = 4
+MAX_GRUPOS_CRITERIOS = 4
+# Penalizaciones sobre 10 cuando la rúbrica no define las suyas (las mismas que pide el prompt de calificación)
+PENALIZACION_ERROR_GRAVE = 1.0
+PENALIZACION_INVENTADA = 0.5
+LISTAS_CONCEPTOS = ("conceptos_principales", "conceptos_secundarios", "datos_especificos", "relaciones_procesos")
+
 
 class EvaluadorEngine:
     def __init__(
         self, 
         api_key: Optional[str] = None,
         proveedor: str = "groq",
-        google_api_key: Optional[str] = None
+        google_api_key: Optional[str] = None,
+        usar_cache: bool = True,
+        cache_conceptos: Optional[CacheConceptos] = None,
+        cache_transcripciones: Optional[CacheTranscripciones] = None,
+        trazador: Optional[Trazador] = None,
+        planificador: Optional[Planificador] = None,
+        transcriptor: str = "groq",
+        backends_llm: Optional[Dict[str, BackendLLM]] = None,
+        backend_transcripcion: Optional[BackendTranscripcion] = None,
+        preprocesar_audio: bool = True
     ):
+        """
+        `transcriptor`: "groq", "local" (Whisper en la CPU, sin subir el audio) o "balanceado".
+        `preprocesar_audio`: antes de transcribir, pasar el audio a mono 16 kHz, recortar silencios
+        y recodificarlo (se sube mucho menos; los tiempos se devuelven en el audio original)
+        `backends_llm` y `backend_transcripcion` reemplazan a los clientes de los SDK
+        (p. ej. para grabar y reproducir respuestas sin red)
+        """
         self.proveedor = proveedor.lower()
         
         self.groq_api_key = api_key or os.getenv("GROQ_API_KEY")
-        if not self.groq_api_key:
+        usa_groq = (
+            (backends_llm is None and self.proveedor in ("groq", "multi"))
+            or (backend_transcripcion is None and transcriptor != "local")
+        )
+        if usa_groq and not self.groq_api_key:
             raise ValueError("GROQ_API_KEY no encontrada (requerida para transcripción)")
+        clientes_groq = ClientesGroq(self.groq_api_key) if usa_groq else None
         
-        self.groq_client = Groq(api_key=self.groq_api_key)
-        self.whisper_model = "whisper-large-v3"
+        self.transcriptor = backend_transcripcion or crear_transcriptor(transcriptor, clientes_groq)
+        self.whisper_model = self.transcriptor.modelo
+        self.preprocesar_audio = preprocesar_audio and PYDUB_AVAILABLE
         
-        if self.proveedor == "google":
-            if not GOOGLE_AI_AVAILABLE:
-                raise ImportError("google-generativeai no está instalado. Ejecuta: pip install google-generativeai")
-            
-            self.google_api_key = google_api_key or os.getenv("GOOGLE_API_KEY")
-            if not self.google_api_key:
-                raise ValueError("GOOGLE_API_KEY no encontrada para usar Google AI")
-            
-            genai.configure(api_key=self.google_api_key)
-            self.google_model = genai.GenerativeModel("gemini-1.5-flash")
-            self.llm_model = "gemini-1.5-flash"
+        if backends_llm is None:
+            backends_llm = {}
+            if self.proveedor in ("groq", "multi"):
+                backends_llm["groq"] = BackendGroq(clientes_groq)
+            if self.proveedor in ("google", "multi"):
+                self.google_api_key = google_api_key or os.getenv("GOOGLE_API_KEY")
+                if not self.google_api_key:
+                    raise ValueError("GOOGLE_API_KEY no encontrada para usar Google AI")
+                backends_llm["google"] = BackendGemini(self.google_api_key)
+        self.backends_llm = backends_llm
+        
+        self.enrutador = None
+        if self.proveedor == "multi":
+            self.llm_model = "+".join(b.modelo for b in self.backends_llm.values())
+            self.enrutador = Enrutador(list(self.backends_llm))
+        elif self.proveedor in self.backends_llm:
+            self.llm_model = self.backends_llm[self.proveedor].modelo
         else:
-            self.llm_model = "llama-3.3-70b-versatile"
+            raise ValueError(f"No hay backend LLM para el proveedor {self.proveedor}")
+        
+        self.cache_conceptos = (cache_conceptos or CacheConceptos()) if usar_cache else None
+        self.cache_transcripciones = (cache_transcripciones or CacheTranscripciones()) if usar_cache else None
+        # Un lock por material (clave de caché): solo esperan entre sí los alumnos del mismo material
+        self._locks_conceptos: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+        self._lock_locks = threading.Lock()
+        self.uso_tokens = {"llamadas": 0, "prompt": 0, "completion": 0}
+        self._lock_uso = threading.Lock()
+        self.trazador = trazador or Trazador()
+        self.planificador = planificador or planificador_compartido()
+        # Estado asíncrono por event loop: locks de conceptos por material en cada loop
+        self._estado_async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
     
-    def _llamar_llm(self, system_prompt: str, user_prompt: str, temperature: float = 0.1, max_tokens: int = 4000) -> str:
-        if self.proveedor == "google":
-            prompt_completo = f"{system_prompt}\n\n---\n\nUSUARIO: {user_prompt}"
-            
-            generation_config = genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens
+    def _estado_loop(self) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        estado = self._estado_async.get(loop)
+        if estado is None:
+            estado = {"locks_conceptos": weakref.WeakValueDictionary()}
+            self._estado_async[loop] = estado
+        return estado
+    
+    def _backends(self) -> List[Any]:
+        """Backends de LLM y transcripción sin repetir los que comparten clientes (Groq para ambos)"""
+        unicos: Dict[int, Any] = {}
+        for backend in [*self.backends_llm.values(), self.transcriptor]:
+            unicos.setdefault(id(getattr(backend, "clientes", backend)), backend)
+        return list(unicos.values())
+    
+    def calentar(self) -> Dict[str, float]:
+        """
+        Abre las conexiones (DNS + TLS) con peticiones que no consumen tokens, y carga el
+        modelo de Whisper local si lo hay, para que la primera evaluación no pague ese costo.
+        Devuelve los segundos por backend
+        """
+        tiempos = {}
+        for backend in self._backends():
+            inicio = time.perf_counter()
+            try:
+                backend.calentar()
+                tiempos[backend.nombre] = round(time.perf_counter() - inicio, 3)
+            except Exception as e:
+                logger.warning(f"No se pudo precalentar {backend.nombre}: {e}")
+        
+        logger.debug(f"Conexiones precalentadas: {tiempos}")
+        return tiempos
+    
+    def cerrar(self):
+        """Cierra los pools de conexiones de los backends"""
+        for backend in self._backends():
+            try:
+                backend.cerrar()
+            except Exception as e:
+                logger.warning(f"Error al cerrar {backend.nombre}: {e}")
+
+    async def acerrar(self):
+        """
+        Cierra los clientes asíncronos del event loop actual. Conviene llamarlo antes de que el
+        loop termine (p. ej. al final de asyncio.run): cerrar() ya no puede cerrarlos en un loop cerrado
+        """
+        for backend in self._backends():
+            clientes = getattr(backend, "clientes", None)
+            if clientes is None or not hasattr(clientes, "acerrar"):
+                continue
+            try:
+                await clientes.acerrar()
+            except Exception as e:
+                logger.warning(f"Error al cerrar {backend.nombre}: {e}")
+    
+    def _registrar_uso(self, prompt: int, completion: int):
+        with self._lock_uso:
+            self.uso_tokens["llamadas"] += 1
+            self.uso_tokens["prompt"] += prompt
+            self.uso_tokens["completion"] += completion
+    
+    def _completar(
+        self, 
+        proveedor: str, 
+        system_prompt: str, 
+        user_prompt: str, 
+        temperature: float, 
+        max_tokens: int,
+        registro: Any = None,
+        cancelar: Optional[threading.Event] = None,
+        al_campo: Optional[Callable[[str, Any], None]] = None,
+        formato_json: bool = False,
+        al_enviar: Optional[Callable[[], None]] = None
+    ) -> Tuple[str, int, int]:
+        """
+        Una llamada a un proveedor concreto; devuelve (texto, tokens prompt, tokens completion).
+        Con al_campo la respuesta se transmite y cada campo JSON completo se entrega al llegar.
+        Con formato_json se usa el modo JSON del proveedor: la respuesta es un objeto JSON sin texto alrededor.
+        `al_enviar` se llama cuando cada intento sale hacia el proveedor (el enrutador mide ahí la latencia)
+        """
+        backend = self.backends_llm[proveedor]
+        solicitud = SolicitudLLM(system_prompt, user_prompt, temperature, max_tokens, formato_json)
+        # Se reserva el peor caso (prompt + max_tokens) y se corrige con el uso real
+        tokens = estimar_tokens(system_prompt, user_prompt) + max_tokens
+        
+        # Con `cancelar` (petición duplicada por el enrutador) se transmite siempre: así la perdedora
+        # se corta en el siguiente fragmento y no retiene un hilo del enrutador hasta terminar
+        if al_campo is None and cancelar is None:
+            respuesta = self.planificador.ejecutar(
+                backend.recurso, lambda: backend.completar(solicitud), tokens, registro, al_enviar=al_enviar
             )
-            
-            response = self.google_model.generate_content(
-                prompt_completo,
-                generation_config=generation_config
+            texto, prompt, completion = respuesta.texto, respuesta.tokens_prompt, respuesta.tokens_completion
+        else:
+            texto, prompt, completion = self.planificador.ejecutar(
+                backend.recurso,
+                lambda: self._transmitir(backend.transmitir(solicitud), al_campo, cancelar),
+                tokens,
+                registro,
+                cancelar,
+                al_enviar
+            )
+        
+        self._registrar_uso(prompt, completion)
+        self.planificador.corregir_tokens(backend.recurso, tokens, prompt + completion)
+        return texto, prompt, completion
+    
+    async def _acompletar(
+        self, 
+        proveedor: str, 
+        system_prompt: str, 
+        user_prompt: str, 
+        temperature: float, 
+        max_tokens: int,
+        registro: Any = None,
+        al_campo: Optional[Callable[[str, Any], None]] = None,
+        formato_json: bool = False,
+        al_enviar: Optional[Callable[[], None]] = None
+    ) -> Tuple[str, int, int]:
+        backend = self.backends_llm[proveedor]
+        solicitud = SolicitudLLM(system_prompt, user_prompt, temperature, max_tokens, formato_json)
+        tokens = estimar_tokens(system_prompt, user_prompt) + max_tokens
+        
+        if al_campo is None:
+            respuesta = await self.planificador.aejecutar(
+                backend.recurso, lambda: backend.acompletar(solicitud), tokens, registro, al_enviar
             )
-            return response.text.strip()
+            texto, prompt, completion = respuesta.texto, respuesta.tokens_prompt, respuesta.tokens_completion
         else:
-            response = self.groq_client.chat.completions.create(
-                model=self.llm_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens
+            texto, prompt, completion = await self.planificador.aejecutar(
+                backend.recurso,
+                lambda: self._atransmitir(backend.atransmitir(solicitud), al_campo),
+                tokens,
+                registro,
+                al_enviar
             )
-            return response.choices[0].message.content.strip()
+        
+        self._registrar_uso(prompt, completion)
+        self.planificador.corregir_tokens(backend.recurso, tokens, prompt + completion)
+        return texto, prompt, completion
+    
+    @staticmethod
+    def _acumular(fragmento: FragmentoLLM, partes: List[str], uso: List[int], parser: ParserJSONIncremental,
+                  al_campo: Optional[Callable[[str, Any], None]]):
+        if fragmento.tokens_prompt is not None:
+            uso[:] = [fragmento.tokens_prompt, fragmento.tokens_completion or 0]
+        if fragmento.texto:
+            partes.append(fragmento.texto)
+            if al_campo is not None:
+                for ruta, valor in parser.alimentar(fragmento.texto):
+                    al_campo(ruta, valor)
+    
+    def _transmitir(
+        self, 
+        fragmentos: Iterator[FragmentoLLM], 
+        al_campo: Optional[Callable[[str, Any], None]], 
+        cancelar: Optional[threading.Event] = None
+    ) -> Tuple[str, int, int]:
+        """Consume una respuesta transmitida; devuelve (texto, tokens prompt, tokens completion)"""
+        parser = ParserJSONIncremental()
+        partes: List[str] = []
+        uso = [0, 0]
+        try:
+            for fragmento in fragmentos:
+                if cancelar is not None and cancelar.is_set():
+                    raise LlamadaCancelada("stream")
+                self._acumular(fragmento, partes, uso, parser, al_campo)
+        finally:
+            # Cerrar el generador cierra el stream del proveedor y libera la conexión
+            fragmentos.close()
+        return "".join(partes).strip(), uso[0], uso[1]
     
-    def transcribir_audio(self, audio_file_path: str, idioma: str = "es") -> Dict[str, Any]:
+    async def _atransmitir(
+        self, 
+        fragmentos: AsyncIterator[FragmentoLLM], 
+        al_campo: Callable[[str, Any], None]
+    ) -> Tuple[str, int, int]:
+        parser = ParserJSONIncremental()
+        partes: List[str] = []
+        uso = [0, 0]
         try:
-            with open(audio_file_path, "rb") as audio_file:
-                transcription = self.groq_client.audio.transcriptions.create(
-                    file=(os.path.basename(audio_file_path), audio_file.read()),
-                    model=self.whisper_model,
-                    response_format="verbose_json",
-                    language=idioma,
+            async for fragmento in fragmentos:
+                self._acumular(fragmento, partes, uso, parser, al_campo)
+        finally:
+            # También al cancelar la tarea
+            await fragmentos.aclose()
+        return "".join(partes).strip(), uso[0], uso[1]
+    
+    def _llamar_llm(
+        self, 
+        system_prompt: str, 
+        user_prompt: str, 
+        temperature: float = 0.1, 
+        max_tokens: int = 4000,
+        etapa: str = "llm",
+        al_campo: Optional[Callable[[str, Any], None]] = None,
+        formato_json: bool = False
+    ) -> str:
+        """Con al_campo la respuesta se transmite y cada campo JSON se entrega en cuanto está completo"""
+        with self.trazador.etapa(etapa, self.proveedor, self.llm_model) as registro:
+            al_campo = self._medir_primer_campo(al_campo, registro)
+            if self.enrutador is None:
+                texto, prompt, completion = self._completar(
+                    self.proveedor, system_prompt, user_prompt, temperature, max_tokens, registro,
+                    al_campo=al_campo, formato_json=formato_json
                 )
+            else:
+                campos_de = self._arbitrar_campos(al_campo)
+                proveedor, (texto, prompt, completion), lanzados = self.enrutador.ejecutar(
+                    etapa,
+                    {
+                        p: (lambda cancelar, al_enviar, p=p: self._completar(
+                            p, system_prompt, user_prompt, temperature, max_tokens, cancelar=cancelar,
+                            al_campo=campos_de(p), formato_json=formato_json, al_enviar=al_enviar
+                        ))
+                        for p in self.backends_llm
+                    },
+                    es_valida=lambda r: bool(r[0])
+                )
+                self._anotar_enrutamiento(registro, proveedor, lanzados)
+            
+            registro.tokens_prompt, registro.tokens_completion = prompt, completion
+            return texto
+    
+    async def _allamar_llm(
+        self, 
+        system_prompt: str, 
+        user_prompt: str, 
+        temperature: float = 0.1, 
+        max_tokens: int = 4000,
+        etapa: str = "llm",
+        al_campo: Optional[Callable[[str, Any], None]] = None,
+        formato_json: bool = False
+    ) -> str:
+        with self.trazador.etapa(etapa, self.proveedor, self.llm_model) as registro:
+            al_campo = self._medir_primer_campo(al_campo, registro)
+            if self.enrutador is None:
+                texto, prompt, completion = await self._acompletar(
+                    self.proveedor, system_prompt, user_prompt, temperature, max_tokens, registro,
+                    al_campo=al_campo, formato_json=formato_json
+                )
+            else:
+                campos_de = self._arbitrar_campos(al_campo)
+                proveedor, (texto, prompt, completion), lanzados = await self.enrutador.aejecutar(
+                    etapa,
+                    {
+                        p: (lambda al_enviar, p=p: self._acompletar(
+                            p, system_prompt, user_prompt, temperature, max_tokens,
+                            al_campo=campos_de(p), formato_json=formato_json, al_enviar=al_enviar
+                        ))
+                        for p in self.backends_llm
+                    },
+                    es_valida=lambda r: bool(r[0])
+                )
+                self._anotar_enrutamiento(registro, proveedor, lanzados)
             
+            registro.tokens_prompt, registro.tokens_completion = prompt, completion
+            return texto
+    
+    def _anotar_enrutamiento(self, registro: Any, proveedor: str, lanzados: int):
+        registro.proveedor = proveedor
+        registro.modelo = self.backends_llm[proveedor].modelo
+        registro.duplicada = lanzados > 1
+    
+    @staticmethod
+    def _medir_primer_campo(
+        al_campo: Optional[Callable[[str, Any], None]], 
+        registro: Any
+    ) -> Optional[Callable[[str, Any], None]]:
+        if al_campo is None:
+            return None
+        inicio = time.perf_counter()
+        
+        def medido(ruta: str, valor: Any):
+            if registro.primer_campo_s is None:
+                registro.primer_campo_s = round(time.perf_counter() - inicio, 4)
+            al_campo(ruta, valor)
+        return medido
+    
+    @staticmethod
+    def _arbitrar_campos(
+        al_campo: Optional[Callable[[str, Any], None]]
+    ) -> Callable[[str], Optional[Callable[[str, Any], None]]]:
+        """Con peticiones duplicadas solo se transmiten los campos del primer proveedor que responda"""
+        if al_campo is None:
+            return lambda proveedor: None
+        elegido: List[str] = []
+        lock = threading.Lock()
+        
+        def campos_de(proveedor: str) -> Callable[[str, Any], None]:
+            def emitir(ruta: str, valor: Any):
+                with lock:
+                    if not elegido:
+                        elegido.append(proveedor)
+                if elegido[0] == proveedor:
+                    al_campo(ruta, valor)
+            return emitir
+        return campos_de
+    
+    def _requiere_segmentar(self, audio_file_path: str, segmentar: Optional[bool]) -> bool:
+        if segmentar is not None:
+            return segmentar
+        try:
+            limite = self.transcriptor.limite_bytes
+            return limite is not None and os.path.getsize(audio_file_path) > limite
+        except OSError:
+            return False
+    
+    def _candidatos_transcripcion(self) -> List[BackendTranscripcion]:
+        if isinstance(self.transcriptor, BalanceadorTranscripcion):
+            return self.transcriptor.ordenar()
+        return [self.transcriptor]
+    
+    def _ocupar_transcriptor(self, backend: BackendTranscripcion, delta: int):
+        if isinstance(self.transcriptor, BalanceadorTranscripcion):
+            self.transcriptor.ocupar(backend, delta)
+    
+    def _solicitar_transcripcion(self, audio_file_path: str, idioma: str) -> Tuple[str, RespuestaTranscripcion]:
+        """Transcribe con el backend menos ocupado; si falla, con el siguiente. Devuelve (backend, transcripción)"""
+        candidatos = self._candidatos_transcripcion()
+        for i, backend in enumerate(candidatos):
+            self._ocupar_transcriptor(backend, 1)
+            try:
+                return backend.nombre, self.planificador.ejecutar(
+                    backend.recurso,
+                    lambda: backend.transcribir(audio_file_path, idioma)
+                )
+            except Exception as e:
+                if i == len(candidatos) - 1:
+                    raise
+                logger.warning(f"Transcripción con {backend.nombre} fallida, se usa {candidatos[i + 1].nombre}: {e}")
+            finally:
+                self._ocupar_transcriptor(backend, -1)
+    
+    async def _asolicitar_transcripcion(self, audio_file_path: str, idioma: str) -> Tuple[str, RespuestaTranscripcion]:
+        candidatos = self._candidatos_transcripcion()
+        for i, backend in enumerate(candidatos):
+            self._ocupar_transcriptor(backend, 1)
+            try:
+                return backend.nombre, await self.planificador.aejecutar(
+                    backend.recurso,
+                    lambda: backend.atranscribir(audio_file_path, idioma)
+                )
+            except Exception as e:
+                if i == len(candidatos) - 1:
+                    raise
+                logger.warning(f"Transcripción con {backend.nombre} fallida, se usa {candidatos[i + 1].nombre}: {e}")
+            finally:
+                self._ocupar_transcriptor(backend, -1)
+    
+    def transcribir_audio(
+        self, 
+        audio_file_path: str, 
+        idioma: str = "es", 
+        segmentar: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        with self.trazador.etapa("transcripcion", self.transcriptor.nombre, self.whisper_model) as registro:
+            resultado = self._transcribir_con_cache(audio_file_path, idioma, segmentar)
+            self._anotar_transcripcion(registro, resultado)
+            return resultado
+    
+    def _transcribir_con_cache(self, audio_file_path: str, idioma: str, segmentar: Optional[bool]) -> Dict[str, Any]:
+        if self.cache_transcripciones is None:
+            return self._transcribir_sin_cache(audio_file_path, idioma, segmentar)
+        
+        try:
+            hash_audio = hash_archivo(audio_file_path)
+        except OSError as e:
+            return {
+                "success": False,
+                "error": f"Error al transcribir audio: {str(e)}"
+            }
+        
+        cacheado = self._transcripcion_en_cache(hash_audio, idioma)
+        if cacheado is not None:
+            return cacheado
+        
+        resultado = self._transcribir_sin_cache(audio_file_path, idioma, segmentar)
+        return self._guardar_transcripcion(hash_audio, idioma, resultado)
+    
+    async def atranscribir_audio(
+        self, 
+        audio_file_path: str, 
+        idioma: str = "es", 
+        segmentar: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        with self.trazador.etapa("transcripcion", self.transcriptor.nombre, self.whisper_model) as registro:
+            resultado = await self._atranscribir_con_cache(audio_file_path, idioma, segmentar)
+            self._anotar_transcripcion(registro, resultado)
+            return resultado
+    
+    async def _atranscribir_con_cache(self, audio_file_path: str, idioma: str, segmentar: Optional[bool]) -> Dict[str, Any]:
+        if self.cache_transcripciones is None:
+            return await self._atranscribir_sin_cache(audio_file_path, idioma, segmentar)
+        
+        try:
+            hash_audio = await asyncio.to_thread(hash_archivo, audio_file_path)
+        except OSError as e:
+            return {
+                "success": False,
+                "error": f"Error al transcribir audio: {str(e)}"
+            }
+        
+        cacheado = self._transcripcion_en_cache(hash_audio, idioma)
+        if cacheado is not None:
+            return cacheado
+        
+        resultado = await self._atranscribir_sin_cache(audio_file_path, idioma, segmentar)
+        return self._guardar_transcripcion(hash_audio, idioma, resultado)
+    
+    @staticmethod
+    def _anotar_transcripcion(registro: Any, resultado: Dict[str, Any]):
+        # Con el balanceador, el backend que realmente transcribió
+        registro.proveedor = resultado.get("transcriptor", registro.proveedor)
+        if not resultado["success"]:
+            registro.resultado = "error"
+            registro.error = resultado.get("error")
+        elif resultado.get("desde_cache"):
+            registro.resultado = "cache"
+    
+    def _transcripcion_en_cache(self, hash_audio: str, idioma: str) -> Optional[Dict[str, Any]]:
+        clave = CacheTranscripciones.clave(hash_audio, idioma, self.whisper_model)
+        cacheado = self.cache_transcripciones.obtener(clave)
+        if cacheado is None:
+            return None
+        
+        logger.debug(f"Transcripción obtenida de caché ({hash_audio[:12]})")
+        cacheado.pop("limpias", None)
+        return {
+            **cacheado,
+            "success": True,
+            "hash_audio": hash_audio,
+            "desde_cache": True
+        }
+    
+    def _guardar_transcripcion(self, hash_audio: str, idioma: str, resultado: Dict[str, Any]) -> Dict[str, Any]:
+        if not resultado["success"]:
+            return resultado
+        
+        clave = CacheTranscripciones.clave(hash_audio, idioma, self.whisper_model)
+        self.cache_transcripciones.guardar(clave, {
+            "transcripcion": resultado["transcripcion"],
+            "duracion": resultado.get("duracion"),
+            "idioma": idioma,
+            "segmentos": resultado.get("segmentos", []),
+            "limpias": {}
+        })
+        return {**resultado, "hash_audio": hash_audio, "desde_cache": False}
+    
+    def _preprocesar(self, audio_file_path: str, directorio: str) -> Optional[Dict[str, Any]]:
+        """Audio reducido para subir; None si está desactivado, falla o no ahorra nada (se sube el original)"""
+        if not self.preprocesar_audio:
+            return None
+        try:
+            with self.trazador.etapa("preprocesado", "local", "vad"):
+                preprocesado = preprocesar_audio(audio_file_path, directorio)
+        except Exception as e:
+            logger.warning(f"No se pudo preprocesar el audio, se sube el original: {e}")
+            return None
+        if preprocesado["bytes"] >= preprocesado["bytes_original"]:
+            return None
+        logger.debug(
+            f"Audio preprocesado: {preprocesado['duracion_original']}s -> {preprocesado['duracion']}s, "
+            f"{preprocesado['bytes_original'] // 1024} KB -> {preprocesado['bytes'] // 1024} KB"
+        )
+        return preprocesado
+    
+    @staticmethod
+    def _resultado_preprocesado(resultado: Dict[str, Any], preprocesado: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Lleva los tiempos de la transcripción del audio preprocesado al original"""
+        if preprocesado is None or not resultado["success"]:
+            return resultado
+        return {
+            **resultado,
+            "segmentos": remapear_segmentos(resultado.get("segmentos", []), preprocesado["mapa"]),
+            "duracion": preprocesado["duracion_original"],
+            "preprocesado": {clave: preprocesado[clave] for clave in ("duracion", "bytes_original", "bytes")}
+        }
+    
+    def _transcribir_sin_cache(self, audio_file_path: str, idioma: str, segmentar: Optional[bool]) -> Dict[str, Any]:
+        directorio = tempfile.mkdtemp(prefix="evaluador_preprocesado_")
+        try:
+            preprocesado = self._preprocesar(audio_file_path, directorio)
+            ruta = preprocesado["ruta"] if preprocesado else audio_file_path
+            resultado = self._transcribir_archivo(ruta, idioma, segmentar)
+            return self._resultado_preprocesado(resultado, preprocesado)
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+    
+    def _transcribir_archivo(self, audio_file_path: str, idioma: str, segmentar: Optional[bool]) -> Dict[str, Any]:
+        if self._requiere_segmentar(audio_file_path, segmentar):
+            return self.transcribir_audio_por_segmentos(audio_file_path, idioma)
+        
+        try:
+            transcriptor, transcription = self._solicitar_transcripcion(audio_file_path, idioma)
+            return self._resultado_transcripcion(transcription, idioma, transcriptor)
+        
+        except Exception as e:
             return {
-                "success": True,
-                "transcripcion": transcription.text,
-                "duracion": getattr(transcription, 'duration', None),
-                "idioma": idioma
+                "success": False,
+                "error": f"Error al transcribir audio: {str(e)}"
             }
+    
+    async def _atranscribir_sin_cache(self, audio_file_path: str, idioma: str, segmentar: Optional[bool]) -> Dict[str, Any]:
+        directorio = tempfile.mkdtemp(prefix="evaluador_preprocesado_")
+        try:
+            preprocesado = await asyncio.to_thread(self._preprocesar, audio_file_path, directorio)
+            ruta = preprocesado["ruta"] if preprocesado else audio_file_path
+            resultado = await self._atranscribir_archivo(ruta, idioma, segmentar)
+            return self._resultado_preprocesado(resultado, preprocesado)
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+    
+    async def _atranscribir_archivo(self, audio_file_path: str, idioma: str, segmentar: Optional[bool]) -> Dict[str, Any]:
+        if self._requiere_segmentar(audio_file_path, segmentar):
+            return await self.atranscribir_audio_por_segmentos(audio_file_path, idioma)
+        
+        try:
+            transcriptor, transcription = await self._asolicitar_transcripcion(audio_file_path, idioma)
+            return self._resultado_transcripcion(transcription, idioma, transcriptor)
         
         except Exception as e:
             return {
@@ -93,7 +662,101 @@ class EvaluadorEngine:
                 "error": f"Error al transcribir audio: {str(e)}"
             }
     
-    def limpiar_transcripcion(self, transcripcion: str) -> str:
+    def transcribir_audio_por_segmentos(
+        self, 
+        audio_file_path: str, 
+        idioma: str = "es",
+        duracion_segmento: float = 300.0,
+        solape: float = 5.0,
+        max_workers: int = 4
+    ) -> Dict[str, Any]:
+        """Transcribe audios largos en segmentos solapados, en paralelo, y une el texto"""
+        directorio = tempfile.mkdtemp(prefix="evaluador_segmentos_")
+        try:
+            partes = dividir_audio(audio_file_path, duracion_segmento, solape, directorio)
+            logger.debug(f"Audio dividido en {len(partes)} segmentos")
+            
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                transcripciones = list(pool.map(
+                    lambda parte: self._solicitar_transcripcion(parte["ruta"], idioma),
+                    partes
+                ))
+            
+            return self._resultado_segmentado(partes, transcripciones, idioma)
+        
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error al transcribir audio por segmentos: {str(e)}"
+            }
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+    
+    async def atranscribir_audio_por_segmentos(
+        self, 
+        audio_file_path: str, 
+        idioma: str = "es",
+        duracion_segmento: float = 300.0,
+        solape: float = 5.0,
+        max_workers: int = 4
+    ) -> Dict[str, Any]:
+        directorio = tempfile.mkdtemp(prefix="evaluador_segmentos_")
+        try:
+            partes = await asyncio.to_thread(dividir_audio, audio_file_path, duracion_segmento, solape, directorio)
+            logger.debug(f"Audio dividido en {len(partes)} segmentos")
+            
+            semaforo = asyncio.Semaphore(max_workers)
+            
+            async def transcribir_parte(parte: Dict[str, Any]) -> Any:
+                async with semaforo:
+                    return await self._asolicitar_transcripcion(parte["ruta"], idioma)
+            
+            transcripciones = await asyncio.gather(*(transcribir_parte(p) for p in partes))
+            return self._resultado_segmentado(partes, transcripciones, idioma)
+        
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error al transcribir audio por segmentos: {str(e)}"
+            }
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+    
+    def _resultado_transcripcion(self, transcription: RespuestaTranscripcion, idioma: str, transcriptor: str) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "transcripcion": transcription.texto,
+            "duracion": transcription.duracion,
+            "idioma": idioma,
+            "segmentos": normalizar_segmentos(transcription.segmentos),
+            "transcriptor": transcriptor
+        }
+    
+    def _resultado_segmentado(
+        self, 
+        partes: List[Dict[str, Any]], 
+        transcripciones: List[Tuple[str, RespuestaTranscripcion]], 
+        idioma: str
+    ) -> Dict[str, Any]:
+        unido = unir_transcripciones([
+            {
+                "inicio": parte["inicio"],
+                "fin": parte["fin"],
+                "texto": transcription.texto,
+                "segmentos": normalizar_segmentos(transcription.segmentos, parte["inicio"])
+            }
+            for parte, (_, transcription) in zip(partes, transcripciones)
+        ])
+        return {
+            "success": True,
+            "transcripcion": unido["texto"],
+            "duracion": partes[-1]["fin"] if partes else None,
+            "idioma": idioma,
+            "segmentos": unido["segmentos"],
+            "transcriptor": "+".join(sorted({nombre for nombre, _ in transcripciones}))
+        }
+    
+    def _prompts_limpieza(self, transcripcion: str, contexto: str = "") -> Tuple[str, str]:
         system_prompt = """Eres un asistente especializado en limpiar transcripciones de exámenes orales académicos.
 
 TU TAREA:
@@ -109,18 +772,158 @@ REGLAS CRÍTICAS:
 - Mantén la estructura y orden de las ideas del estudiante
 
 Devuelve SOLO la transcripción limpia, sin comentarios ni explicaciones."""
+        if not contexto:
+            return system_prompt, f"Limpia esta transcripción:\n\n{transcripcion}"
+        return system_prompt, (
+            f"Contexto (final del fragmento anterior; NO lo incluyas en tu respuesta): {contexto}\n\n"
+            f"Limpia esta transcripción:\n\n{transcripcion}"
+        )
+
+    def _limpiar_localmente(self, transcripcion: str, idioma: str, modo: str) -> Tuple[str, bool]:
+        """Limpieza local; indica si además hace falta pasar el texto por el LLM"""
+        if modo not in MODOS_LIMPIEZA:
+            raise ValueError(f"Modo de limpieza desconocido: {modo}. Opciones: {', '.join(MODOS_LIMPIEZA)}")
+        if modo == "llm":
+            return transcripcion, True
+        
+        with self.trazador.etapa("limpieza_local", "local", "reglas"):
+            limpia = limpiar_local(transcripcion, idioma)
+        if modo == "local":
+            return limpia, False
         
+        motivos = detectar_problemas(transcripcion)
+        if motivos:
+            logger.debug(f"Limpieza con LLM por: {', '.join(motivos)}")
+        return limpia, bool(motivos)
+
+    @staticmethod
+    def _verificar_limpieza(bloque: Dict[str, str], limpio: str) -> str:
+        if conserva_contenido(bloque["texto"], limpio):
+            return limpio
+        logger.warning(
+            f"La limpieza con LLM acortó un bloque de {len(bloque['texto'])} a {len(limpio.strip())} caracteres; "
+            "se conserva la limpieza local"
+        )
+        return bloque["texto"]
+
+    def _limpiar_bloque(self, bloque: Dict[str, str]) -> str:
+        system_prompt, user_prompt = self._prompts_limpieza(bloque["texto"], bloque["contexto"])
         try:
-            return self._llamar_llm(
-                system_prompt,
-                f"Limpia esta transcripción:\n\n{transcripcion}",
-                temperature=0.1,
-                max_tokens=4000
-            )
+            limpio = self._llamar_llm(system_prompt, user_prompt, temperature=0.1, max_tokens=1500, etapa="limpieza")
+        except Exception as e:
+            logger.warning(f"Error en limpieza con LLM, se conserva la limpieza local: {e}")
+            return bloque["texto"]
+        return self._verificar_limpieza(bloque, limpio)
+
+    async def _alimpiar_bloque(self, bloque: Dict[str, str]) -> str:
+        system_prompt, user_prompt = self._prompts_limpieza(bloque["texto"], bloque["contexto"])
+        try:
+            limpio = await self._allamar_llm(system_prompt, user_prompt, temperature=0.1, max_tokens=1500, etapa="limpieza")
         except Exception as e:
-            return transcripcion
+            logger.warning(f"Error en limpieza con LLM, se conserva la limpieza local: {e}")
+            return bloque["texto"]
+        return self._verificar_limpieza(bloque, limpio)
+
+    def limpiar_transcripcion(self, transcripcion: str, idioma: str = "es", modo: str = "auto") -> str:
+        texto, usar_llm = self._limpiar_localmente(transcripcion, idioma, modo)
+        if not usar_llm:
+            return texto
+        
+        # Un examen largo no cabe en una sola respuesta: bloques de oraciones completas, en paralelo
+        bloques = dividir_en_bloques(texto)
+        if len(bloques) == 1:
+            return self._limpiar_bloque(bloques[0])
+        logger.debug(f"Limpieza con LLM en {len(bloques)} bloques")
+        with ThreadPoolExecutor(max_workers=min(MAX_BLOQUES_LIMPIEZA, len(bloques))) as pool:
+            futuros = [pool.submit(contextvars.copy_context().run, self._limpiar_bloque, b) for b in bloques]
+            return unir_bloques([f.result() for f in futuros])
+
+    async def alimpiar_transcripcion(self, transcripcion: str, idioma: str = "es", modo: str = "auto") -> str:
+        texto, usar_llm = self._limpiar_localmente(transcripcion, idioma, modo)
+        if not usar_llm:
+            return texto
+        
+        bloques = dividir_en_bloques(texto)
+        if len(bloques) == 1:
+            return await self._alimpiar_bloque(bloques[0])
+        logger.debug(f"Limpieza con LLM en {len(bloques)} bloques")
+        limite = asyncio.Semaphore(MAX_BLOQUES_LIMPIEZA)
+
+        async def limpiar(bloque: Dict[str, str]) -> str:
+            async with limite:
+                return await self._alimpiar_bloque(bloque)
+
+        return unir_bloques(list(await asyncio.gather(*(limpiar(b) for b in bloques))))
+
+    def invalidar_cache_conceptos(self, material_referencia: Optional[str] = None) -> int:
+        """Invalida los conceptos de un material (o toda la caché si no se indica)"""
+        if not self.cache_conceptos:
+            return 0
+        if material_referencia is None:
+            return self.cache_conceptos.limpiar()
+        return int(self.cache_conceptos.invalidar_material(material_referencia, self.proveedor, self.llm_model))
+
+    def _lock_conceptos(self, clave: str) -> threading.Lock:
+        with self._lock_locks:
+            lock = self._locks_conceptos.get(clave)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks_conceptos[clave] = lock
+            return lock
+
+    def _alock_conceptos(self, clave: str) -> asyncio.Lock:
+        locks = self._estado_loop()["locks_conceptos"]
+        lock = locks.get(clave)
+        if lock is None:
+            lock = asyncio.Lock()
+            locks[clave] = lock
+        return lock
+
+    def _conceptos_en_cache(self, clave: str) -> Optional[Dict[str, Any]]:
+        cacheado = self.cache_conceptos.obtener(clave)
+        if cacheado is not None:
+            logger.debug(f"Conceptos obtenidos de caché ({clave[:12]})")
+            self.trazador.registrar(RegistroEtapa("conceptos", self.proveedor, self.llm_model, resultado="cache"))
+        return cacheado
 
     def _extraer_conceptos_clave(self, material_referencia: str) -> Dict[str, Any]:
+        if self.cache_conceptos is None:
+            return self._extraer_conceptos_llm(material_referencia)[0]
+        
+        clave = CacheConceptos.clave(material_referencia, self.proveedor, self.llm_model)
+        # Un solo hilo extrae cada material: los demás alumnos del mismo material esperan y leen la caché
+        with self._lock_conceptos(clave):
+            cacheado = self._conceptos_en_cache(clave)
+            if cacheado is not None:
+                return cacheado
+            
+            conceptos, valido = self._extraer_conceptos_llm(material_referencia)
+            # Los resultados de respaldo no se guardan para no fijar un error en caché
+            if valido:
+                self.cache_conceptos.guardar(clave, conceptos)
+            return conceptos
+
+    async def _aextraer_conceptos_clave(self, material_referencia: str) -> Dict[str, Any]:
+        if self.cache_conceptos is None:
+            return (await self._aextraer_conceptos_llm(material_referencia))[0]
+        
+        clave = CacheConceptos.clave(material_referencia, self.proveedor, self.llm_model)
+        async with self._alock_conceptos(clave):
+            cacheado = self._conceptos_en_cache(clave)
+            if cacheado is not None:
+                return cacheado
+            
+            conceptos, valido = await self._aextraer_conceptos_llm(material_referencia)
+            if valido:
+                self.cache_conceptos.guardar(clave, conceptos)
+            return conceptos
+
+    def _prompts_conceptos(
+        self,
+        material_referencia: str,
+        seccion: Optional[int] = None,
+        total: Optional[int] = None
+    ) -> Tuple[str, str]:
         system_prompt = """Eres un experto en análisis de contenido académico. Tu tarea es extraer los conceptos clave de un material de referencia.
 
 Analiza el material y extrae:
@@ -138,42 +941,130 @@ Responde en JSON:
   "tema_detectado": "Biología|Matemáticas|Historia|Física|Química|Literatura|Otro",
   "nivel_dificultad": "Básico|Intermedio|Avanzado"
 }"""
+        if seccion is None:
+            return system_prompt, f"Material de referencia:\n\n{material_referencia}"
+        return system_prompt, (
+            f"Material de referencia (sección {seccion} de {total}; extrae solo lo que aparece en esta sección):"
+            f"\n\n{material_referencia}"
+        )
+
+    @staticmethod
+    def _secciones_material(material_referencia: str) -> List[str]:
+        if len(material_referencia) <= UMBRAL_CONCEPTOS_POR_SECCIONES:
+            return [material_referencia]
+        return dividir_material(material_referencia, CARACTERES_SECCION_CONCEPTOS)
+
+    def _conceptos_de_texto(self, texto: str, seccion: Optional[int] = None, total: Optional[int] = None) -> Dict[str, Any]:
+        system_prompt, user_prompt = self._prompts_conceptos(texto, seccion, total)
+        resultado = self._llamar_llm(
+            system_prompt, user_prompt, temperature=0.1, max_tokens=2000, etapa="conceptos", formato_json=True
+        )
+        return self._validar_respuesta("conceptos", Conceptos, resultado, max_tokens=2000)
+
+    async def _aconceptos_de_texto(self, texto: str, seccion: Optional[int] = None, total: Optional[int] = None) -> Dict[str, Any]:
+        system_prompt, user_prompt = self._prompts_conceptos(texto, seccion, total)
+        resultado = await self._allamar_llm(
+            system_prompt, user_prompt, temperature=0.1, max_tokens=2000, etapa="conceptos", formato_json=True
+        )
+        return await self._avalidar_respuesta("conceptos", Conceptos, resultado, max_tokens=2000)
+
+    def _fusionar_conceptos(self, parciales: List[Dict[str, Any]], idioma: str = "es") -> Dict[str, Any]:
+        """Une los conceptos de cada sección sin repetir los que solo cambian de redacción"""
+        if len(parciales) == 1:
+            return parciales[0]
+        conceptos: Dict[str, Any] = {}
+        for campo in LISTAS_CONCEPTOS:
+            todos = [c for parcial in parciales for c in parcial.get(campo, [])]
+            # Lo que una sección considera principal no se repite como secundario de otra
+            excluir = conceptos["conceptos_principales"] if campo == "conceptos_secundarios" else None
+            conceptos[campo] = deduplicar_conceptos(todos, idioma, excluir=excluir)
+        temas = Counter(p.get("tema_detectado") for p in parciales if p.get("tema_detectado") not in (None, "Otro"))
+        niveles = Counter(p.get("nivel_dificultad") for p in parciales if p.get("nivel_dificultad"))
+        conceptos["tema_detectado"] = temas.most_common(1)[0][0] if temas else "Otro"
+        conceptos["nivel_dificultad"] = niveles.most_common(1)[0][0] if niveles else "Intermedio"
+        return conceptos
 
+    def _extraer_conceptos_llm(self, material_referencia: str) -> Tuple[Dict[str, Any], bool]:
+        secciones = self._secciones_material(material_referencia)
         try:
-            resultado = self._llamar_llm(
-                system_prompt,
-                f"Material de referencia:\n\n{material_referencia}",
-                temperature=0.1,
-                max_tokens=2000
-            )
-            print(f"[DEBUG] Extracción conceptos - respuesta recibida: {len(resultado)} chars")
-            resultado = self._limpiar_json(resultado)
-            parsed = json.loads(resultado)
-            print(f"[DEBUG] Conceptos principales encontrados: {len(parsed.get('conceptos_principales', []))}")
-            return parsed
-        
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] JSON inválido en extracción de conceptos: {e}")
-            return {
-                "conceptos_principales": ["concepto general del tema"],
-                "conceptos_secundarios": [],
-                "datos_especificos": [],
-                "relaciones_procesos": [],
-                "tema_detectado": "General",
-                "nivel_dificultad": "Intermedio"
-            }
+            if len(secciones) == 1:
+                conceptos = self._conceptos_de_texto(material_referencia)
+            else:
+                logger.debug(f"Material largo: conceptos en {len(secciones)} secciones")
+                total = len(secciones)
+                with ThreadPoolExecutor(max_workers=min(MAX_SECCIONES_PARALELAS, total)) as pool:
+                    # Cada tarea corre en su propia copia del contexto para que el trazador la registre
+                    futuros = [
+                        pool.submit(contextvars.copy_context().run, self._conceptos_de_texto, seccion, i, total)
+                        for i, seccion in enumerate(secciones, 1)
+                    ]
+                    conceptos = self._fusionar_conceptos([f.result() for f in futuros])
+            logger.debug(f"Conceptos principales encontrados: {len(conceptos['conceptos_principales'])}")
+            return conceptos, True
+        # Una respuesta que sigue sin cumplir el esquema tras corregirla no se disfraza de conceptos vacíos
+        except (ErrorProveedor, ErrorEsquema):
+            raise
         except Exception as e:
-            print(f"[ERROR] Error en extracción de conceptos: {e}")
-            return {
-                "conceptos_principales": [],
-                "conceptos_secundarios": [],
-                "datos_especificos": [],
-                "relaciones_procesos": [],
-                "tema_detectado": "Otro",
-                "nivel_dificultad": "Intermedio"
-            }
+            return self._respaldo_conceptos(e), False
+
+    async def _aextraer_conceptos_llm(self, material_referencia: str) -> Tuple[Dict[str, Any], bool]:
+        secciones = self._secciones_material(material_referencia)
+        try:
+            if len(secciones) == 1:
+                conceptos = await self._aconceptos_de_texto(material_referencia)
+            else:
+                logger.debug(f"Material largo: conceptos en {len(secciones)} secciones")
+                total = len(secciones)
+                limite = asyncio.Semaphore(MAX_SECCIONES_PARALELAS)
+
+                async def extraer(seccion: str, i: int) -> Dict[str, Any]:
+                    async with limite:
+                        return await self._aconceptos_de_texto(seccion, i, total)
+
+                parciales = await asyncio.gather(*(extraer(s, i) for i, s in enumerate(secciones, 1)))
+                conceptos = self._fusionar_conceptos(list(parciales))
+            logger.debug(f"Conceptos principales encontrados: {len(conceptos['conceptos_principales'])}")
+            return conceptos, True
+        # Una respuesta que sigue sin cumplir el esquema tras corregirla no se disfraza de conceptos vacíos
+        except (ErrorProveedor, ErrorEsquema):
+            raise
+        except Exception as e:
+            return self._respaldo_conceptos(e), False
+
+    def _respaldo_conceptos(self, e: Exception) -> Dict[str, Any]:
+        logger.error(f"Error en extracción de conceptos: {e}")
+        return {
+            "conceptos_principales": [],
+            "conceptos_secundarios": [],
+            "datos_especificos": [],
+            "relaciones_procesos": [],
+            "tema_detectado": "Otro",
+            "nivel_dificultad": "Intermedio"
+        }
+
+    def _fragmentos_material(self, material_referencia: str, transcripcion: str, rubrica: str, idioma: str) -> List[str]:
+        """Secciones del material relevantes para lo que dijo el alumno y lo que pide la rúbrica"""
+        with self.trazador.etapa("recuperacion", "local", "bm25"):
+            fragmentos = fragmentos_relevantes(material_referencia, f"{transcripcion}\n{rubrica}", idioma)
+        logger.debug(f"Material: {len(fragmentos)} fragmentos relevantes, {sum(len(f) for f in fragmentos)} chars")
+        return fragmentos
+
+    @staticmethod
+    def _seccion_material(fragmentos: Optional[List[str]]) -> str:
+        if not fragmentos:
+            return ""
+        lista = "\n\n".join(f"[{i}] {fragmento}" for i, fragmento in enumerate(fragmentos, 1))
+        return f"""
+FRAGMENTOS DEL MATERIAL DE REFERENCIA (úsalos para verificar las afirmaciones del alumno):
+{lista}
+"""
 
-    def _analizar_respuesta_alumno(self, transcripcion: str, conceptos: Dict) -> Dict[str, Any]:
+    def _prompts_analisis(
+        self,
+        transcripcion: str,
+        conceptos: Dict,
+        fragmentos: Optional[List[str]] = None
+    ) -> Tuple[str, str]:
         system_prompt = f"""Eres un evaluador académico experto. Analiza la respuesta del estudiante comparándola con los conceptos clave esperados.
 
 CONCEPTOS ESPERADOS:
@@ -181,7 +1072,7 @@ CONCEPTOS ESPERADOS:
 - Secundarios: {json.dumps(conceptos.get('conceptos_secundarios', []), ensure_ascii=False)}
 - Datos específicos: {json.dumps(conceptos.get('datos_especificos', []), ensure_ascii=False)}
 - Relaciones/Procesos: {json.dumps(conceptos.get('relaciones_procesos', []), ensure_ascii=False)}
-
+{self._seccion_material(fragmentos)}
 INSTRUCCIONES:
 1. Identifica qué conceptos principales mencionó correctamente
 2. Identifica qué conceptos principales omitió
@@ -202,54 +1093,66 @@ Responde en JSON:
   "uso_vocabulario_tecnico": "excelente|bueno|regular|deficiente",
   "citas_destacadas": ["frases textuales del alumno que demuestran comprensión"]
 }}"""
+        return system_prompt, f"Respuesta del estudiante:\n\n{transcripcion}"
 
+    def _analizar_respuesta_alumno(
+        self,
+        transcripcion: str,
+        conceptos: Dict,
+        al_campo: Optional[Callable[[str, Any], None]] = None,
+        fragmentos: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        system_prompt, user_prompt = self._prompts_analisis(transcripcion, conceptos, fragmentos)
         try:
             resultado = self._llamar_llm(
-                system_prompt,
-                f"Respuesta del estudiante:\n\n{transcripcion}",
-                temperature=0.1,
-                max_tokens=3000
+                system_prompt, user_prompt, temperature=0.1, max_tokens=3000, etapa="analisis",
+                al_campo=al_campo, formato_json=True
             )
-            print(f"[DEBUG] Análisis respuesta - recibido: {len(resultado)} chars")
-            resultado = self._limpiar_json(resultado)
-            parsed = json.loads(resultado)
-            print(f"[DEBUG] Conceptos correctos identificados: {len(parsed.get('conceptos_correctos', []))}")
-            return parsed
-        
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] JSON inválido en análisis de respuesta: {e}")
-            return {
-                "conceptos_correctos": ["respuesta analizada"],
-                "conceptos_omitidos": [],
-                "errores_factuales": [],
-                "informacion_inventada": [],
-                "claridad_explicacion": "regular",
-                "coherencia_argumentativa": "regular",
-                "uso_vocabulario_tecnico": "regular",
-                "citas_destacadas": []
-            }
+            analisis = self._validar_respuesta("analisis", Analisis, resultado, max_tokens=3000)
+            logger.debug(f"Conceptos correctos identificados: {len(analisis['conceptos_correctos'])}")
+            return analisis
+        except (ErrorProveedor, ErrorEsquema):
+            raise
         except Exception as e:
-            print(f"[ERROR] Error en análisis de respuesta: {e}")
-            return {
-                "conceptos_correctos": [],
-                "conceptos_omitidos": [],
-                "errores_factuales": [],
-                "informacion_inventada": [],
-                "claridad_explicacion": "regular",
-                "coherencia_argumentativa": "regular",
-                "uso_vocabulario_tecnico": "regular",
-                "citas_destacadas": []
-            }
+            return self._respaldo_analisis(e)
 
-    def _calcular_calificacion(
-        self, 
-        conceptos: Dict, 
-        analisis: Dict, 
-        rubrica: str
+    async def _aanalizar_respuesta_alumno(
+        self,
+        transcripcion: str,
+        conceptos: Dict,
+        al_campo: Optional[Callable[[str, Any], None]] = None,
+        fragmentos: Optional[List[str]] = None
     ) -> Dict[str, Any]:
-        system_prompt = f"""Eres un evaluador académico experto y justo. Debes calcular una calificación precisa basándote en el análisis realizado y la rúbrica del docente.
+        system_prompt, user_prompt = self._prompts_analisis(transcripcion, conceptos, fragmentos)
+        try:
+            resultado = await self._allamar_llm(
+                system_prompt, user_prompt, temperature=0.1, max_tokens=3000, etapa="analisis",
+                al_campo=al_campo, formato_json=True
+            )
+            analisis = await self._avalidar_respuesta("analisis", Analisis, resultado, max_tokens=3000)
+            logger.debug(f"Conceptos correctos identificados: {len(analisis['conceptos_correctos'])}")
+            return analisis
+        except (ErrorProveedor, ErrorEsquema):
+            raise
+        except Exception as e:
+            return self._respaldo_analisis(e)
+
+    def _respaldo_analisis(self, e: Exception) -> Dict[str, Any]:
+        logger.error(f"Error en análisis de respuesta: {e}")
+        return {
+            "conceptos_correctos": [],
+            "conceptos_omitidos": [],
+            "errores_factuales": [],
+            "informacion_inventada": [],
+            "claridad_explicacion": "regular",
+            "coherencia_argumentativa": "regular",
+            "uso_vocabulario_tecnico": "regular",
+            "citas_destacadas": []
+        }
 
-ANÁLISIS DEL EXAMEN:
+    @staticmethod
+    def _seccion_analisis(analisis: Dict) -> str:
+        return f"""ANÁLISIS DEL EXAMEN:
 - Conceptos correctos: {json.dumps(analisis.get('conceptos_correctos', []), ensure_ascii=False)}
 - Conceptos omitidos: {json.dumps(analisis.get('conceptos_omitidos', []), ensure_ascii=False)}
 - Errores factuales: {json.dumps(analisis.get('errores_factuales', []), ensure_ascii=False)}
@@ -257,10 +1160,21 @@ ANÁLISIS DEL EXAMEN:
 - Claridad: {analisis.get('claridad_explicacion', 'regular')}
 - Coherencia: {analisis.get('coherencia_argumentativa', 'regular')}
 - Vocabulario técnico: {analisis.get('uso_vocabulario_tecnico', 'regular')}
+"""
+
+    def _prompts_calificacion(
+        self, 
+        conceptos: Dict, 
+        analisis: Dict,
+        rubrica: str,
+        fragmentos: Optional[List[str]] = None
+    ) -> Tuple[str, str]:
+        system_prompt = f"""Eres un evaluador académico experto y justo. Debes calcular una calificación precisa basándote en el análisis realizado y la rúbrica del docente.
 
+{self._seccion_analisis(analisis)}
 RÚBRICA DEL DOCENTE:
 {rubrica}
-
+{self._seccion_material(fragmentos)}
 TEMA Y NIVEL:
 - Tema: {conceptos.get('tema_detectado', 'General')}
 - Nivel: {conceptos.get('nivel_dificultad', 'Intermedio')}
@@ -292,87 +1206,239 @@ Responde en JSON:
   "nivel_confianza": "alto|medio|bajo",
   "justificacion_general": "Explicación de la calificación"
 }}"""
+        return system_prompt, "Calcula la calificación según las instrucciones."
 
-        try:
-            resultado = self._llamar_llm(
-                system_prompt,
-                "Calcula la calificación según las instrucciones.",
-                temperature=0.1,
-                max_tokens=2000
-            )
-            print(f"[DEBUG] Respuesta calificación raw: {resultado[:500]}...")
-            resultado = self._limpiar_json(resultado)
-            parsed = json.loads(resultado)
-            print(f"[DEBUG] Calificación parseada: {parsed.get('calificacion_final', 'NO ENCONTRADA')}")
-            return parsed
-        
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] JSON inválido en calificación: {e}")
-            print(f"[ERROR] Texto recibido: {resultado[:1000] if resultado else 'VACÍO'}")
-            calificacion_extraida = self._extraer_calificacion_fallback(resultado)
-            return {
-                "calificacion_final": calificacion_extraida,
-                "calificacion_por_criterio": [],
-                "penalizaciones": [],
-                "bonificaciones": [],
-                "nivel_confianza": "bajo",
-                "justificacion_general": f"Calificación extraída del análisis del modelo."
-            }
-        except Exception as e:
-            print(f"[ERROR] Error general en calificación: {e}")
-            return {
-                "calificacion_final": 5.0,
-                "calificacion_por_criterio": [],
-                "penalizaciones": [],
-                "bonificaciones": [],
-                "nivel_confianza": "bajo",
-                "justificacion_general": f"Error al calcular: {str(e)}. Calificación estimada."
-            }
-    
-    def _extraer_calificacion_fallback(self, texto: str) -> float:
-        """Intenta extraer la calificación del texto cuando el JSON falla"""
-        if not texto:
-            return 5.0
-        
-        import re
-        
-        patrones = [
-            r'"calificacion_final"\s*:\s*(\d+\.?\d*)',
-            r'calificacion[:\s]+(\d+\.?\d*)',
-            r'(\d+\.?\d*)\s*/\s*10',
-            r'nota[:\s]+(\d+\.?\d*)',
-            r'puntaje[:\s]+(\d+\.?\d*)',
-        ]
-        
-        for patron in patrones:
-            match = re.search(patron, texto, re.IGNORECASE)
-            if match:
-                try:
-                    cal = float(match.group(1))
-                    if 0 <= cal <= 10:
-                        print(f"[DEBUG] Calificación extraída por fallback: {cal}")
-                        return cal
-                except:
-                    continue
-        
-        print(f"[DEBUG] No se pudo extraer calificación, usando 5.0 por defecto")
-        return 5.0
+    def _calcular_calificacion(
+        self, 
+        conceptos: Dict, 
+        analisis: Dict, 
+        rubrica: str,
+        al_campo: Optional[Callable[[str, Any], None]] = None,
+        fragmentos: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        rubrica_parseada = parsear_rubrica(rubrica)
+        if rubrica_parseada.calificable:
+            return self._calificar_por_criterios(rubrica_parseada, analisis, fragmentos)
+        system_prompt, user_prompt = self._prompts_calificacion(conceptos, analisis, rubrica, fragmentos)
+        # Sin respaldo: ni un 429 persistente ni una respuesta inválida se convierten en una nota por defecto
+        resultado = self._llamar_llm(
+            system_prompt, user_prompt, temperature=0.1, max_tokens=2000, etapa="calificacion",
+            al_campo=al_campo, formato_json=True
+        )
+        calificacion = self._validar_respuesta("calificacion", Calificacion, resultado, max_tokens=2000)
+        logger.debug(f"Calificación validada: {calificacion['calificacion_final']}")
+        return calificacion
 
-    def _generar_feedback(
+    async def _acalcular_calificacion(
         self, 
+        conceptos: Dict, 
         analisis: Dict, 
-        calificacion: Dict, 
-        conceptos: Dict
+        rubrica: str,
+        al_campo: Optional[Callable[[str, Any], None]] = None,
+        fragmentos: Optional[List[str]] = None
     ) -> Dict[str, Any]:
-        system_prompt = f"""Eres un tutor académico experto, empático y constructivo. Genera feedback personalizado para el estudiante.
+        rubrica_parseada = parsear_rubrica(rubrica)
+        if rubrica_parseada.calificable:
+            return await self._acalificar_por_criterios(rubrica_parseada, analisis, fragmentos)
+        system_prompt, user_prompt = self._prompts_calificacion(conceptos, analisis, rubrica, fragmentos)
+        # Sin respaldo: ni un 429 persistente ni una respuesta inválida se convierten en una nota por defecto
+        resultado = await self._allamar_llm(
+            system_prompt, user_prompt, temperature=0.1, max_tokens=2000, etapa="calificacion",
+            al_campo=al_campo, formato_json=True
+        )
+        calificacion = await self._avalidar_respuesta("calificacion", Calificacion, resultado, max_tokens=2000)
+        logger.debug(f"Calificación validada: {calificacion['calificacion_final']}")
+        return calificacion
 
-RESULTADOS DEL EXAMEN:
-- Calificación: {calificacion.get('calificacion_final', 0)}/10
-- Conceptos correctos: {json.dumps(analisis.get('conceptos_correctos', []), ensure_ascii=False)}
-- Conceptos omitidos: {json.dumps(analisis.get('conceptos_omitidos', []), ensure_ascii=False)}
-- Errores: {json.dumps(analisis.get('errores_factuales', []), ensure_ascii=False)}
-- Citas destacadas: {json.dumps(analisis.get('citas_destacadas', []), ensure_ascii=False)}
-- Tema: {conceptos.get('tema_detectado', 'General')}
+    def _prompts_criterios(
+        self,
+        hojas: List[Tuple[Criterio, str]],
+        reglas: List[ReglaAjuste],
+        analisis: Dict,
+        fragmentos: Optional[List[str]] = None
+    ) -> Tuple[str, str]:
+        criterios = "\n".join(f"- [{hoja.id}] {ruta} (máximo {hoja.puntos:g})" for hoja, ruta in hojas)
+        seccion_reglas = ""
+        if reglas:
+            lista = "\n".join(f"- [{regla.id}] {regla.texto}" for regla in reglas)
+            seccion_reglas = f"\nPENALIZACIONES Y BONIFICACIONES DE LA RÚBRICA:\n{lista}\n"
+        system_prompt = f"""Eres un evaluador académico experto y justo. Valora cada criterio de la rúbrica según el análisis del examen. No calcules la nota final: la suma se hace aparte.
+
+{self._seccion_analisis(analisis)}{self._seccion_material(fragmentos)}
+CRITERIOS A VALORAR:
+{criterios}
+{seccion_reglas}
+INSTRUCCIONES:
+1. Asigna a cada criterio un puntaje entre 0 y su máximo según lo que el alumno demostró
+2. Justifica cada puntaje en una frase
+3. En "ajustes" incluye solo las penalizaciones o bonificaciones que se aplican y cuántas veces
+
+Responde en JSON:
+{{
+  "criterios": [
+    {{"id": "1", "puntaje": 2.5, "justificacion": "razón"}}
+  ],
+  "ajustes": [
+    {{"regla": "P1", "veces": 1, "razon": "descripción"}}
+  ],
+  "nivel_confianza": "alto|medio|bajo"
+}}"""
+        return system_prompt, "Valora los criterios según las instrucciones."
+
+    def _valorar_criterios(
+        self,
+        hojas: List[Tuple[Criterio, str]],
+        reglas: List[ReglaAjuste],
+        analisis: Dict,
+        fragmentos: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        system_prompt, user_prompt = self._prompts_criterios(hojas, reglas, analisis, fragmentos)
+        resultado = self._llamar_llm(
+            system_prompt, user_prompt, temperature=0.1, max_tokens=1200, etapa="calificacion", formato_json=True
+        )
+        return self._validar_respuesta("calificacion", ValoracionCriterios, resultado, max_tokens=1200)
+
+    async def _avalorar_criterios(
+        self,
+        hojas: List[Tuple[Criterio, str]],
+        reglas: List[ReglaAjuste],
+        analisis: Dict,
+        fragmentos: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        system_prompt, user_prompt = self._prompts_criterios(hojas, reglas, analisis, fragmentos)
+        resultado = await self._allamar_llm(
+            system_prompt, user_prompt, temperature=0.1, max_tokens=1200, etapa="calificacion", formato_json=True
+        )
+        return await self._avalidar_respuesta("calificacion", ValoracionCriterios, resultado, max_tokens=1200)
+
+    @staticmethod
+    def _grupos_criterios(rubrica: Rubrica) -> List[Tuple[List[Tuple[Criterio, str]], List[ReglaAjuste]]]:
+        """Hojas en grupos de HOJAS_POR_LLAMADA; las reglas de ajuste van solo en el primero para no aplicarlas dos veces"""
+        hojas = rubrica.hojas()
+        reglas = [*rubrica.penalizaciones, *rubrica.bonificaciones]
+        return [
+            (hojas[i:i + HOJAS_POR_LLAMADA], reglas if i == 0 else [])
+            for i in range(0, len(hojas), HOJAS_POR_LLAMADA)
+        ]
+
+    def _calificar_por_criterios(self, rubrica: Rubrica, analisis: Dict, fragmentos: Optional[List[str]] = None) -> Dict[str, Any]:
+        grupos = self._grupos_criterios(rubrica)
+        if len(grupos) == 1:
+            valoraciones = [self._valorar_criterios(*grupos[0], analisis, fragmentos)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(MAX_GRUPOS_CRITERIOS, len(grupos))) as pool:
+                futuros = [
+                    pool.submit(contextvars.copy_context().run, self._valorar_criterios, hojas, reglas, analisis, fragmentos)
+                    for hojas, reglas in grupos
+                ]
+                valoraciones = [f.result() for f in futuros]
+        return self._sumar_valoraciones(rubrica, valoraciones, analisis)
+
+    async def _acalificar_por_criterios(self, rubrica: Rubrica, analisis: Dict, fragmentos: Optional[List[str]] = None) -> Dict[str, Any]:
+        limite = asyncio.Semaphore(MAX_GRUPOS_CRITERIOS)
+
+        async def valorar(hojas: List[Tuple[Criterio, str]], reglas: List[ReglaAjuste]) -> Dict[str, Any]:
+            async with limite:
+                return await self._avalorar_criterios(hojas, reglas, analisis, fragmentos)
+
+        valoraciones = await asyncio.gather(*(valorar(h, r) for h, r in self._grupos_criterios(rubrica)))
+        return self._sumar_valoraciones(rubrica, list(valoraciones), analisis)
+
+    @staticmethod
+    def _penalizaciones_por_defecto(analisis: Dict, total: float) -> List[Dict[str, Any]]:
+        """Sin reglas en la rúbrica: -1 por error grave y -0.5 por información inventada (sobre 10)"""
+        escala = total / 10
+        penalizaciones = [
+            {"razon": f"Error grave: {error.get('error', '')}", "puntos_restados": round(PENALIZACION_ERROR_GRAVE * escala, 2)}
+            for error in analisis.get("errores_factuales", []) if error.get("gravedad") == "grave"
+        ]
+        penalizaciones.extend(
+            {"razon": f"Información inventada: {afirmacion}", "puntos_restados": round(PENALIZACION_INVENTADA * escala, 2)}
+            for afirmacion in analisis.get("informacion_inventada", [])
+        )
+        return penalizaciones
+
+    def _ajustes_aplicados(
+        self,
+        rubrica: Rubrica,
+        ajustes: List[Dict[str, Any]],
+        analisis: Dict
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Penalizaciones y bonificaciones de las reglas que el modelo marcó como aplicadas.
+        Si la rúbrica no trae penalizaciones, se usan las de por defecto según el análisis
+        """
+        reglas = rubrica.reglas()
+        penalizaciones: List[Dict[str, Any]] = []
+        bonificaciones: List[Dict[str, Any]] = []
+        for ajuste in ajustes:
+            regla = reglas.get(ajuste["regla"].strip("[] "))
+            if regla is None or ajuste["veces"] <= 0:
+                continue
+            puntos = round(regla.puntos * ajuste["veces"], 2)
+            razon = ajuste["razon"] or regla.texto
+            if regla.id.startswith("P"):
+                penalizaciones.append({"razon": razon, "puntos_restados": puntos})
+            else:
+                bonificaciones.append({"razon": razon, "puntos_agregados": puntos})
+        if not rubrica.penalizaciones:
+            penalizaciones = self._penalizaciones_por_defecto(analisis, rubrica.total)
+        return penalizaciones, bonificaciones
+
+    def _sumar_valoraciones(self, rubrica: Rubrica, valoraciones: List[Dict[str, Any]], analisis: Dict) -> Dict[str, Any]:
+        """Calificación con el formato de siempre; toda la aritmética es local"""
+        puntajes: Dict[str, float] = {}
+        justificaciones: Dict[str, str] = {}
+        for valoracion in valoraciones:
+            for criterio in valoracion["criterios"]:
+                identificador = criterio["id"].strip("[] ")
+                puntajes[identificador] = criterio["puntaje"]
+                justificaciones[identificador] = criterio["justificacion"]
+
+        penalizaciones, bonificaciones = self._ajustes_aplicados(
+            rubrica, [a for v in valoraciones for a in v["ajustes"]], analisis
+        )
+        suma = sumar_calificacion(rubrica, puntajes, penalizaciones, bonificaciones)
+        sin_valorar = [c["id"] for c in suma["por_criterio"] if c["id"] not in puntajes]
+        if sin_valorar:
+            logger.warning(f"Criterios sin puntaje del modelo (cuentan 0): {', '.join(sin_valorar)}")
+        confianzas = [v["nivel_confianza"] for v in valoraciones] + (["bajo"] if sin_valorar else [])
+        logger.debug(f"Calificación sumada localmente: {suma['calificacion_final']} ({suma['neto']:g}/{suma['total']:g})")
+        return {
+            "calificacion_final": suma["calificacion_final"],
+            "calificacion_por_criterio": [
+                {
+                    "criterio": c["criterio"],
+                    "puntaje": c["puntaje"],
+                    "maximo": c["maximo"],
+                    "justificacion": justificaciones.get(c["id"], "Sin valoración del modelo")
+                }
+                for c in suma["por_criterio"]
+            ],
+            "penalizaciones": penalizaciones,
+            "bonificaciones": bonificaciones,
+            "nivel_confianza": min(confianzas, key=CONFIANZA_ORDEN.index),
+            "justificacion_general": (
+                f"{suma['obtenido']:g} de {suma['total']:g} puntos por criterios"
+                + (f", {suma['neto']:g} tras penalizaciones y bonificaciones" if penalizaciones or bonificaciones else "")
+            )
+        }
+
+    def _prompts_feedback(
+        self, 
+        analisis: Dict, 
+        calificacion: Dict, 
+        conceptos: Dict
+    ) -> Tuple[str, str]:
+        system_prompt = f"""Eres un tutor académico experto, empático y constructivo. Genera feedback personalizado para el estudiante.
+
+RESULTADOS DEL EXAMEN:
+- Calificación: {calificacion.get('calificacion_final', 0)}/10
+- Conceptos correctos: {json.dumps(analisis.get('conceptos_correctos', []), ensure_ascii=False)}
+- Conceptos omitidos: {json.dumps(analisis.get('conceptos_omitidos', []), ensure_ascii=False)}
+- Errores: {json.dumps(analisis.get('errores_factuales', []), ensure_ascii=False)}
+- Citas destacadas: {json.dumps(analisis.get('citas_destacadas', []), ensure_ascii=False)}
+- Tema: {conceptos.get('tema_detectado', 'General')}
 
 INSTRUCCIONES:
 1. Sé constructivo y motivador, pero honesto
@@ -400,34 +1466,502 @@ Responde en JSON:
     "comparacion_esperado": "Cómo se compara con lo esperado"
   }}
 }}"""
+        return system_prompt, "Genera el feedback según las instrucciones."
 
+    def _generar_feedback(
+        self, 
+        analisis: Dict, 
+        calificacion: Dict, 
+        conceptos: Dict,
+        al_campo: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        system_prompt, user_prompt = self._prompts_feedback(analisis, calificacion, conceptos)
         try:
             resultado = self._llamar_llm(
-                system_prompt,
-                "Genera el feedback según las instrucciones.",
-                temperature=0.3,
-                max_tokens=3000
+                system_prompt, user_prompt, temperature=0.3, max_tokens=3000, etapa="feedback",
+                al_campo=al_campo, formato_json=True
             )
-            resultado = self._limpiar_json(resultado)
-            return json.loads(resultado)
-        
+            return self._validar_respuesta("feedback", Feedback, resultado, max_tokens=3000)
+        except ErrorProveedor:
+            raise
         except Exception as e:
-            return {
-                "feedback_alumno": {
-                    "resumen": "No se pudo generar el feedback",
-                    "fortalezas": [],
-                    "areas_mejora": [],
-                    "errores_corregidos": [],
-                    "recomendaciones_estudio": [],
-                    "mensaje_motivacional": ""
-                },
-                "nota_docente": {
-                    "observaciones": f"Error: {str(e)}",
-                    "patron_errores": "",
-                    "sugerencia_refuerzo": "",
-                    "comparacion_esperado": ""
-                }
+            return self._respaldo_feedback(e)
+
+    async def _agenerar_feedback(
+        self, 
+        analisis: Dict, 
+        calificacion: Dict, 
+        conceptos: Dict,
+        al_campo: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        system_prompt, user_prompt = self._prompts_feedback(analisis, calificacion, conceptos)
+        try:
+            resultado = await self._allamar_llm(
+                system_prompt, user_prompt, temperature=0.3, max_tokens=3000, etapa="feedback",
+                al_campo=al_campo, formato_json=True
+            )
+            return await self._avalidar_respuesta("feedback", Feedback, resultado, max_tokens=3000)
+        except ErrorProveedor:
+            raise
+        except Exception as e:
+            return self._respaldo_feedback(e)
+
+    def _respaldo_feedback(self, e: Exception) -> Dict[str, Any]:
+        # La nota ya está calculada: sin feedback la evaluación sigue siendo válida
+        logger.error(f"Error al generar feedback: {e}")
+        return {
+            "feedback_alumno": {
+                "resumen": "No se pudo generar el feedback",
+                "fortalezas": [],
+                "areas_mejora": [],
+                "errores_corregidos": [],
+                "recomendaciones_estudio": [],
+                "mensaje_motivacional": ""
+            },
+            "nota_docente": {
+                "observaciones": f"Error: {str(e)}",
+                "patron_errores": "",
+                "sugerencia_refuerzo": "",
+                "comparacion_esperado": ""
             }
+        }
+
+    def _prompts_evaluacion_rapida(
+        self,
+        transcripcion: str,
+        conceptos: Dict,
+        rubrica: str,
+        fragmentos: Optional[List[str]] = None
+    ) -> Tuple[str, str]:
+        system_prompt = f"""Eres un evaluador académico experto, justo y constructivo. En una sola respuesta debes analizar el examen oral del estudiante, calificarlo según la rúbrica del docente y generar feedback.
+
+CONCEPTOS ESPERADOS:
+- Principales (críticos): {json.dumps(conceptos.get('conceptos_principales', []), ensure_ascii=False)}
+- Secundarios: {json.dumps(conceptos.get('conceptos_secundarios', []), ensure_ascii=False)}
+- Datos específicos: {json.dumps(conceptos.get('datos_especificos', []), ensure_ascii=False)}
+- Relaciones/Procesos: {json.dumps(conceptos.get('relaciones_procesos', []), ensure_ascii=False)}
+
+RÚBRICA DEL DOCENTE:
+{rubrica}
+{self._seccion_material(fragmentos)}
+TEMA Y NIVEL:
+- Tema: {conceptos.get('tema_detectado', 'General')}
+- Nivel: {conceptos.get('nivel_dificultad', 'Intermedio')}
+
+INSTRUCCIONES:
+1. ANÁLISIS: identifica conceptos mencionados correctamente y omitidos, errores factuales, información inventada, y evalúa claridad, coherencia y vocabulario técnico
+2. CALIFICACIÓN: usa la rúbrica del docente como guía principal. Si no hay rúbrica específica:
+   - Conceptos principales correctos: 40% del puntaje
+   - Conceptos secundarios correctos: 20% del puntaje
+   - Ausencia de errores graves: 20% del puntaje
+   - Claridad y coherencia: 10% del puntaje
+   - Vocabulario técnico: 10% del puntaje
+   Penaliza errores graves (-1 punto cada uno) e información inventada (-0.5 puntos cada una)
+3. FEEDBACK: constructivo y motivador pero honesto; destaca primero lo positivo, explica los errores de forma educativa y da sugerencias concretas
+
+Responde en JSON:
+{{
+  "analisis": {{
+    "conceptos_correctos": ["concepto1", "concepto2"],
+    "conceptos_omitidos": ["concepto1", "concepto2"],
+    "errores_factuales": [
+      {{"error": "descripción del error", "gravedad": "leve|moderado|grave", "cita_alumno": "lo que dijo el alumno"}}
+    ],
+    "informacion_inventada": ["afirmación inventada"],
+    "claridad_explicacion": "excelente|buena|regular|deficiente",
+    "coherencia_argumentativa": "excelente|buena|regular|deficiente",
+    "uso_vocabulario_tecnico": "excelente|bueno|regular|deficiente",
+    "citas_destacadas": ["frases textuales del alumno que demuestran comprensión"]
+  }},
+  "calificacion": {{
+    "calificacion_final": 8.5,
+    "calificacion_por_criterio": [
+      {{"criterio": "nombre", "puntaje": 3, "maximo": 4, "justificacion": "razón"}}
+    ],
+    "penalizaciones": [
+      {{"razon": "descripción", "puntos_restados": 0.5}}
+    ],
+    "bonificaciones": [
+      {{"razon": "descripción", "puntos_agregados": 0.5}}
+    ],
+    "nivel_confianza": "alto|medio|bajo",
+    "justificacion_general": "Explicación de la calificación"
+  }},
+  "feedback": {{
+    "feedback_alumno": {{
+      "resumen": "Resumen breve del desempeño",
+      "fortalezas": ["fortaleza1", "fortaleza2"],
+      "areas_mejora": ["área1", "área2"],
+      "errores_corregidos": [
+        {{"error": "lo que dijo mal", "correccion": "lo correcto", "explicacion": "por qué"}}
+      ],
+      "recomendaciones_estudio": ["recomendación1", "recomendación2"],
+      "mensaje_motivacional": "Mensaje final motivador"
+    }},
+    "nota_docente": {{
+      "observaciones": "Observaciones para el docente",
+      "patron_errores": "Si hay un patrón en los errores",
+      "sugerencia_refuerzo": "Qué temas reforzar",
+      "comparacion_esperado": "Cómo se compara con lo esperado"
+    }}
+  }}
+}}"""
+        return system_prompt, f"Respuesta del estudiante:\n\n{transcripcion}"
+
+    def _evaluar_en_una_llamada(
+        self, 
+        transcripcion: str, 
+        conceptos: Dict, 
+        rubrica: str,
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None,
+        fragmentos: Optional[List[str]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+        system_prompt, user_prompt = self._prompts_evaluacion_rapida(transcripcion, conceptos, rubrica, fragmentos)
+        try:
+            resultado = self._llamar_llm(
+                system_prompt, user_prompt, temperature=0.1, max_tokens=6000, etapa="evaluacion_rapida",
+                al_campo=self._emisor_parcial(al_progresar, "evaluacion_rapida"), formato_json=True
+            )
+            evaluacion = self._validar_respuesta("evaluacion_rapida", EvaluacionRapida, resultado, max_tokens=6000)
+            logger.debug(f"Calificación validada: {evaluacion['calificacion']['calificacion_final']}")
+            return evaluacion["analisis"], evaluacion["calificacion"], evaluacion["feedback"]
+        except ErrorProveedor:
+            raise
+        except Exception as e:
+            # Si la respuesta combinada no es válida se recurre a las etapas separadas
+            logger.warning(f"Evaluación rápida falló, usando modo completo: {e}")
+            analisis = self._analizar_respuesta_alumno(
+                transcripcion, conceptos, self._emisor_parcial(al_progresar, "analisis"), fragmentos
+            )
+            calificacion = self._calcular_calificacion(
+                conceptos, analisis, rubrica, self._emisor_parcial(al_progresar, "calificacion"), fragmentos
+            )
+            feedback = self._generar_feedback(
+                analisis, calificacion, conceptos, self._emisor_parcial(al_progresar, "feedback")
+            )
+            return analisis, calificacion, feedback
+
+    async def _aevaluar_en_una_llamada(
+        self, 
+        transcripcion: str, 
+        conceptos: Dict, 
+        rubrica: str,
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None,
+        fragmentos: Optional[List[str]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+        system_prompt, user_prompt = self._prompts_evaluacion_rapida(transcripcion, conceptos, rubrica, fragmentos)
+        try:
+            resultado = await self._allamar_llm(
+                system_prompt, user_prompt, temperature=0.1, max_tokens=6000, etapa="evaluacion_rapida",
+                al_campo=self._emisor_parcial(al_progresar, "evaluacion_rapida"), formato_json=True
+            )
+            evaluacion = await self._avalidar_respuesta("evaluacion_rapida", EvaluacionRapida, resultado, max_tokens=6000)
+            logger.debug(f"Calificación validada: {evaluacion['calificacion']['calificacion_final']}")
+            return evaluacion["analisis"], evaluacion["calificacion"], evaluacion["feedback"]
+        except ErrorProveedor:
+            raise
+        except Exception as e:
+            logger.warning(f"Evaluación rápida falló, usando modo completo: {e}")
+            analisis = await self._aanalizar_respuesta_alumno(
+                transcripcion, conceptos, self._emisor_parcial(al_progresar, "analisis"), fragmentos
+            )
+            calificacion = await self._acalcular_calificacion(
+                conceptos, analisis, rubrica, self._emisor_parcial(al_progresar, "calificacion"), fragmentos
+            )
+            feedback = await self._agenerar_feedback(
+                analisis, calificacion, conceptos, self._emisor_parcial(al_progresar, "feedback")
+            )
+            return analisis, calificacion, feedback
+
+    def _prompts_pregunta(
+        self,
+        pregunta: Dict[str, Any],
+        maximo: float,
+        conceptos: Dict,
+        fragmentos: List[str],
+        reglas: List[ReglaAjuste]
+    ) -> Tuple[str, str]:
+        seccion_reglas = ""
+        instruccion_reglas = ""
+        if reglas:
+            lista = "\n".join(f"- [{regla.id}] {regla.texto}" for regla in reglas)
+            seccion_reglas = f"\nPENALIZACIONES Y BONIFICACIONES DE LA RÚBRICA:\n{lista}\n"
+            instruccion_reglas = '\n4. En "ajustes" incluye solo las penalizaciones o bonificaciones que se aplican a esta respuesta y cuántas veces'
+        system_prompt = f"""Eres un evaluador académico experto y justo. Evalúa la respuesta del estudiante a UNA pregunta de un examen oral según el criterio de la rúbrica que le corresponde.
+
+CRITERIO DE LA RÚBRICA (pregunta {pregunta['numero']}):
+{pregunta['criterio']}
+Puntaje máximo: {maximo:g}
+
+CONCEPTOS CLAVE DEL TEMA: {json.dumps(conceptos.get('conceptos_principales', []), ensure_ascii=False)}
+{self._seccion_material(fragmentos)}{seccion_reglas}
+INSTRUCCIONES:
+1. Evalúa solo lo que pide este criterio; el resto del examen se califica aparte
+2. Identifica conceptos correctos y omitidos, errores factuales e información inventada
+3. Asigna un puntaje entre 0 y {maximo:g}{instruccion_reglas}
+
+Responde en JSON:
+{{
+  "analisis": {{
+    "conceptos_correctos": ["concepto1"],
+    "conceptos_omitidos": ["concepto1"],
+    "errores_factuales": [
+      {{"error": "descripción del error", "gravedad": "leve|moderado|grave", "cita_alumno": "lo que dijo el alumno"}}
+    ],
+    "informacion_inventada": ["afirmación inventada"],
+    "claridad_explicacion": "excelente|buena|regular|deficiente",
+    "coherencia_argumentativa": "excelente|buena|regular|deficiente",
+    "uso_vocabulario_tecnico": "excelente|bueno|regular|deficiente",
+    "citas_destacadas": ["frases textuales del alumno"]
+  }},
+  "puntaje": 2.5,
+  "justificacion": "razón del puntaje",
+  "ajustes": [
+    {{"regla": "P1", "veces": 1, "razon": "descripción"}}
+  ],
+  "nivel_confianza": "alto|medio|bajo"
+}}"""
+        return system_prompt, f"Respuesta del estudiante a la pregunta {pregunta['numero']}:\n\n{pregunta['respuesta']}"
+
+    @staticmethod
+    def _maximos_preguntas(preguntas: List[Dict[str, Any]]) -> List[float]:
+        """Puntos de cada ítem; los que no los indican se reparten lo que falta hasta 10 (o 1 cada uno)"""
+        sin_puntos = [p for p in preguntas if p["puntos"] is None]
+        restante = 10 - sum(p["puntos"] for p in preguntas if p["puntos"] is not None)
+        reparto = restante / len(sin_puntos) if sin_puntos and restante > 0 else 1.0
+        return [p["puntos"] if p["puntos"] is not None else round(reparto, 2) for p in preguntas]
+
+    @staticmethod
+    def _sin_respuesta(pregunta: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "analisis": {
+                "conceptos_correctos": [], "conceptos_omitidos": [], "errores_factuales": [],
+                "informacion_inventada": [], "citas_destacadas": []
+            },
+            "puntaje": 0.0,
+            "justificacion": "No se identificó una respuesta a esta pregunta en la transcripción",
+            "nivel_confianza": "medio"
+        }
+
+    def _evaluar_pregunta(
+        self,
+        pregunta: Dict[str, Any],
+        maximo: float,
+        conceptos: Dict,
+        material_referencia: str,
+        idioma: str,
+        reglas: List[ReglaAjuste]
+    ) -> Dict[str, Any]:
+        if not pregunta["respuesta"].strip():
+            return self._sin_respuesta(pregunta)
+        fragmentos = fragmentos_relevantes(
+            material_referencia, f"{pregunta['respuesta']}\n{pregunta['criterio']}", idioma,
+            max_caracteres=MAX_CARACTERES_MATERIAL_PREGUNTA
+        )
+        system_prompt, user_prompt = self._prompts_pregunta(pregunta, maximo, conceptos, fragmentos, reglas)
+        resultado = self._llamar_llm(
+            system_prompt, user_prompt, temperature=0.1, max_tokens=1500, etapa="pregunta", formato_json=True
+        )
+        return self._validar_respuesta("pregunta", EvaluacionPregunta, resultado, max_tokens=1500)
+
+    async def _aevaluar_pregunta(
+        self,
+        pregunta: Dict[str, Any],
+        maximo: float,
+        conceptos: Dict,
+        material_referencia: str,
+        idioma: str,
+        reglas: List[ReglaAjuste]
+    ) -> Dict[str, Any]:
+        if not pregunta["respuesta"].strip():
+            return self._sin_respuesta(pregunta)
+        fragmentos = await asyncio.to_thread(
+            fragmentos_relevantes, material_referencia, f"{pregunta['respuesta']}\n{pregunta['criterio']}", idioma,
+            max_caracteres=MAX_CARACTERES_MATERIAL_PREGUNTA
+        )
+        system_prompt, user_prompt = self._prompts_pregunta(pregunta, maximo, conceptos, fragmentos, reglas)
+        resultado = await self._allamar_llm(
+            system_prompt, user_prompt, temperature=0.1, max_tokens=1500, etapa="pregunta", formato_json=True
+        )
+        return await self._avalidar_respuesta("pregunta", EvaluacionPregunta, resultado, max_tokens=1500)
+
+    def _dividir_preguntas(
+        self,
+        transcripcion: str,
+        rubrica: str,
+        segmentos: Optional[List[Dict[str, Any]]],
+        idioma: str
+    ) -> List[Dict[str, Any]]:
+        with self.trazador.etapa("division_preguntas", "local", "reglas"):
+            preguntas = preguntas_del_examen(transcripcion, rubrica, segmentos, idioma)
+        if preguntas:
+            logger.debug(f"Examen dividido en {len(preguntas)} preguntas")
+        else:
+            logger.debug("No se pudo dividir el examen por preguntas, se evalúa completo")
+        return preguntas
+
+    def _fusionar_preguntas(
+        self,
+        preguntas: List[Dict[str, Any]],
+        maximos: List[float],
+        evaluaciones: List[Dict[str, Any]],
+        rubrica: Rubrica
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Análisis y calificación del examen a partir de las preguntas. La nota se suma localmente,
+        con las penalizaciones y bonificaciones de la rúbrica (o las de por defecto) como en modo completo
+        """
+        respondidas = [e["analisis"] for p, e in zip(preguntas, evaluaciones) if p["respuesta"].strip()]
+        analisis: Dict[str, Any] = {}
+        for campo in ("conceptos_correctos", "conceptos_omitidos", "informacion_inventada", "citas_destacadas"):
+            analisis[campo] = list(dict.fromkeys(v for e in evaluaciones for v in e["analisis"].get(campo, [])))
+        analisis["errores_factuales"] = [error for e in evaluaciones for error in e["analisis"].get("errores_factuales", [])]
+        for campo in ("claridad_explicacion", "coherencia_argumentativa", "uso_vocabulario_tecnico"):
+            votos = Counter(a.get(campo) for a in respondidas if a.get(campo))
+            analisis[campo] = votos.most_common(1)[0][0] if votos else "regular"
+
+        # Una hoja por pregunta, con los puntos que se usaron al calificarla, y las reglas de la rúbrica
+        por_pregunta = Rubrica(
+            criterios=[Criterio(p["criterio"], maximo, str(i)) for i, (p, maximo) in enumerate(zip(preguntas, maximos), 1)],
+            penalizaciones=rubrica.penalizaciones,
+            bonificaciones=rubrica.bonificaciones
+        )
+        penalizaciones, bonificaciones = self._ajustes_aplicados(
+            por_pregunta, [a for e in evaluaciones for a in e.get("ajustes", [])], analisis
+        )
+        suma = sumar_calificacion(
+            por_pregunta, {str(i): e["puntaje"] for i, e in enumerate(evaluaciones, 1)}, penalizaciones, bonificaciones
+        )
+
+        detalle = [
+            {
+                "numero": pregunta["numero"],
+                "criterio": pregunta["criterio"],
+                "respuesta": pregunta["respuesta"],
+                "puntaje": criterio["puntaje"],
+                "maximo": criterio["maximo"],
+                "justificacion": evaluacion["justificacion"],
+                "nivel_confianza": evaluacion["nivel_confianza"]
+            }
+            for pregunta, evaluacion, criterio in zip(preguntas, evaluaciones, suma["por_criterio"])
+        ]
+        calificacion = {
+            "calificacion_final": suma["calificacion_final"],
+            "calificacion_por_criterio": [
+                {"criterio": d["criterio"], "puntaje": d["puntaje"], "maximo": d["maximo"], "justificacion": d["justificacion"]}
+                for d in detalle
+            ],
+            "penalizaciones": penalizaciones,
+            "bonificaciones": bonificaciones,
+            # La confianza del examen es la de la pregunta menos segura
+            "nivel_confianza": min((d["nivel_confianza"] for d in detalle), key=CONFIANZA_ORDEN.index),
+            "justificacion_general": (
+                f"Suma de {len(detalle)} preguntas calificadas por separado: {suma['obtenido']:g} de {suma['total']:g} puntos"
+                + (f", {suma['neto']:g} tras penalizaciones y bonificaciones" if penalizaciones or bonificaciones else "")
+            )
+        }
+        return analisis, calificacion, detalle
+
+    def _evaluar_por_preguntas(
+        self,
+        preguntas: List[Dict[str, Any]],
+        conceptos: Dict,
+        material_referencia: str,
+        rubrica: str,
+        idioma: str
+    ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]]]:
+        """None si alguna pregunta no tiene evaluación válida (p. ej. fuera de esquema tras la corrección)"""
+        maximos = self._maximos_preguntas(preguntas)
+        rubrica_parseada = parsear_rubrica(rubrica)
+        reglas = [*rubrica_parseada.penalizaciones, *rubrica_parseada.bonificaciones]
+        with ThreadPoolExecutor(max_workers=min(MAX_PREGUNTAS_PARALELAS, len(preguntas))) as pool:
+            futuros = [
+                pool.submit(
+                    contextvars.copy_context().run, self._evaluar_pregunta,
+                    pregunta, maximo, conceptos, material_referencia, idioma, reglas
+                )
+                for pregunta, maximo in zip(preguntas, maximos)
+            ]
+            evaluaciones = []
+            for pregunta, futuro in zip(preguntas, futuros):
+                try:
+                    evaluaciones.append(futuro.result())
+                except ErrorProveedor:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Pregunta {pregunta['numero']} sin evaluación válida: {e}")
+                    for pendiente in futuros:
+                        pendiente.cancel()
+                    return None
+        return self._fusionar_preguntas(preguntas, maximos, evaluaciones, rubrica_parseada)
+
+    async def _aevaluar_por_preguntas(
+        self,
+        preguntas: List[Dict[str, Any]],
+        conceptos: Dict,
+        material_referencia: str,
+        rubrica: str,
+        idioma: str
+    ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]]]:
+        maximos = self._maximos_preguntas(preguntas)
+        rubrica_parseada = parsear_rubrica(rubrica)
+        reglas = [*rubrica_parseada.penalizaciones, *rubrica_parseada.bonificaciones]
+        limite = asyncio.Semaphore(MAX_PREGUNTAS_PARALELAS)
+
+        async def evaluar(pregunta: Dict[str, Any], maximo: float) -> Optional[Dict[str, Any]]:
+            async with limite:
+                try:
+                    return await self._aevaluar_pregunta(pregunta, maximo, conceptos, material_referencia, idioma, reglas)
+                except ErrorProveedor:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Pregunta {pregunta['numero']} sin evaluación válida: {e}")
+                    return None
+
+        evaluaciones = await asyncio.gather(*(evaluar(p, m) for p, m in zip(preguntas, maximos)))
+        if any(e is None for e in evaluaciones):
+            return None
+        return self._fusionar_preguntas(preguntas, maximos, list(evaluaciones), rubrica_parseada)
+
+    def _prompts_reparacion(self, esquema: type, texto: str, errores: List[str]) -> Tuple[str, str]:
+        system_prompt = f"""Corriges respuestas JSON que no cumplen el formato requerido.
+
+FORMATO REQUERIDO:
+{json.dumps(describir(esquema), ensure_ascii=False, indent=2)}
+
+REGLAS:
+- Corrige SOLO los problemas indicados; conserva todo el contenido y los valores correctos
+- No inventes información: si falta un dato obligatorio, dedúcelo del propio contenido
+- Responde en JSON, solo con el objeto corregido"""
+        problemas = "\n".join(f"- {e}" for e in errores)
+        return system_prompt, f"Problemas encontrados:\n{problemas}\n\nJSON a corregir:\n{texto}"
+
+    def _validar_respuesta(self, etapa: str, esquema: type, texto: str, max_tokens: int) -> Dict[str, Any]:
+        """Valida la respuesta contra el esquema de la etapa; si no cumple, pide una sola corrección"""
+        try:
+            return validar_json(esquema, self._limpiar_json(texto)).a_dict()
+        except ErrorEsquema as e:
+            logger.warning(f"Respuesta de {etapa} fuera de esquema, pidiendo corrección: {e}")
+            system_prompt, user_prompt = self._prompts_reparacion(esquema, texto, e.errores)
+
+        reparada = self._llamar_llm(
+            system_prompt, user_prompt, temperature=0.0, max_tokens=max_tokens,
+            etapa=f"{etapa}_reparacion", formato_json=True
+        )
+        return validar_json(esquema, self._limpiar_json(reparada)).a_dict()
+
+    async def _avalidar_respuesta(self, etapa: str, esquema: type, texto: str, max_tokens: int) -> Dict[str, Any]:
+        try:
+            return validar_json(esquema, self._limpiar_json(texto)).a_dict()
+        except ErrorEsquema as e:
+            logger.warning(f"Respuesta de {etapa} fuera de esquema, pidiendo corrección: {e}")
+            system_prompt, user_prompt = self._prompts_reparacion(esquema, texto, e.errores)
+
+        reparada = await self._allamar_llm(
+            system_prompt, user_prompt, temperature=0.0, max_tokens=max_tokens,
+            etapa=f"{etapa}_reparacion", formato_json=True
+        )
+        return validar_json(esquema, self._limpiar_json(reparada)).a_dict()
 
     def _limpiar_json(self, texto: str) -> str:
         if not texto:
@@ -452,122 +1986,516 @@ Responde en JSON:
         
         return texto.strip()
 
+    def _registrar_inicio(self, material_referencia: str, rubrica: str, transcripcion_alumno: str, modo: str):
+        if modo not in MODOS_EVALUACION:
+            raise ValueError(f"Modo de evaluación desconocido: {modo}. Opciones: {', '.join(MODOS_EVALUACION)}")
+        logger.debug(
+            f"Iniciando evaluación ({modo}) con {self.proveedor}/{self.llm_model}: material {len(material_referencia)} chars, "
+            f"rúbrica {len(rubrica)} chars, transcripción {len(transcripcion_alumno)} chars"
+        )
+
     def evaluar_examen(
         self, 
         material_referencia: str, 
         rubrica: str, 
-        transcripcion_alumno: str
+        transcripcion_alumno: str,
+        modo: str = "completo",
+        idioma: str = "es",
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None,
+        segmentos: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """`segmentos` (de Whisper, con tiempos) ayudan a dividir el examen en el modo por_preguntas"""
+        with self.trazador.recolectar() as recolector:
+            resultado = self._ejecutar_evaluacion(
+                material_referencia, rubrica, transcripcion_alumno, modo, idioma, al_progresar, segmentos
+            )
+        return {**resultado, "metricas_rendimiento": recolector.resumen()}
+
+    def _ejecutar_evaluacion(
+        self, 
+        material_referencia: str, 
+        rubrica: str, 
+        transcripcion_alumno: str,
+        modo: str,
+        idioma: str,
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None,
+        segmentos: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         try:
-            print(f"[DEBUG] === INICIANDO EVALUACIÓN ===")
-            print(f"[DEBUG] Proveedor: {self.proveedor}")
-            print(f"[DEBUG] Modelo LLM: {self.llm_model}")
-            print(f"[DEBUG] Longitud material: {len(material_referencia)} chars")
-            print(f"[DEBUG] Longitud rúbrica: {len(rubrica)} chars")
-            print(f"[DEBUG] Longitud transcripción: {len(transcripcion_alumno)} chars")
+            self._registrar_inicio(material_referencia, rubrica, transcripcion_alumno, modo)
             
-            print(f"[DEBUG] Paso 1: Extrayendo conceptos...")
             conceptos = self._extraer_conceptos_clave(material_referencia)
-            print(f"[DEBUG] Conceptos extraídos: {len(conceptos.get('conceptos_principales', []))} principales")
-            
-            analisis = self._analizar_respuesta_alumno(transcripcion_alumno, conceptos)
-            
-            calificacion = self._calcular_calificacion(conceptos, analisis, rubrica)
-            
-            feedback = self._generar_feedback(analisis, calificacion, conceptos)
-            
-            evaluacion_completa = {
-                "calificacion_final": calificacion.get("calificacion_final", 0),
-                "nivel_confianza": calificacion.get("nivel_confianza", "medio"),
-                "tema_detectado": conceptos.get("tema_detectado", "General"),
-                "nivel_dificultad": conceptos.get("nivel_dificultad", "Intermedio"),
-                
-                "desglose_calificacion": {
-                    "por_criterio": calificacion.get("calificacion_por_criterio", []),
-                    "penalizaciones": calificacion.get("penalizaciones", []),
-                    "bonificaciones": calificacion.get("bonificaciones", []),
-                    "justificacion": calificacion.get("justificacion_general", "")
-                },
-                
-                "analisis_conceptual": {
-                    "conceptos_esperados": {
-                        "principales": conceptos.get("conceptos_principales", []),
-                        "secundarios": conceptos.get("conceptos_secundarios", [])
-                    },
-                    "conceptos_mencionados": analisis.get("conceptos_correctos", []),
-                    "conceptos_omitidos": analisis.get("conceptos_omitidos", []),
-                    "cobertura_porcentaje": self._calcular_cobertura(conceptos, analisis)
-                },
-                
-                "errores_detectados": {
-                    "factuales": analisis.get("errores_factuales", []),
-                    "inventados": analisis.get("informacion_inventada", [])
-                },
-                
-                "metricas_comunicacion": {
-                    "claridad": analisis.get("claridad_explicacion", "regular"),
-                    "coherencia": analisis.get("coherencia_argumentativa", "regular"),
-                    "vocabulario_tecnico": analisis.get("uso_vocabulario_tecnico", "regular")
-                },
+            logger.debug(f"Conceptos extraídos: {len(conceptos.get('conceptos_principales', []))} principales")
+            self._emitir(al_progresar, "conceptos", conceptos)
+
+            preguntas = (
+                self._dividir_preguntas(transcripcion_alumno, rubrica, segmentos, idioma)
+                if modo == "por_preguntas" else []
+            )
+            detalle_preguntas = None
+            por_preguntas = (
+                self._evaluar_por_preguntas(preguntas, conceptos, material_referencia, rubrica, idioma)
+                if preguntas else None
+            )
+            if preguntas and por_preguntas is None:
+                # Como en modo rápido: una pregunta sin evaluación válida no tumba el examen
+                logger.warning("Evaluación por preguntas incompleta, usando modo completo")
+
+            if por_preguntas is not None:
+                analisis, calificacion, detalle_preguntas = por_preguntas
+                self._emitir(al_progresar, "analisis", analisis)
+                self._emitir(al_progresar, "calificacion", calificacion)
+                feedback = self._generar_feedback(
+                    analisis, calificacion, conceptos, self._emisor_parcial(al_progresar, "feedback")
+                )
+            else:
+                fragmentos = self._fragmentos_material(material_referencia, transcripcion_alumno, rubrica, idioma)
+
+                if modo == "rapido":
+                    analisis, calificacion, feedback = self._evaluar_en_una_llamada(
+                        transcripcion_alumno, conceptos, rubrica, al_progresar, fragmentos
+                    )
+                    self._emitir(al_progresar, "analisis", analisis)
+                    self._emitir(al_progresar, "calificacion", calificacion)
+                else:
+                    analisis = self._analizar_respuesta_alumno(
+                        transcripcion_alumno, conceptos, self._emisor_parcial(al_progresar, "analisis"), fragmentos
+                    )
+                    self._emitir(al_progresar, "analisis", analisis)
                 
-                "feedback_alumno": feedback.get("feedback_alumno", {}),
-                "nota_docente": feedback.get("nota_docente", {}),
+                    calificacion = self._calcular_calificacion(
+                        conceptos, analisis, rubrica, self._emisor_parcial(al_progresar, "calificacion"), fragmentos
+                    )
+                    self._emitir(al_progresar, "calificacion", calificacion)
                 
-                "citas_destacadas": analisis.get("citas_destacadas", [])
-            }
+                    feedback = self._generar_feedback(
+                        analisis, calificacion, conceptos, self._emisor_parcial(al_progresar, "feedback")
+                    )
+            self._emitir(al_progresar, "feedback", feedback)
             
+            evaluacion = self._armar_evaluacion(conceptos, analisis, calificacion, feedback, transcripcion_alumno, idioma)
+            if detalle_preguntas is not None:
+                evaluacion["preguntas"] = detalle_preguntas
+            return {"success": True, "evaluacion": evaluacion}
+        
+        except Exception as e:
             return {
-                "success": True,
-                "evaluacion": evaluacion_completa
+                "success": False,
+                "error": f"Error en la evaluación: {str(e)}"
             }
+
+    async def aevaluar_examen(
+        self, 
+        material_referencia: str, 
+        rubrica: str, 
+        transcripcion_alumno: str,
+        modo: str = "completo",
+        idioma: str = "es",
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None,
+        segmentos: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        with self.trazador.recolectar() as recolector:
+            resultado = await self._aejecutar_evaluacion(
+                material_referencia, rubrica, transcripcion_alumno, modo, idioma, al_progresar, segmentos
+            )
+        return {**resultado, "metricas_rendimiento": recolector.resumen()}
+
+    async def _aejecutar_evaluacion(
+        self, 
+        material_referencia: str, 
+        rubrica: str, 
+        transcripcion_alumno: str,
+        modo: str,
+        idioma: str,
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None,
+        segmentos: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        try:
+            self._registrar_inicio(material_referencia, rubrica, transcripcion_alumno, modo)
+            
+            conceptos = await self._aextraer_conceptos_clave(material_referencia)
+            logger.debug(f"Conceptos extraídos: {len(conceptos.get('conceptos_principales', []))} principales")
+            self._emitir(al_progresar, "conceptos", conceptos)
+
+            preguntas = (
+                await asyncio.to_thread(self._dividir_preguntas, transcripcion_alumno, rubrica, segmentos, idioma)
+                if modo == "por_preguntas" else []
+            )
+            detalle_preguntas = None
+            por_preguntas = (
+                await self._aevaluar_por_preguntas(preguntas, conceptos, material_referencia, rubrica, idioma)
+                if preguntas else None
+            )
+            if preguntas and por_preguntas is None:
+                logger.warning("Evaluación por preguntas incompleta, usando modo completo")
+
+            if por_preguntas is not None:
+                analisis, calificacion, detalle_preguntas = por_preguntas
+                self._emitir(al_progresar, "analisis", analisis)
+                self._emitir(al_progresar, "calificacion", calificacion)
+                feedback = await self._agenerar_feedback(
+                    analisis, calificacion, conceptos, self._emisor_parcial(al_progresar, "feedback")
+                )
+            else:
+                fragmentos = await asyncio.to_thread(
+                    self._fragmentos_material, material_referencia, transcripcion_alumno, rubrica, idioma
+                )
+
+                if modo == "rapido":
+                    analisis, calificacion, feedback = await self._aevaluar_en_una_llamada(
+                        transcripcion_alumno, conceptos, rubrica, al_progresar, fragmentos
+                    )
+                    self._emitir(al_progresar, "analisis", analisis)
+                    self._emitir(al_progresar, "calificacion", calificacion)
+                else:
+                    analisis = await self._aanalizar_respuesta_alumno(
+                        transcripcion_alumno, conceptos, self._emisor_parcial(al_progresar, "analisis"), fragmentos
+                    )
+                    self._emitir(al_progresar, "analisis", analisis)
+                
+                    calificacion = await self._acalcular_calificacion(
+                        conceptos, analisis, rubrica, self._emisor_parcial(al_progresar, "calificacion"), fragmentos
+                    )
+                    self._emitir(al_progresar, "calificacion", calificacion)
+                
+                    feedback = await self._agenerar_feedback(
+                        analisis, calificacion, conceptos, self._emisor_parcial(al_progresar, "feedback")
+                    )
+            self._emitir(al_progresar, "feedback", feedback)
+            
+            evaluacion = self._armar_evaluacion(conceptos, analisis, calificacion, feedback, transcripcion_alumno, idioma)
+            if detalle_preguntas is not None:
+                evaluacion["preguntas"] = detalle_preguntas
+            return {"success": True, "evaluacion": evaluacion}
         
+        # asyncio.CancelledError no hereda de Exception: la cancelación se propaga al llamador
         except Exception as e:
             return {
                 "success": False,
                 "error": f"Error en la evaluación: {str(e)}"
             }
 
-    def _calcular_cobertura(self, conceptos: Dict, analisis: Dict) -> float:
-        principales = set(conceptos.get("conceptos_principales", []))
-        secundarios = set(conceptos.get("conceptos_secundarios", []))
-        correctos = set(analisis.get("conceptos_correctos", []))
+    def _armar_evaluacion(
+        self, 
+        conceptos: Dict, 
+        analisis: Dict, 
+        calificacion: Dict, 
+        feedback: Dict,
+        transcripcion: Optional[str] = None,
+        idioma: str = "es"
+    ) -> Dict[str, Any]:
+        cobertura = self._calcular_cobertura(conceptos, analisis, transcripcion, idioma)
+        return {
+            "calificacion_final": calificacion.get("calificacion_final", 0),
+            "nivel_confianza": calificacion.get("nivel_confianza", "medio"),
+            "tema_detectado": conceptos.get("tema_detectado", "General"),
+            "nivel_dificultad": conceptos.get("nivel_dificultad", "Intermedio"),
+            
+            "desglose_calificacion": {
+                "por_criterio": calificacion.get("calificacion_por_criterio", []),
+                "penalizaciones": calificacion.get("penalizaciones", []),
+                "bonificaciones": calificacion.get("bonificaciones", []),
+                "justificacion": calificacion.get("justificacion_general", "")
+            },
+            
+            "analisis_conceptual": {
+                "conceptos_esperados": {
+                    "principales": conceptos.get("conceptos_principales", []),
+                    "secundarios": conceptos.get("conceptos_secundarios", [])
+                },
+                "conceptos_mencionados": analisis.get("conceptos_correctos", []),
+                "conceptos_omitidos": analisis.get("conceptos_omitidos", []),
+                "cobertura_porcentaje": cobertura["cobertura_porcentaje"],
+                "conceptos_sin_evidencia": cobertura["conceptos_sin_evidencia"]
+            },
+            
+            "errores_detectados": {
+                "factuales": analisis.get("errores_factuales", []),
+                "inventados": analisis.get("informacion_inventada", [])
+            },
+            
+            "metricas_comunicacion": {
+                "claridad": analisis.get("claridad_explicacion", "regular"),
+                "coherencia": analisis.get("coherencia_argumentativa", "regular"),
+                "vocabulario_tecnico": analisis.get("uso_vocabulario_tecnico", "regular")
+            },
+            
+            "feedback_alumno": feedback.get("feedback_alumno", {}),
+            "nota_docente": feedback.get("nota_docente", {}),
+            
+            "citas_destacadas": analisis.get("citas_destacadas", [])
+        }
+
+    def _calcular_cobertura(
+        self, 
+        conceptos: Dict, 
+        analisis: Dict, 
+        transcripcion: Optional[str] = None, 
+        idioma: str = "es"
+    ) -> Dict[str, Any]:
+        return calcular_cobertura(
+            conceptos.get("conceptos_principales", []),
+            conceptos.get("conceptos_secundarios", []),
+            analisis.get("conceptos_correctos", []),
+            transcripcion,
+            idioma
+        )
+
+    def proceso_completo(
+        self, 
+        audio_file_path: str, 
+        material_referencia: str, 
+        rubrica: str,
+        limpiar: bool = True,
+        idioma: str = "es",
+        modo: str = "completo",
+        modo_limpieza: str = "auto",
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None
+    ) -> Dict[str, Any]:
+        with self.trazador.recolectar() as recolector:
+            resultado = self._ejecutar_proceso(
+                audio_file_path, material_referencia, rubrica, limpiar, idioma, modo, modo_limpieza, al_progresar
+            )
+        resultado = {**resultado, "metricas_rendimiento": recolector.resumen()}
+        self._emitir(al_progresar, "completado" if resultado["success"] else "error", resultado)
+        return resultado
+
+    def _ejecutar_proceso(
+        self, 
+        audio_file_path: str, 
+        material_referencia: str, 
+        rubrica: str,
+        limpiar: bool,
+        idioma: str,
+        modo: str,
+        modo_limpieza: str,
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None
+    ) -> Dict[str, Any]:
+        resultado_transcripcion = self.transcribir_audio(audio_file_path, idioma)
+        
+        if not resultado_transcripcion["success"]:
+            return resultado_transcripcion
+        self._emitir(al_progresar, "transcripcion", resultado_transcripcion)
         
-        total_conceptos = len(principales) + len(secundarios)
-        if total_conceptos == 0:
-            return 100.0
+        transcripcion = resultado_transcripcion["transcripcion"]
+        
+        if limpiar:
+            transcripcion_limpia = self._limpia_en_cache(resultado_transcripcion, modo_limpieza)
+            if transcripcion_limpia is None:
+                transcripcion_limpia = self.limpiar_transcripcion(transcripcion, idioma, modo_limpieza)
+                self._guardar_limpia(resultado_transcripcion, transcripcion_limpia, modo_limpieza)
+        else:
+            transcripcion_limpia = transcripcion
+        self._emitir(al_progresar, "limpieza", {"transcripcion_limpia": transcripcion_limpia, "limpiada": limpiar})
         
-        principales_cubiertos = len([c for c in correctos if any(c.lower() in p.lower() or p.lower() in c.lower() for p in principales)])
-        secundarios_cubiertos = len([c for c in correctos if any(c.lower() in s.lower() or s.lower() in c.lower() for s in secundarios)])
+        resultado_evaluacion = self._ejecutar_evaluacion(
+            material_referencia, 
+            rubrica, 
+            transcripcion_limpia,
+            modo,
+            idioma,
+            al_progresar,
+            resultado_transcripcion.get("segmentos")
+        )
         
-        cobertura = ((principales_cubiertos * 2) + secundarios_cubiertos) / ((len(principales) * 2) + len(secundarios)) * 100
-        return round(min(cobertura, 100.0), 1)
+        return self._armar_resultado(resultado_transcripcion, transcripcion_limpia, idioma, resultado_evaluacion)
 
-    def proceso_completo(
+    async def aproceso_completo(
         self, 
         audio_file_path: str, 
         material_referencia: str, 
         rubrica: str,
         limpiar: bool = True,
-        idioma: str = "es"
+        idioma: str = "es",
+        modo: str = "completo",
+        modo_limpieza: str = "auto",
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None
     ) -> Dict[str, Any]:
-        resultado_transcripcion = self.transcribir_audio(audio_file_path, idioma)
+        with self.trazador.recolectar() as recolector:
+            resultado = await self._aejecutar_proceso(
+                audio_file_path, material_referencia, rubrica, limpiar, idioma, modo, modo_limpieza, al_progresar
+            )
+        resultado = {**resultado, "metricas_rendimiento": recolector.resumen()}
+        self._emitir(al_progresar, "completado" if resultado["success"] else "error", resultado)
+        return resultado
+
+    async def _aejecutar_proceso(
+        self, 
+        audio_file_path: str, 
+        material_referencia: str, 
+        rubrica: str,
+        limpiar: bool,
+        idioma: str,
+        modo: str,
+        modo_limpieza: str,
+        al_progresar: Optional[Callable[[EventoProgreso], None]] = None
+    ) -> Dict[str, Any]:
+        resultado_transcripcion = await self.atranscribir_audio(audio_file_path, idioma)
         
         if not resultado_transcripcion["success"]:
             return resultado_transcripcion
+        self._emitir(al_progresar, "transcripcion", resultado_transcripcion)
         
         transcripcion = resultado_transcripcion["transcripcion"]
         
         if limpiar:
-            transcripcion_limpia = self.limpiar_transcripcion(transcripcion)
+            transcripcion_limpia = self._limpia_en_cache(resultado_transcripcion, modo_limpieza)
+            if transcripcion_limpia is None:
+                transcripcion_limpia = await self.alimpiar_transcripcion(transcripcion, idioma, modo_limpieza)
+                self._guardar_limpia(resultado_transcripcion, transcripcion_limpia, modo_limpieza)
         else:
             transcripcion_limpia = transcripcion
+        self._emitir(al_progresar, "limpieza", {"transcripcion_limpia": transcripcion_limpia, "limpiada": limpiar})
         
-        resultado_evaluacion = self.evaluar_examen(
+        resultado_evaluacion = await self._aejecutar_evaluacion(
             material_referencia, 
             rubrica, 
-            transcripcion_limpia
+            transcripcion_limpia,
+            modo,
+            idioma,
+            al_progresar,
+            resultado_transcripcion.get("segmentos")
         )
         
+        return self._armar_resultado(resultado_transcripcion, transcripcion_limpia, idioma, resultado_evaluacion)
+
+    def proceso_completo_eventos(
+        self, 
+        audio_file_path: str, 
+        material_referencia: str, 
+        rubrica: str,
+        **opciones: Any
+    ) -> Iterator[EventoProgreso]:
+        """
+        Igual que proceso_completo (mismas opciones) pero entrega un EventoProgreso al terminar
+        cada etapa; el último es "completado" o "error" y trae el resultado completo.
+        Si el consumidor deja de iterar (cierra el generador), la etapa en curso termina
+        y las siguientes ya no se ejecutan
+        """
+        eventos: "queue.Queue[EventoProgreso]" = queue.Queue()
+        cancelado = threading.Event()
+        
+        def al_progresar(evento: EventoProgreso):
+            if not cancelado.is_set():
+                eventos.put(evento)
+            elif evento.etapa != ETAPA_PARCIAL:
+                # Los campos parciales llegan desde los hilos del enrutador: solo se descartan
+                raise ProcesoCancelado()
+        
+        def ejecutar():
+            try:
+                self.proceso_completo(
+                    audio_file_path, material_referencia, rubrica, al_progresar=al_progresar, **opciones
+                )
+            except ProcesoCancelado:
+                logger.debug("Proceso completo cancelado: el consumidor dejó de leer los eventos")
+            except Exception as e:
+                eventos.put(EventoProgreso("error", {"success": False, "error": f"Error inesperado: {str(e)}"}))
+        
+        hilo = threading.Thread(target=ejecutar, name="proceso-completo", daemon=True)
+        hilo.start()
+        try:
+            while True:
+                evento = eventos.get()
+                yield evento
+                if evento.final:
+                    break
+        finally:
+            cancelado.set()
+        hilo.join()
+
+    async def aproceso_completo_eventos(
+        self, 
+        audio_file_path: str, 
+        material_referencia: str, 
+        rubrica: str,
+        **opciones: Any
+    ) -> AsyncIterator[EventoProgreso]:
+        eventos: "asyncio.Queue[EventoProgreso]" = asyncio.Queue()
+        
+        async def ejecutar():
+            try:
+                await self.aproceso_completo(
+                    audio_file_path, material_referencia, rubrica, al_progresar=eventos.put_nowait, **opciones
+                )
+            except Exception as e:
+                eventos.put_nowait(EventoProgreso("error", {"success": False, "error": f"Error inesperado: {str(e)}"}))
+        
+        tarea = asyncio.ensure_future(ejecutar())
+        try:
+            while True:
+                evento = await eventos.get()
+                yield evento
+                if evento.final:
+                    break
+        finally:
+            # Si el consumidor deja de iterar, el pipeline se cancela
+            if not tarea.done():
+                tarea.cancel()
+
+    def _emitir(self, al_progresar: Optional[Callable[[EventoProgreso], None]], etapa: str, datos: Dict[str, Any]):
+        if al_progresar is None:
+            return
+        try:
+            al_progresar(EventoProgreso(etapa, datos))
+        except ProcesoCancelado:
+            raise
+        except Exception as e:
+            # Un error al mostrar el progreso no debe interrumpir la evaluación
+            logger.error(f"Error en el callback de progreso ({etapa}): {e}")
+
+    def _emisor_parcial(
+        self, 
+        al_progresar: Optional[Callable[[EventoProgreso], None]], 
+        etapa: str
+    ) -> Optional[Callable[[str, Any], None]]:
+        """
+        Convierte los campos de una respuesta transmitida en eventos "parcial". Sin callback
+        de progreso no hay nada que mostrar y la etapa no se transmite
+        """
+        if al_progresar is None:
+            return None
+        
+        def al_campo(ruta: str, valor: Any):
+            etapa_campo, ruta_campo = etapa, ruta
+            if etapa == "evaluacion_rapida":
+                # "calificacion.calificacion_final" -> etapa calificacion, ruta calificacion_final
+                if "." not in ruta:
+                    return
+                etapa_campo, ruta_campo = ruta.split(".", 1)
+            self._emitir(al_progresar, ETAPA_PARCIAL, {"etapa": etapa_campo, "ruta": ruta_campo, "valor": valor})
+        return al_campo
+
+    def _limpia_en_cache(self, resultado_transcripcion: Dict[str, Any], modo_limpieza: str) -> Optional[str]:
+        if self.cache_transcripciones is None or "hash_audio" not in resultado_transcripcion:
+            return None
+        clave = CacheTranscripciones.clave(
+            resultado_transcripcion["hash_audio"], 
+            resultado_transcripcion["idioma"], 
+            self.whisper_model
+        )
+        return self.cache_transcripciones.obtener_limpia(clave, modo_limpieza)
+    
+    def _guardar_limpia(self, resultado_transcripcion: Dict[str, Any], transcripcion_limpia: str, modo_limpieza: str):
+        if self.cache_transcripciones is None or "hash_audio" not in resultado_transcripcion:
+            return
+        # Si la limpieza falló se devolvió el texto original: no se guarda como limpio
+        if transcripcion_limpia == resultado_transcripcion["transcripcion"]:
+            return
+        clave = CacheTranscripciones.clave(
+            resultado_transcripcion["hash_audio"], 
+            resultado_transcripcion["idioma"], 
+            self.whisper_model
+        )
+        self.cache_transcripciones.guardar_limpia(clave, modo_limpieza, transcripcion_limpia)
+
+    def _armar_resultado(
+        self, 
+        resultado_transcripcion: Dict[str, Any], 
+        transcripcion_limpia: str, 
+        idioma: str, 
+        resultado_evaluacion: Dict[str, Any]
+    ) -> Dict[str, Any]:
         if not resultado_evaluacion["success"]:
             return resultado_evaluacion
         
@@ -0,0 +1,286 @@
+"""
+Enrutamiento entre proveedores LLM con peticiones duplicadas (hedging) y disyuntor
+Si el proveedor principal supera su p95 de latencia para la etapa se lanza la misma
+petición al otro proveedor; gana la primera respuesta válida y la otra se cancela.
+Un proveedor que falla varias veces seguidas sale de la rotación durante un tiempo
+"""
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Callable, Awaitable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Mientras la petición principal hace cola en el planificador su umbral no corre; se revisa cada tanto si ya salió
+INTERVALO_ESPERA_ENVIO_S = 0.05
+
+
+class Circuito:
+    """Disyuntor por proveedor: cerrado -> abierto tras `max_fallos` seguidos -> semiabierto tras el enfriamiento"""
+
+    def __init__(self, max_fallos: int = 3, enfriamiento: float = 30.0):
+        self.max_fallos = max_fallos
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_desde: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        if self.abierto_desde is None:
+            return "cerrado"
+        if time.monotonic() - self.abierto_desde >= self.enfriamiento:
+            return "semiabierto"
+        return "abierto"
+
+    def admite(self) -> bool:
+        """Si el proveedor puede entrar en la rotación, sin consumir la petición de prueba"""
+        return self.estado != "abierto"
+
+    def disponible(self) -> bool:
+        """Se llama al lanzar la petición: en semiabierto solo la primera pasa"""
+        with self._lock:
+            estado = self.estado
+            if estado == "cerrado":
+                return True
+            # Semiabierto: se deja pasar una petición de prueba y se reinicia el enfriamiento
+            if estado == "semiabierto":
+                self.abierto_desde = time.monotonic()
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self.abierto_desde = None
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.fallos >= self.max_fallos or self.abierto_desde is not None:
+                self.abierto_desde = time.monotonic()
+
+
+class Enrutador:
+    def __init__(
+        self,
+        proveedores: List[str],
+        percentil: float = 95,
+        ventana: int = 50,
+        min_muestras: int = 5,
+        umbral_inicial: float = 10.0,
+        max_fallos: int = 3,
+        enfriamiento: float = 30.0,
+        max_workers: int = 8
+    ):
+        self.proveedores = list(proveedores)
+        self.percentil = percentil
+        self.ventana = ventana
+        self.min_muestras = min_muestras
+        self.umbral_inicial = umbral_inicial
+        self.circuitos = {p: Circuito(max_fallos, enfriamiento) for p in self.proveedores}
+        self._latencias: Dict[Tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="enrutador")
+
+    def _muestras(self, proveedor: str, etapa: str) -> List[float]:
+        with self._lock:
+            return sorted(self._latencias.get((proveedor, etapa), ()))
+
+    def _cuantil(self, proveedor: str, etapa: str, percentil: float) -> Optional[float]:
+        muestras = self._muestras(proveedor, etapa)
+        if len(muestras) < self.min_muestras:
+            return None
+        return muestras[min(len(muestras) - 1, int(len(muestras) * percentil / 100))]
+
+    def umbral(self, proveedor: str, etapa: str) -> float:
+        """Segundos a esperar al proveedor antes de duplicar la petición"""
+        cuantil = self._cuantil(proveedor, etapa, self.percentil)
+        return cuantil if cuantil is not None else self.umbral_inicial
+
+    def orden(self, etapa: str) -> List[str]:
+        """Proveedores en rotación, el de menor mediana primero; si todos están caídos se prueban igual"""
+        disponibles = [p for p in self.proveedores if self.circuitos[p].admite()]
+        if not disponibles:
+            return list(self.proveedores)
+
+        def mediana(p: str) -> float:
+            valor = self._cuantil(p, etapa, 50)
+            return valor if valor is not None else float("inf")
+
+        # sorted es estable: sin muestras se respeta el orden configurado
+        return sorted(disponibles, key=mediana)
+
+    def registrar_exito(self, proveedor: str, etapa: str, duracion: Optional[float]):
+        if duracion is not None:
+            with self._lock:
+                self._latencias.setdefault((proveedor, etapa), deque(maxlen=self.ventana)).append(duracion)
+        self.circuitos[proveedor].exito()
+
+    def registrar_fallo(self, proveedor: str, error: Exception):
+        logger.warning(f"{proveedor} falló: {error}")
+        self.circuitos[proveedor].fallo()
+
+    def estado(self) -> Dict[str, Dict[str, Any]]:
+        return {p: {"circuito": self.circuitos[p].estado, "fallos_seguidos": self.circuitos[p].fallos} for p in self.proveedores}
+
+    def _proximo(self, orden: List[str], siguiente: int, forzar: bool) -> Tuple[Optional[str], int]:
+        """
+        Siguiente proveedor de `orden` (desde `siguiente`) cuyo disyuntor deja pasar la petición.
+        Solo se consulta el disyuntor del que se va a lanzar, para no gastar pruebas de semiabierto
+        """
+        while siguiente < len(orden):
+            proveedor = orden[siguiente]
+            siguiente += 1
+            if forzar or self.circuitos[proveedor].disponible():
+                return proveedor, siguiente
+        return None, siguiente
+
+    def _espera_umbral(self, principal: str, etapa: str, enviados: Dict[str, float]) -> Tuple[float, bool]:
+        """
+        (segundos a esperar, si al vencer hay que duplicar). El umbral corre desde que la petición
+        salió hacia el proveedor: la cola y los reintentos del planificador no son latencia del proveedor
+        """
+        enviado = enviados.get(principal)
+        if enviado is None:
+            return INTERVALO_ESPERA_ENVIO_S, False
+        return max(0.0, enviado + self.umbral(principal, etapa) - time.monotonic()), True
+
+    @staticmethod
+    def _latencia(proveedor: str, enviados: Dict[str, float]) -> Optional[float]:
+        enviado = enviados.get(proveedor)
+        return time.monotonic() - enviado if enviado is not None else None
+
+    def _valida(self, resultado: Any, es_valida: Optional[Callable[[Any], bool]]) -> Any:
+        if es_valida is not None and not es_valida(resultado):
+            raise ValueError("Respuesta vacía o inválida")
+        return resultado
+
+    def ejecutar(
+        self,
+        etapa: str,
+        llamadas: Dict[str, Callable[[threading.Event, Callable[[], None]], Any]],
+        es_valida: Optional[Callable[[Any], bool]] = None
+    ) -> Tuple[str, Any, int]:
+        """
+        Ejecuta la llamada del proveedor principal y, si tarda más que su umbral o falla,
+        la del siguiente. Devuelve (proveedor ganador, resultado, proveedores lanzados).
+        Cada llamada recibe un Event que se activa cuando ya no hace falta su resultado y una
+        función que debe llamar justo antes de enviar cada intento al proveedor (marca su latencia)
+        """
+        orden = [p for p in self.orden(etapa) if p in llamadas]
+        forzar = not any(self.circuitos[p].admite() for p in orden)
+        cancelar = threading.Event()
+        pendientes: Dict[Any, str] = {}
+        lanzados: List[str] = []
+        # Proveedor -> momento en que su último intento salió hacia el proveedor
+        enviados: Dict[str, float] = {}
+        ultimo_error: Optional[Exception] = None
+        siguiente = 0
+
+        def lanzar() -> bool:
+            nonlocal siguiente
+            proveedor, siguiente = self._proximo(orden, siguiente, forzar)
+            if proveedor is None:
+                return False
+            lanzados.append(proveedor)
+            al_enviar = (lambda p=proveedor: enviados.__setitem__(p, time.monotonic()))
+            pendientes[self._pool.submit(llamadas[proveedor], cancelar, al_enviar)] = proveedor
+            return True
+
+        if not lanzar():
+            # Otra petición se llevó la prueba de todos los semiabiertos: se intenta igual
+            siguiente, forzar = 0, True
+            lanzar()
+        principal = lanzados[0]
+        try:
+            while pendientes:
+                timeout, duplicar = None, False
+                if siguiente < len(orden):
+                    timeout, duplicar = self._espera_umbral(principal, etapa, enviados)
+                hechos, _ = wait(list(pendientes), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not hechos:
+                    if duplicar and lanzar():
+                        logger.debug(f"{etapa}: {principal} supera su umbral, duplicando la petición")
+                    continue
+
+                for futuro in hechos:
+                    proveedor = pendientes.pop(futuro)
+                    try:
+                        resultado = self._valida(futuro.result(), es_valida)
+                    except Exception as e:
+                        self.registrar_fallo(proveedor, e)
+                        ultimo_error = e
+                        lanzar()
+                        continue
+                    self.registrar_exito(proveedor, etapa, self._latencia(proveedor, enviados))
+                    return proveedor, resultado, len(lanzados)
+        finally:
+            # La petición perdedora deja de reintentar; las que no empezaron no se ejecutan
+            cancelar.set()
+            for futuro in pendientes:
+                futuro.cancel()
+
+        raise ultimo_error
+
+    async def aejecutar(
+        self,
+        etapa: str,
+        llamadas: Dict[str, Callable[[Callable[[], None]], Awaitable[Any]]],
+        es_valida: Optional[Callable[[Any], bool]] = None
+    ) -> Tuple[str, Any, int]:
+        orden = [p for p in self.orden(etapa) if p in llamadas]
+        forzar = not any(self.circuitos[p].admite() for p in orden)
+        pendientes: Dict[asyncio.Task, str] = {}
+        lanzados: List[str] = []
+        enviados: Dict[str, float] = {}
+        ultimo_error: Optional[Exception] = None
+        siguiente = 0
+
+        def lanzar() -> bool:
+            nonlocal siguiente
+            proveedor, siguiente = self._proximo(orden, siguiente, forzar)
+            if proveedor is None:
+                return False
+            lanzados.append(proveedor)
+            al_enviar = (lambda p=proveedor: enviados.__setitem__(p, time.monotonic()))
+            pendientes[asyncio.ensure_future(llamadas[proveedor](al_enviar))] = proveedor
+            return True
+
+        if not lanzar():
+            siguiente, forzar = 0, True
+            lanzar()
+        principal = lanzados[0]
+        try:
+            while pendientes:
+                timeout, duplicar = None, False
+                if siguiente < len(orden):
+                    timeout, duplicar = self._espera_umbral(principal, etapa, enviados)
+                hechos, _ = await asyncio.wait(list(pendientes), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not hechos:
+                    if duplicar and lanzar():
+                        logger.debug(f"{etapa}: {principal} supera su umbral, duplicando la petición")
+                    continue
+
+                for tarea in hechos:
+                    proveedor = pendientes.pop(tarea)
+                    try:
+                        resultado = self._valida(tarea.result(), es_valida)
+                    except Exception as e:
+                        self.registrar_fallo(proveedor, e)
+                        ultimo_error = e
+                        lanzar()
+                        continue
+                    self.registrar_exito(proveedor, etapa, self._latencia(proveedor, enviados))
+                    return proveedor, resultado, len(lanzados)
+        finally:
+            # También si cancelan al llamador: no quedan peticiones huérfanas
+            for tarea in pendientes:
+                tarea.cancel()
+
+        raise ultimo_error
@@ -0,0 +1,299 @@
+"""
+Esquemas de las respuestas del LLM por etapa (conceptos, análisis, calificación, feedback)
+Cada respuesta se valida contra su dataclass: tipos, campos obligatorios, opciones y rangos.
+Las diferencias triviales (número como texto, "Buena" por "buena") se normalizan; el resto
+se informa como lista de errores para pedir una sola corrección al modelo
+"""
+import json
+import typing
+import unicodedata
+from dataclasses import dataclass, field, fields, asdict, is_dataclass, MISSING
+from typing import Dict, Any, List, Optional, Tuple
+
+CALIDADES = ("excelente", "buena", "regular", "deficiente")
+CALIDADES_VOCABULARIO = ("excelente", "bueno", "regular", "deficiente")
+GRAVEDADES = ("leve", "moderado", "grave")
+CONFIANZAS = ("alto", "medio", "bajo")
+
+
+class ErrorEsquema(ValueError):
+    """La respuesta no es JSON o no cumple el esquema de la etapa"""
+
+    def __init__(self, esquema: str, errores: List[str]):
+        self.esquema = esquema
+        self.errores = errores
+        super().__init__(f"{esquema}: {'; '.join(errores[:5])}" + (f" (y {len(errores) - 5} más)" if len(errores) > 5 else ""))
+
+
+def _opciones(*opciones: str) -> Dict[str, Any]:
+    return {"opciones": opciones}
+
+
+def _rango(minimo: float, maximo: float) -> Dict[str, Any]:
+    return {"rango": (minimo, maximo)}
+
+
+class Esquema:
+    def a_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class Conceptos(Esquema):
+    conceptos_principales: List[str]
+    conceptos_secundarios: List[str] = field(default_factory=list)
+    datos_especificos: List[str] = field(default_factory=list)
+    relaciones_procesos: List[str] = field(default_factory=list)
+    tema_detectado: str = "Otro"
+    nivel_dificultad: str = field(default="Intermedio", metadata=_opciones("Básico", "Intermedio", "Avanzado"))
+
+
+@dataclass
+class ErrorFactual(Esquema):
+    error: str
+    gravedad: str = field(default="moderado", metadata=_opciones(*GRAVEDADES))
+    cita_alumno: str = ""
+
+
+@dataclass
+class Analisis(Esquema):
+    conceptos_correctos: List[str]
+    conceptos_omitidos: List[str]
+    errores_factuales: List[ErrorFactual] = field(default_factory=list)
+    informacion_inventada: List[str] = field(default_factory=list)
+    claridad_explicacion: str = field(default="regular", metadata=_opciones(*CALIDADES))
+    coherencia_argumentativa: str = field(default="regular", metadata=_opciones(*CALIDADES))
+    uso_vocabulario_tecnico: str = field(default="regular", metadata=_opciones(*CALIDADES_VOCABULARIO))
+    citas_destacadas: List[str] = field(default_factory=list)
+
+
+@dataclass
+class CalificacionCriterio(Esquema):
+    criterio: str
+    puntaje: float = field(metadata=_rango(0, 100))
+    maximo: float = field(metadata=_rango(0, 100))
+    justificacion: str = ""
+
+
+@dataclass
+class Penalizacion(Esquema):
+    razon: str
+    puntos_restados: float = field(metadata=_rango(0, 10))
+
+
+@dataclass
+class Bonificacion(Esquema):
+    razon: str
+    puntos_agregados: float = field(metadata=_rango(0, 10))
+
+
+@dataclass
+class Calificacion(Esquema):
+    calificacion_final: float = field(metadata=_rango(0, 10))
+    calificacion_por_criterio: List[CalificacionCriterio] = field(default_factory=list)
+    penalizaciones: List[Penalizacion] = field(default_factory=list)
+    bonificaciones: List[Bonificacion] = field(default_factory=list)
+    nivel_confianza: str = field(default="medio", metadata=_opciones(*CONFIANZAS))
+    justificacion_general: str = ""
+
+
+@dataclass
+class ErrorCorregido(Esquema):
+    error: str
+    correccion: str
+    explicacion: str = ""
+
+
+@dataclass
+class FeedbackAlumno(Esquema):
+    resumen: str
+    fortalezas: List[str] = field(default_factory=list)
+    areas_mejora: List[str] = field(default_factory=list)
+    errores_corregidos: List[ErrorCorregido] = field(default_factory=list)
+    recomendaciones_estudio: List[str] = field(default_factory=list)
+    mensaje_motivacional: str = ""
+
+
+@dataclass
+class NotaDocente(Esquema):
+    observaciones: str = ""
+    patron_errores: str = ""
+    sugerencia_refuerzo: str = ""
+    comparacion_esperado: str = ""
+
+
+@dataclass
+class Feedback(Esquema):
+    feedback_alumno: FeedbackAlumno
+    nota_docente: NotaDocente = field(default_factory=NotaDocente)
+
+
+@dataclass
+class EvaluacionRapida(Esquema):
+    analisis: Analisis
+    calificacion: Calificacion
+    feedback: Feedback
+
+
+@dataclass
+class PuntajeCriterio(Esquema):
+    id: str
+    puntaje: float = field(metadata=_rango(0, 100))
+    justificacion: str = ""
+
+
+@dataclass
+class AjusteAplicado(Esquema):
+    regla: str
+    veces: float = field(default=1.0, metadata=_rango(0, 20))
+    razon: str = ""
+
+
+@dataclass
+class ValoracionCriterios(Esquema):
+    """Puntaje de cada criterio hoja de la rúbrica; la nota se suma localmente (rubrica.py)"""
+    criterios: List[PuntajeCriterio]
+    ajustes: List[AjusteAplicado] = field(default_factory=list)
+    nivel_confianza: str = field(default="medio", metadata=_opciones(*CONFIANZAS))
+
+
+@dataclass
+class EvaluacionPregunta(Esquema):
+    """Análisis y puntaje de la respuesta a una sola pregunta (modo por preguntas)"""
+    analisis: Analisis
+    puntaje: float = field(metadata=_rango(0, 100))
+    justificacion: str = ""
+    ajustes: List[AjusteAplicado] = field(default_factory=list)
+    nivel_confianza: str = field(default="medio", metadata=_opciones(*CONFIANZAS))
+
+
+def _sin_acentos(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn").lower().strip()
+
+
+def _elegir_opcion(valor: str, opciones: Tuple[str, ...]) -> Optional[str]:
+    """"Buena", "BUENO" o "Básico" se aceptan si coinciden (sin acentos) en las primeras letras"""
+    normalizado = _sin_acentos(valor)
+    for opcion in opciones:
+        if normalizado == _sin_acentos(opcion):
+            return opcion
+    coincidencias = [o for o in opciones if normalizado[:4] and _sin_acentos(o)[:4] == normalizado[:4]]
+    return coincidencias[0] if len(coincidencias) == 1 else None
+
+
+def _numero(valor: Any) -> Optional[float]:
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, str):
+        try:
+            # "8,5" o "8.5/10"
+            return float(valor.split("/")[0].strip().replace(",", "."))
+        except ValueError:
+            return None
+    return None
+
+
+def _convertir(tipo: Any, valor: Any, ruta: str, metadatos: Any, errores: List[str]) -> Any:
+    origen = typing.get_origin(tipo)
+    if origen in (list, List):
+        (tipo_elemento,) = typing.get_args(tipo)
+        if isinstance(valor, (str, dict)) and valor:
+            valor = [valor]  # un solo elemento sin lista
+        if not isinstance(valor, list):
+            errores.append(f"{ruta}: se esperaba una lista")
+            return []
+        return [_convertir(tipo_elemento, v, f"{ruta}.{i}", {}, errores) for i, v in enumerate(valor)]
+
+    if is_dataclass(tipo):
+        if not isinstance(valor, dict):
+            errores.append(f"{ruta}: se esperaba un objeto")
+            return None
+        return _construir(tipo, valor, ruta, errores)
+
+    if tipo is float:
+        numero = _numero(valor)
+        if numero is None:
+            errores.append(f"{ruta}: se esperaba un número, llegó {json.dumps(valor, ensure_ascii=False)[:40]}")
+            return None
+        rango = metadatos.get("rango")
+        if rango and not rango[0] <= numero <= rango[1]:
+            errores.append(f"{ruta}: {numero} fuera del rango {rango[0]}-{rango[1]}")
+        return numero
+
+    if tipo is str:
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            valor = str(valor)
+        if not isinstance(valor, str):
+            errores.append(f"{ruta}: se esperaba texto")
+            return ""
+        opciones = metadatos.get("opciones")
+        if opciones:
+            opcion = _elegir_opcion(valor, opciones)
+            if opcion is None:
+                errores.append(f"{ruta}: '{valor}' no es una opción válida ({'|'.join(opciones)})")
+                return valor
+            return opcion
+        return valor
+
+    return valor
+
+
+def _construir(esquema: type, datos: Dict[str, Any], ruta: str, errores: List[str]) -> Any:
+    tipos = typing.get_type_hints(esquema)
+    valores = {}
+    incompleto = False
+    for campo in fields(esquema):
+        ruta_campo = f"{ruta}.{campo.name}" if ruta else campo.name
+        valor = datos.get(campo.name)
+        if valor is None:
+            if campo.default is MISSING and campo.default_factory is MISSING:
+                errores.append(f"{ruta_campo}: campo obligatorio ausente")
+                incompleto = True
+                continue
+            # Los opcionales ausentes toman su valor por defecto
+            valores[campo.name] = campo.default if campo.default is not MISSING else campo.default_factory()
+            continue
+        valores[campo.name] = _convertir(tipos[campo.name], valor, ruta_campo, campo.metadata, errores)
+    return None if incompleto else esquema(**valores)
+
+
+def validar(esquema: type, datos: Any) -> Any:
+    """Convierte un dict en una instancia del esquema o lanza ErrorEsquema con todos los problemas"""
+    errores: List[str] = []
+    if not isinstance(datos, dict):
+        raise ErrorEsquema(esquema.__name__, ["la respuesta no es un objeto JSON"])
+    instancia = _construir(esquema, datos, "", errores)
+    if errores:
+        raise ErrorEsquema(esquema.__name__, errores)
+    return instancia
+
+
+def validar_json(esquema: type, texto: str) -> Any:
+    try:
+        datos = json.loads(texto)
+    except json.JSONDecodeError as e:
+        raise ErrorEsquema(esquema.__name__, [f"JSON inválido: {e}"]) from e
+    return validar(esquema, datos)
+
+
+def describir(esquema: type) -> Dict[str, Any]:
+    """Plantilla del esquema para pedir una corrección: cada campo con su tipo y opciones"""
+    tipos = typing.get_type_hints(esquema)
+    plantilla = {}
+    for campo in fields(esquema):
+        plantilla[campo.name] = _describir_tipo(tipos[campo.name], campo.metadata)
+    return plantilla
+
+
+def _describir_tipo(tipo: Any, metadatos: Any) -> Any:
+    if typing.get_origin(tipo) in (list, List):
+        return [_describir_tipo(typing.get_args(tipo)[0], {})]
+    if is_dataclass(tipo):
+        return describir(tipo)
+    if tipo is float:
+        rango = metadatos.get("rango")
+        return f"número ({rango[0]}-{rango[1]})" if rango else "número"
+    opciones = metadatos.get("opciones")
+    return "|".join(opciones) if opciones else "texto"
@@ -0,0 +1,398 @@
+"""
+Grabación y reproducción de las respuestas de los proveedores
+En modo "grabar" cada llamada real (LLM o Whisper) se guarda en disco con el hash de su
+solicitud como clave; en "reproducir" se devuelve la respuesta grabada con una latencia
+simulada, sin red ni claves de API. Así el pipeline completo (evaluar_examen,
+proceso_completo) se puede medir y comparar de forma determinista
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, Iterator, AsyncIterator, Tuple
+
+from cache import hash_texto, hash_archivo
+from audio import LIMITE_BYTES_WHISPER
+from backends import (
+    MODELOS_LLM, MODELO_WHISPER, SolicitudLLM, RespuestaLLM, FragmentoLLM, RespuestaTranscripcion,
+    BackendLLM, BackendTranscripcion, BalanceadorTranscripcion, modelo_transcriptor_local
+)
+
+logger = logging.getLogger(__name__)
+
+# "auto" reproduce lo que ya está grabado y graba lo que falta
+MODOS_GRABACION = ("grabar", "reproducir", "auto")
+# Caracteres por fragmento al reproducir una respuesta transmitida
+TAMANO_FRAGMENTO = 16
+# Archivo del directorio con el transcriptor que grabó (nombre, modelo, límite de bytes)
+CLAVE_MANIFIESTO = "manifiesto"
+
+
+class GrabacionNoEncontrada(LookupError):
+    """En modo reproducir, la solicitud no tiene respuesta grabada"""
+
+    def __init__(self, clave: str, descripcion: str):
+        self.clave = clave
+        super().__init__(f"Sin grabación para {descripcion} ({clave[:12]}); grábala con modo='grabar' o 'auto'")
+
+
+@dataclass
+class LatenciaSimulada:
+    """
+    Latencia de cada respuesta reproducida: `primer_token` + `por_token` por token de salida.
+    Con `escala` > 0 se usa en su lugar la duración real grabada multiplicada por la escala.
+    `jitter` varía el resultado ±fracción (con `semilla` para repetirlo)
+    """
+    primer_token: float = 0.0
+    por_token: float = 0.0
+    escala: float = 0.0
+    jitter: float = 0.0
+    semilla: Optional[int] = None
+
+    def __post_init__(self):
+        self._azar = random.Random(self.semilla)
+        self._lock = threading.Lock()
+
+    def _variar(self, segundos: float) -> float:
+        if not self.jitter:
+            return segundos
+        with self._lock:
+            return max(0.0, segundos * (1 + self._azar.uniform(-self.jitter, self.jitter)))
+
+    def inicial(self, registrada: float) -> float:
+        """Espera hasta el primer fragmento"""
+        return 0.0 if self.escala > 0 else self._variar(self.primer_token)
+
+    def total(self, registrada: float, tokens: int) -> float:
+        if self.escala > 0:
+            return self._variar(registrada * self.escala)
+        return self._variar(self.primer_token + self.por_token * tokens)
+
+
+class Grabaciones:
+    """Un archivo JSON por solicitud en un directorio; sin expulsión, a diferencia de la caché"""
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.json")
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._ruta(clave), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def guardar(self, clave: str, valor: Dict[str, Any]):
+        ruta = self._ruta(clave)
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(valor, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, ruta)
+
+    def __len__(self) -> int:
+        return sum(
+            1 for nombre in os.listdir(self.directorio)
+            if nombre.endswith(".json") and nombre != f"{CLAVE_MANIFIESTO}.json"
+        )
+
+
+def _validar_modo(modo: str, real: Any):
+    if modo not in MODOS_GRABACION:
+        raise ValueError(f"Modo de grabación desconocido: {modo}. Opciones: {', '.join(MODOS_GRABACION)}")
+    if modo != "reproducir" and real is None:
+        raise ValueError(f"El modo '{modo}' necesita el backend real para grabar")
+
+
+class BackendLLMGrabado:
+    """BackendLLM que graba las respuestas de `real` o las reproduce desde disco"""
+
+    def __init__(
+        self,
+        directorio: str,
+        real: Optional[BackendLLM] = None,
+        modo: str = "reproducir",
+        latencia: Optional[LatenciaSimulada] = None,
+        nombre: str = "groq",
+        modelo: Optional[str] = None
+    ):
+        _validar_modo(modo, real)
+        self.grabaciones = Grabaciones(directorio)
+        self.real = real
+        self.modo = modo
+        self.latencia = latencia or LatenciaSimulada()
+        self.nombre = real.nombre if real else nombre
+        self.modelo = real.modelo if real else (modelo or MODELOS_LLM.get(nombre, nombre))
+        # Al reproducir no hay proveedor que limitar: recurso sin cubos en el planificador
+        self.recurso = real.recurso if real else "grabacion"
+
+    def clave(self, solicitud: SolicitudLLM) -> str:
+        return hash_texto(
+            "llm", self.nombre, self.modelo, solicitud.system_prompt, solicitud.user_prompt,
+            f"{solicitud.temperature}", f"{solicitud.max_tokens}", f"{solicitud.formato_json}"
+        )
+
+    def _grabada(self, clave: str) -> Optional[Dict[str, Any]]:
+        if self.modo == "grabar":
+            return None
+        grabada = self.grabaciones.obtener(clave)
+        if grabada is None and self.modo == "reproducir":
+            raise GrabacionNoEncontrada(clave, f"{self.nombre}/{self.modelo}")
+        return grabada
+
+    def _guardar(self, clave: str, solicitud: SolicitudLLM, respuesta: RespuestaLLM, duracion: float):
+        self.grabaciones.guardar(clave, {
+            "tipo": "llm",
+            "backend": self.nombre,
+            "modelo": self.modelo,
+            "solicitud": asdict(solicitud),
+            "respuesta": asdict(respuesta),
+            "duracion_s": round(duracion, 4)
+        })
+
+    @staticmethod
+    def _respuesta(grabada: Dict[str, Any]) -> RespuestaLLM:
+        return RespuestaLLM(**grabada["respuesta"])
+
+    def _fragmentos(self, grabada: Dict[str, Any]) -> Iterator[Tuple[float, FragmentoLLM]]:
+        """(espera, fragmento) de una respuesta grabada, repartiendo la latencia entre los fragmentos"""
+        respuesta = self._respuesta(grabada)
+        inicial = self.latencia.inicial(grabada["duracion_s"])
+        total = self.latencia.total(grabada["duracion_s"], respuesta.tokens_completion)
+        trozos = [respuesta.texto[i:i + TAMANO_FRAGMENTO] for i in range(0, len(respuesta.texto), TAMANO_FRAGMENTO)]
+        por_trozo = max(total - inicial, 0.0) / max(len(trozos), 1)
+        for i, trozo in enumerate(trozos):
+            yield (inicial if i == 0 else 0.0) + por_trozo, FragmentoLLM(trozo)
+        yield 0.0, FragmentoLLM("", respuesta.tokens_prompt, respuesta.tokens_completion)
+
+    def completar(self, solicitud: SolicitudLLM) -> RespuestaLLM:
+        clave = self.clave(solicitud)
+        grabada = self._grabada(clave)
+        if grabada is not None:
+            respuesta = self._respuesta(grabada)
+            time.sleep(self.latencia.total(grabada["duracion_s"], respuesta.tokens_completion))
+            return respuesta
+        inicio = time.perf_counter()
+        respuesta = self.real.completar(solicitud)
+        self._guardar(clave, solicitud, respuesta, time.perf_counter() - inicio)
+        return respuesta
+
+    def transmitir(self, solicitud: SolicitudLLM) -> Iterator[FragmentoLLM]:
+        clave = self.clave(solicitud)
+        grabada = self._grabada(clave)
+        if grabada is not None:
+            for espera, fragmento in self._fragmentos(grabada):
+                if espera:
+                    time.sleep(espera)
+                yield fragmento
+            return
+        yield from self._grabar_transmision(clave, solicitud, self.real.transmitir(solicitud))
+
+    def _grabar_transmision(
+        self,
+        clave: str,
+        solicitud: SolicitudLLM,
+        fragmentos: Iterator[FragmentoLLM]
+    ) -> Iterator[FragmentoLLM]:
+        inicio = time.perf_counter()
+        partes, uso = [], (0, 0)
+        try:
+            for fragmento in fragmentos:
+                partes.append(fragmento.texto)
+                if fragmento.tokens_prompt is not None:
+                    uso = (fragmento.tokens_prompt, fragmento.tokens_completion or 0)
+                yield fragmento
+        finally:
+            fragmentos.close()
+        # Solo llega aquí si la respuesta se consumió entera: una cancelada no se graba
+        self._guardar(clave, solicitud, RespuestaLLM("".join(partes).strip(), *uso), time.perf_counter() - inicio)
+
+    async def acompletar(self, solicitud: SolicitudLLM) -> RespuestaLLM:
+        clave = self.clave(solicitud)
+        grabada = self._grabada(clave)
+        if grabada is not None:
+            respuesta = self._respuesta(grabada)
+            await asyncio.sleep(self.latencia.total(grabada["duracion_s"], respuesta.tokens_completion))
+            return respuesta
+        inicio = time.perf_counter()
+        respuesta = await self.real.acompletar(solicitud)
+        self._guardar(clave, solicitud, respuesta, time.perf_counter() - inicio)
+        return respuesta
+
+    async def atransmitir(self, solicitud: SolicitudLLM) -> AsyncIterator[FragmentoLLM]:
+        clave = self.clave(solicitud)
+        grabada = self._grabada(clave)
+        if grabada is not None:
+            for espera, fragmento in self._fragmentos(grabada):
+                if espera:
+                    await asyncio.sleep(espera)
+                yield fragmento
+            return
+        inicio = time.perf_counter()
+        partes, uso = [], (0, 0)
+        fragmentos = self.real.atransmitir(solicitud)
+        try:
+            async for fragmento in fragmentos:
+                partes.append(fragmento.texto)
+                if fragmento.tokens_prompt is not None:
+                    uso = (fragmento.tokens_prompt, fragmento.tokens_completion or 0)
+                yield fragmento
+        finally:
+            await fragmentos.aclose()
+        self._guardar(clave, solicitud, RespuestaLLM("".join(partes).strip(), *uso), time.perf_counter() - inicio)
+
+    def calentar(self):
+        if self.real is not None:
+            self.real.calentar()
+
+    def cerrar(self):
+        if self.real is not None:
+            self.real.cerrar()
+
+
+class BackendTranscripcionGrabado:
+    """BackendTranscripcion que graba las transcripciones de `real` o las reproduce, por hash del audio"""
+
+    def __init__(
+        self,
+        directorio: str,
+        real: Optional[BackendTranscripcion] = None,
+        modo: str = "reproducir",
+        latencia: Optional[LatenciaSimulada] = None,
+        nombre: str = "groq",
+        modelo: str = MODELO_WHISPER,
+        limite_bytes: Optional[int] = LIMITE_BYTES_WHISPER
+    ):
+        _validar_modo(modo, real)
+        self.grabaciones = Grabaciones(directorio)
+        self.real = real
+        self.modo = modo
+        self.latencia = latencia or LatenciaSimulada()
+        self.nombre = real.nombre if real else nombre
+        self.modelo = real.modelo if real else modelo
+        self.recurso = real.recurso if real else "grabacion"
+        # El mismo límite que al grabar, para que los audios grandes se segmenten igual
+        self.limite_bytes = real.limite_bytes if real else limite_bytes
+        if real is not None:
+            self.grabaciones.guardar(CLAVE_MANIFIESTO, {
+                "transcriptor": {"nombre": self.nombre, "modelo": self.modelo, "limite_bytes": self.limite_bytes}
+            })
+
+    def clave(self, ruta: str, idioma: str) -> str:
+        return hash_texto("transcripcion", self.nombre, self.modelo, hash_archivo(ruta), idioma)
+
+    def _grabada(self, clave: str, ruta: str) -> Optional[Dict[str, Any]]:
+        if self.modo == "grabar":
+            return None
+        grabada = self.grabaciones.obtener(clave)
+        if grabada is None and self.modo == "reproducir":
+            raise GrabacionNoEncontrada(clave, os.path.basename(ruta))
+        return grabada
+
+    def _guardar(self, clave: str, idioma: str, respuesta: RespuestaTranscripcion, duracion: float):
+        self.grabaciones.guardar(clave, {
+            "tipo": "transcripcion",
+            "backend": self.nombre,
+            "modelo": self.modelo,
+            "idioma": idioma,
+            "respuesta": asdict(respuesta),
+            "duracion_s": round(duracion, 4)
+        })
+
+    def transcribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion:
+        clave = self.clave(ruta, idioma)
+        grabada = self._grabada(clave, ruta)
+        if grabada is not None:
+            time.sleep(self.latencia.total(grabada["duracion_s"], 0))
+            return RespuestaTranscripcion(**grabada["respuesta"])
+        inicio = time.perf_counter()
+        respuesta = self.real.transcribir(ruta, idioma)
+        self._guardar(clave, idioma, respuesta, time.perf_counter() - inicio)
+        return respuesta
+
+    async def atranscribir(self, ruta: str, idioma: str) -> RespuestaTranscripcion:
+        clave = await asyncio.to_thread(self.clave, ruta, idioma)
+        grabada = self._grabada(clave, ruta)
+        if grabada is not None:
+            await asyncio.sleep(self.latencia.total(grabada["duracion_s"], 0))
+            return RespuestaTranscripcion(**grabada["respuesta"])
+        inicio = time.perf_counter()
+        respuesta = await self.real.atranscribir(ruta, idioma)
+        self._guardar(clave, idioma, respuesta, time.perf_counter() - inicio)
+        return respuesta
+
+    def calentar(self):
+        if self.real is not None:
+            self.real.calentar()
+
+    def cerrar(self):
+        if self.real is not None:
+            self.real.cerrar()
+
+
+def _transcriptor_grabado(directorio: str, pedido: Optional[str]) -> Dict[str, Any]:
+    """
+    nombre, modelo y limite_bytes del transcriptor que grabó el directorio (según su manifiesto)
+    o, en grabaciones sin manifiesto, los del transcriptor pedido
+    """
+    grabado = (Grabaciones(directorio).obtener(CLAVE_MANIFIESTO) or {}).get("transcriptor")
+    if grabado is not None:
+        if pedido is not None and pedido != grabado["nombre"]:
+            raise ValueError(
+                f"Las grabaciones de {directorio} se hicieron con el transcriptor '{grabado['nombre']}', no '{pedido}'"
+            )
+        return grabado
+    if pedido == "local":
+        return {"nombre": "local", "modelo": modelo_transcriptor_local(), "limite_bytes": None}
+    if pedido == "balanceado":
+        raise ValueError("No hay grabaciones del transcriptor balanceado; usa 'groq' o 'local'")
+    return {"nombre": "groq", "modelo": MODELO_WHISPER, "limite_bytes": LIMITE_BYTES_WHISPER}
+
+
+def evaluador_grabado(
+    directorio: str,
+    modo: str = "reproducir",
+    proveedor: str = "groq",
+    latencia: Optional[LatenciaSimulada] = None,
+    **opciones: Any
+) -> "EvaluadorEngine":
+    """
+    EvaluadorEngine cuyos backends graban o reproducen desde `directorio`.
+    Para grabar se crean los backends reales con las claves del entorno; para reproducir
+    no hace falta red ni claves, y el transcriptor es el que grabó el directorio. La caché en disco se desactiva salvo que se pida
+    (usar_cache=True), porque ocultaría llamadas al grabar y al medir
+    """
+    from engine import EvaluadorEngine
+
+    opciones.setdefault("usar_cache", False)
+    if modo == "reproducir":
+        nombres = list(MODELOS_LLM) if proveedor == "multi" else [proveedor]
+        backends_llm = {n: BackendLLMGrabado(directorio, modo=modo, latencia=latencia, nombre=n) for n in nombres}
+        transcripcion = BackendTranscripcionGrabado(
+            directorio, modo=modo, latencia=latencia, **_transcriptor_grabado(directorio, opciones.get("transcriptor"))
+        )
+    else:
+        real = EvaluadorEngine(proveedor=proveedor, **opciones)
+        if isinstance(real.transcriptor, BalanceadorTranscripcion):
+            # Cada audio podría ir a un modelo distinto: la grabación no sería reproducible
+            raise ValueError("No se puede grabar con el transcriptor balanceado; usa 'groq' o 'local'")
+        backends_llm = {
+            n: BackendLLMGrabado(directorio, backend, modo, latencia)
+            for n, backend in real.backends_llm.items()
+        }
+        transcripcion = BackendTranscripcionGrabado(directorio, real.transcriptor, modo, latencia)
+
+    logger.debug(f"Evaluador con grabaciones en {directorio} (modo {modo})")
+    return EvaluadorEngine(
+        proveedor=proveedor,
+        backends_llm=backends_llm,
+        backend_transcripcion=transcripcion,
+        **opciones
+    )
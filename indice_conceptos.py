@@ -0,0 +1,264 @@
+"""
+Índice local de conceptos para medir cobertura sin depender del LLM
+Normaliza (acentos y mayúsculas), tokeniza, reduce cada palabra a su raíz y
+compara conceptos por conjuntos de raíces y bigramas
+"""
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Set, Tuple, FrozenSet
+
+IDIOMAS_SOPORTADOS = ("es", "en", "fr", "de", "pt", "it")
+
+PALABRAS_VACIAS = {
+    "es": {
+        "el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del", "al", "a", "en", "y", "e", "o", "u",
+        "que", "con", "por", "para", "se", "su", "sus", "es", "son", "lo", "le", "les", "como", "mas", "pero",
+        "sin", "sobre", "entre", "este", "esta", "estos", "estas", "ese", "esa", "eso", "hay", "muy", "ya", "no",
+        "si", "ser", "fue", "era", "tiene", "tienen", "cual", "cuando", "donde", "tambien", "porque"
+    },
+    "en": {
+        "the", "a", "an", "of", "in", "on", "and", "or", "to", "for", "with", "by", "is", "are", "was", "were",
+        "be", "it", "its", "this", "that", "these", "those", "as", "at", "from", "which", "has", "have", "not",
+        "but", "so", "there", "their", "they", "when", "where", "because", "also"
+    },
+    "fr": {
+        "le", "la", "les", "un", "une", "des", "de", "du", "au", "aux", "et", "ou", "en", "dans", "que", "qui",
+        "pour", "par", "avec", "sur", "se", "sa", "son", "ses", "est", "sont", "ce", "cette", "ces", "il", "elle",
+        "ne", "pas", "plus", "comme", "mais", "aussi"
+    },
+    "de": {
+        "der", "die", "das", "den", "dem", "des", "ein", "eine", "einen", "einem", "einer", "und", "oder", "in",
+        "im", "an", "am", "auf", "mit", "von", "vom", "zu", "zum", "zur", "fur", "ist", "sind", "war", "es",
+        "sie", "er", "nicht", "auch", "als", "wie", "aber", "dass", "bei", "aus"
+    },
+    "pt": {
+        "o", "a", "os", "as", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das", "em", "no", "na", "nos",
+        "nas", "e", "ou", "que", "com", "por", "para", "se", "seu", "sua", "seus", "suas", "e", "sao", "como",
+        "mais", "mas", "sem", "sobre", "entre", "este", "esta", "isso", "nao", "tambem", "porque"
+    },
+    "it": {
+        "il", "lo", "la", "i", "gli", "le", "un", "uno", "una", "di", "del", "della", "dei", "delle", "a", "al",
+        "alla", "in", "nel", "nella", "e", "o", "che", "con", "per", "da", "su", "si", "suo", "sua", "sono",
+        "come", "piu", "ma", "non", "anche", "questo", "questa", "perche"
+    },
+}
+
+# Sufijos por idioma (sin acentos), del más largo al más corto
+SUFIJOS = {
+    "es": (
+        "amientos", "imientos", "amiento", "imiento", "aciones", "uciones", "adoras", "adores", "ancias",
+        "logias", "mente", "acion", "ucion", "adora", "ador", "ancia", "logia", "idades", "idad", "ivas",
+        "ivos", "iva", "ivo", "osas", "osos", "osa", "oso", "ables", "ibles", "able", "ible", "istas", "ista",
+        "es", "as", "os", "a", "o", "e", "s"
+    ),
+    "en": (
+        "ational", "tional", "ations", "ation", "nesses", "ness", "ments", "ment", "ings", "ing", "edly",
+        "ies", "ed", "es", "ly", "s"
+    ),
+    "fr": (
+        "issements", "issement", "ations", "ation", "ements", "ement", "euses", "euse", "eux", "ites", "ite",
+        "ives", "ive", "ifs", "if", "es", "e", "s", "x"
+    ),
+    "de": (
+        "ungen", "heiten", "keiten", "ung", "heit", "keit", "lich", "isch", "ern", "em", "en", "er", "es",
+        "e", "s", "n"
+    ),
+    "pt": (
+        "amentos", "imentos", "amento", "imento", "acoes", "acao", "idades", "idade", "mente", "ivas", "ivos",
+        "iva", "ivo", "osas", "osos", "osa", "oso", "es", "as", "os", "a", "o", "e", "s"
+    ),
+    "it": (
+        "azioni", "azione", "amenti", "amento", "imenti", "imento", "mente", "ita", "ivi", "ive", "iva", "ivo",
+        "osi", "ose", "osa", "oso", "i", "e", "a", "o"
+    ),
+}
+
+LONGITUD_MINIMA_RAIZ = 3
+# Candidatos que puntúa IndiceConceptos.buscar por texto: los que más raíces comparten con él
+MAX_CANDIDATOS = 64
+
+_PATRON_PALABRA = re.compile(r"\w+")
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin acentos"""
+    texto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _idioma(idioma: str) -> str:
+    return idioma if idioma in IDIOMAS_SOPORTADOS else "es"
+
+
+@lru_cache(maxsize=65536)
+def raiz(palabra: str, idioma: str = "es") -> str:
+    """Reduce una palabra normalizada a su raíz quitando el sufijo más largo posible"""
+    for sufijo in SUFIJOS[_idioma(idioma)]:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= LONGITUD_MINIMA_RAIZ:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def raices(texto: str, idioma: str = "es") -> List[str]:
+    """Raíces de las palabras significativas del texto, en orden"""
+    idioma = _idioma(idioma)
+    vacias = PALABRAS_VACIAS[idioma]
+    return [
+        raiz(palabra, idioma)
+        for palabra in _PATRON_PALABRA.findall(normalizar(texto))
+        if palabra not in vacias
+    ]
+
+
+def _bigramas(tokens: List[str]) -> Set[Tuple[str, str]]:
+    return set(zip(tokens, tokens[1:]))
+
+
+@lru_cache(maxsize=8192)
+def _firma(texto: str, idioma: str) -> Tuple[FrozenSet[str], FrozenSet[Tuple[str, str]]]:
+    tokens = raices(texto, idioma)
+    return frozenset(tokens), frozenset(_bigramas(tokens))
+
+
+def similitud(a: str, b: str, idioma: str = "es") -> float:
+    """Coeficiente de solapamiento entre los conjuntos de raíces de dos conceptos (0 a 1)"""
+    raices_a, _ = _firma(a, idioma)
+    raices_b, _ = _firma(b, idioma)
+    if not raices_a or not raices_b:
+        return 0.0
+    return len(raices_a & raices_b) / min(len(raices_a), len(raices_b))
+
+
+def deduplicar_conceptos(
+    conceptos: List[str],
+    idioma: str = "es",
+    excluir: Optional[List[str]] = None,
+    umbral: float = 0.8
+) -> List[str]:
+    """
+    Quita los conceptos repetidos con otra redacción ("la fotosíntesis" y "Fotosíntesis"),
+    conservando la primera aparición. Dos conceptos son el mismo si sus conjuntos de raíces
+    tienen Jaccard >= umbral; los de `excluir` cuentan como ya vistos
+    """
+    idioma = _idioma(idioma)
+    vistos: List[FrozenSet[str]] = [_firma(c, idioma)[0] for c in (excluir or [])]
+    resultado = []
+    for concepto in conceptos:
+        if not concepto or not concepto.strip():
+            continue
+        firma = _firma(concepto, idioma)[0] or frozenset([normalizar(concepto).strip()])
+        if any(len(firma & visto) / len(firma | visto) >= umbral for visto in vistos if visto):
+            continue
+        vistos.append(firma)
+        resultado.append(concepto)
+    return resultado
+
+
+class EvidenciaTexto:
+    """Conjunto de raíces y bigramas de una transcripción para verificar conceptos en ella"""
+
+    def __init__(self, texto: str, idioma: str = "es"):
+        self.idioma = _idioma(idioma)
+        tokens = raices(texto, self.idioma)
+        self.raices = set(tokens)
+        self.bigramas = _bigramas(tokens)
+
+    def puntaje(self, concepto: str) -> float:
+        """Fracción de las raíces del concepto presentes en el texto; los bigramas en orden suman"""
+        raices_concepto, bigramas_concepto = _firma(concepto, self.idioma)
+        if not raices_concepto:
+            return 0.0
+        cobertura = len(raices_concepto & self.raices) / len(raices_concepto)
+        if bigramas_concepto and cobertura < 1.0:
+            cobertura = max(cobertura, len(bigramas_concepto & self.bigramas) / len(bigramas_concepto))
+        return cobertura
+
+    def contiene(self, concepto: str, umbral: float = 0.6) -> bool:
+        return self.puntaje(concepto) >= umbral
+
+
+class IndiceConceptos:
+    """Índice invertido raíz -> conceptos para emparejar afirmaciones con conceptos esperados"""
+
+    def __init__(self, conceptos: List[str], idioma: str = "es"):
+        self.idioma = _idioma(idioma)
+        self.conceptos = list(dict.fromkeys(c for c in conceptos if c and c.strip()))
+        self._invertido: Dict[str, List[int]] = {}
+        self._tamanos: List[int] = []
+        for i, concepto in enumerate(self.conceptos):
+            firma = _firma(concepto, self.idioma)[0]
+            self._tamanos.append(len(firma))
+            for r in firma:
+                self._invertido.setdefault(r, []).append(i)
+
+    def buscar(self, texto: str, umbral: float = 0.6, max_candidatos: int = MAX_CANDIDATOS) -> List[Tuple[str, float]]:
+        """
+        Conceptos del índice que coinciden con el texto, con su similitud. Solo se puntúan los
+        `max_candidatos` que más raíces comparten con el texto (conteo en el índice invertido);
+        la similitud sale de ese mismo conteo, sin volver a comparar conjuntos
+        """
+        raices_texto = _firma(texto, self.idioma)[0]
+        if not raices_texto:
+            return []
+        compartidas: Counter = Counter()
+        for r in raices_texto:
+            compartidas.update(self._invertido.get(r, ()))
+
+        coincidencias = []
+        for i, n in compartidas.most_common(max_candidatos):
+            puntaje = n / min(len(raices_texto), self._tamanos[i])
+            if puntaje >= umbral:
+                coincidencias.append((self.conceptos[i], puntaje))
+        return sorted(coincidencias, key=lambda c: -c[1])
+
+
+def calcular_cobertura(
+    principales: List[str],
+    secundarios: List[str],
+    afirmados: List[str],
+    transcripcion: Optional[str] = None,
+    idioma: str = "es",
+    umbral: float = 0.6
+) -> Dict[str, Any]:
+    """
+    Cobertura ponderada (principales x2) de los conceptos esperados.
+    Un concepto cuenta como cubierto si aparece en la transcripción o si el LLM lo
+    afirma y esa afirmación tiene respaldo en la transcripción. Sin transcripción se
+    confía en las afirmaciones del LLM emparejadas localmente.
+    """
+    evidencia = EvidenciaTexto(transcripcion, idioma) if transcripcion is not None else None
+
+    afirmados_validos = []
+    sin_evidencia = []
+    for afirmado in afirmados:
+        if evidencia is None or evidencia.contiene(afirmado, umbral):
+            afirmados_validos.append(afirmado)
+        else:
+            sin_evidencia.append(afirmado)
+
+    indice = IndiceConceptos(list(principales) + list(secundarios), idioma)
+    cubiertos: Set[str] = set()
+    for afirmado in afirmados_validos:
+        for concepto, _ in indice.buscar(afirmado, umbral):
+            cubiertos.add(concepto)
+    if evidencia is not None:
+        cubiertos |= {c for c in indice.conceptos if evidencia.contiene(c, umbral)}
+
+    principales = list(dict.fromkeys(principales))
+    conjunto_principales = set(principales)
+    secundarios = [s for s in dict.fromkeys(secundarios) if s not in conjunto_principales]
+    total = len(principales) * 2 + len(secundarios)
+    if total == 0:
+        porcentaje = 100.0
+    else:
+        puntos = sum(2 for p in principales if p in cubiertos) + sum(1 for s in secundarios if s in cubiertos)
+        porcentaje = round(min(puntos / total * 100, 100.0), 1)
+
+    return {
+        "cobertura_porcentaje": porcentaje,
+        "principales_cubiertos": [p for p in principales if p in cubiertos],
+        "secundarios_cubiertos": [s for s in secundarios if s in cubiertos],
+        "conceptos_sin_evidencia": sin_evidencia
+    }
@@ -0,0 +1,150 @@
+"""
+Parser JSON incremental para respuestas transmitidas (streaming) del LLM
+Recibe el texto por fragmentos y entrega cada campo en cuanto su valor está completo,
+p. ej. ("calificacion_final", 8.5) o ("feedback_alumno.resumen", "...") antes de que
+termine la respuesta. Ignora lo que haya antes del primer { (bloques ```json, preámbulos)
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+ESPACIOS = " \t\r\n"
+FIN_LITERAL = ",}]" + ESPACIOS
+
+
+class ParserJSONIncremental:
+    """
+    Máquina de estados carácter a carácter. Los valores completos se decodifican con
+    json.loads sobre su tramo del texto, así que el resultado coincide con el parseo final.
+    Las rutas unen claves e índices con puntos: "calificacion_por_criterio.0.puntaje"
+    """
+
+    def __init__(self, emitir_contenedores: bool = True):
+        self.emitir_contenedores = emitir_contenedores
+        self.texto = ""
+        self.terminado = False
+        self.resultado: Optional[Any] = None
+        self._pos = 0
+        # Cada marco: {"tipo": "obj"|"arr", "inicio", "clave", "indice"}
+        self._pila: List[Dict[str, Any]] = []
+        # inicio | clave | dos_puntos | valor | tras_valor | cadena | literal | fin
+        self._estado = "inicio"
+        self._inicio_valor = 0
+        self._es_clave = False
+        self._escape = False
+
+    def alimentar(self, fragmento: str) -> List[Tuple[str, Any]]:
+        """Añade texto y devuelve los campos (ruta, valor) que quedaron completos"""
+        self.texto += fragmento
+        completos: List[Tuple[str, Any]] = []
+        texto = self.texto
+
+        while self._pos < len(texto) and self._estado != "fin":
+            c = texto[self._pos]
+            estado = self._estado
+
+            if estado == "cadena":
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._cerrar_cadena(completos)
+                self._pos += 1
+                continue
+
+            if estado == "literal":
+                if c not in FIN_LITERAL:
+                    self._pos += 1
+                    continue
+                # El carácter que termina el literal se procesa como separador
+                self._completar(completos, texto[self._inicio_valor:self._pos])
+                self._estado = "tras_valor"
+                continue
+
+            if estado == "inicio":
+                if c in "{[":
+                    self._abrir(c)
+                self._pos += 1
+                continue
+
+            if c in ESPACIOS:
+                self._pos += 1
+                continue
+
+            if estado == "clave":
+                if c == '"':
+                    self._estado, self._es_clave, self._inicio_valor = "cadena", True, self._pos
+                elif c == "}":
+                    self._cerrar(completos)
+            elif estado == "dos_puntos":
+                if c == ":":
+                    self._estado = "valor"
+            elif estado == "valor":
+                if c == '"':
+                    self._estado, self._es_clave, self._inicio_valor = "cadena", False, self._pos
+                elif c in "{[":
+                    self._abrir(c)
+                elif c == "]" and self._pila[-1]["tipo"] == "arr":
+                    self._cerrar(completos)
+                else:
+                    self._estado, self._inicio_valor = "literal", self._pos
+                    continue
+            elif estado == "tras_valor":
+                if c == ",":
+                    marco = self._pila[-1]
+                    if marco["tipo"] == "arr":
+                        marco["indice"] += 1
+                        self._estado = "valor"
+                    else:
+                        self._estado = "clave"
+                elif c in "}]":
+                    self._cerrar(completos)
+            self._pos += 1
+
+        return completos
+
+    def _abrir(self, c: str):
+        tipo = "obj" if c == "{" else "arr"
+        self._pila.append({"tipo": tipo, "inicio": self._pos, "clave": None, "indice": 0})
+        self._estado = "clave" if tipo == "obj" else "valor"
+
+    def _cerrar(self, completos: List[Tuple[str, Any]]):
+        marco = self._pila.pop()
+        tramo = self.texto[marco["inicio"]:self._pos + 1]
+        if not self._pila:
+            self._estado = "fin"
+            self.terminado = True
+            try:
+                self.resultado = json.loads(tramo)
+            except ValueError:
+                self.resultado = None
+            return
+        self._estado = "tras_valor"
+        if self.emitir_contenedores:
+            self._completar(completos, tramo)
+
+    def _cerrar_cadena(self, completos: List[Tuple[str, Any]]):
+        tramo = self.texto[self._inicio_valor:self._pos + 1]
+        if self._es_clave:
+            try:
+                self._pila[-1]["clave"] = json.loads(tramo)
+            except ValueError:
+                self._pila[-1]["clave"] = tramo.strip('"')
+            self._estado = "dos_puntos"
+        else:
+            self._completar(completos, tramo)
+            self._estado = "tras_valor"
+
+    def _ruta(self) -> str:
+        partes = []
+        for marco in self._pila:
+            partes.append(str(marco["clave"] if marco["tipo"] == "obj" else marco["indice"]))
+        return ".".join(partes)
+
+    def _completar(self, completos: List[Tuple[str, Any]], tramo: str):
+        try:
+            valor = json.loads(tramo)
+        except ValueError:
+            # Best effort: un valor mal formado no se emite; el parseo final decide
+            return
+        completos.append((self._ruta(), valor))
@@ -0,0 +1,222 @@
+"""
+Limpieza local de transcripciones: muletillas y repeticiones por idioma
+Solo se recurre al LLM cuando las heurísticas detectan posibles errores de transcripción
+"""
+import re
+from typing import Dict, List, Pattern, Tuple
+
+from audio import quitar_solape_texto
+
+MODOS_LIMPIEZA = ("auto", "local", "llm")
+
+# Limpieza con LLM por bloques: cada respuesta queda muy por debajo de max_tokens
+TAMANO_BLOQUE = 2500
+ORACIONES_CONTEXTO = 1
+# Quitar muletillas acorta el texto, pero no a menos de esta fracción; si pasa, el LLM truncó o resumió
+PROPORCION_MINIMA = 0.6
+
+# "siempre": sonidos de relleno que nunca son contenido
+# "delimitadas": palabras que también tienen uso normal; solo se quitan entre pausas (comas, puntos)
+MULETILLAS = {
+    "es": {
+        "siempre": ["e+h+", "e+m+", "m{2,}", "h?m+m", "a+h+", "u+m+", "ajá"],
+        "delimitadas": ["o sea", "bueno", "pues", "como que", "digamos", "este", "a ver", "o sea que", "tipo"],
+    },
+    "en": {
+        "siempre": ["u+h+", "u+m+", "e+r+m+", "e+r+", "h?m+m", "a+h+"],
+        "delimitadas": ["you know", "like", "i mean", "well", "so", "basically", "kind of", "sort of"],
+    },
+    "fr": {
+        "siempre": ["e+u+h+", "h+e+u+", "h+u+m+", "b+a+h+", "m{2,}"],
+        "delimitadas": ["ben", "bon", "genre", "en fait", "tu vois", "quoi", "voilà", "du coup"],
+    },
+    "de": {
+        "siempre": ["ä+h+", "ä+h+m+", "ö+h+", "h?m+m", "m+h+m+"],
+        "delimitadas": ["also", "halt", "sozusagen", "eben", "naja", "genau", "quasi"],
+    },
+    "pt": {
+        "siempre": ["e+h+", "h+u+m+", "a+h+n+", "h+ã+", "m{2,}"],
+        "delimitadas": ["tipo", "né", "então", "bom", "assim", "sabe", "quer dizer"],
+    },
+    "it": {
+        "siempre": ["e+h+m+", "e+h+", "m{2,}", "u+h+m+"],
+        "delimitadas": ["cioè", "tipo", "insomma", "diciamo", "allora", "praticamente", "vabbè", "ecco"],
+    },
+}
+
+# Frases que Whisper inventa sobre silencios o ruido
+ALUCINACIONES_WHISPER = [
+    "subtítulos realizados por la comunidad de amara.org",
+    "subtitulado por la comunidad de amara.org",
+    "gracias por ver el video",
+    "suscríbete",
+    "thanks for watching",
+    "thank you for watching",
+    "sous-titrage",
+    "untertitel im auftrag",
+    "legendas pela comunidade",
+    "sottotitoli creati dalla comunità",
+]
+
+_PATRON_ORACIONES = re.compile(r"(?<=[.!?…])\s+")
+
+MARCADORES_INAUDIBLE = re.compile(r"[\[(](?:inaudible|ininteligible|unintelligible|\?+|música|music)[\])]", re.IGNORECASE)
+
+
+def _compilar(idioma: str) -> Tuple[Pattern, Pattern]:
+    lexico = MULETILLAS.get(idioma, MULETILLAS["es"])
+    siempre = re.compile(
+        r"(?:,\s*)?(?<!\w)(?:" + "|".join(lexico["siempre"]) + r")(?!\w)\s*(?:,|\.\.\.|…)?",
+        re.IGNORECASE
+    )
+    # Las más largas primero para que "o sea que" gane a "o sea"
+    delimitadas = sorted(lexico["delimitadas"], key=len, reverse=True)
+    entre_pausas = re.compile(
+        r"(?P<antes>^|[,.;:!?¿¡…])\s*(?:" + "|".join(re.escape(d) for d in delimitadas) + r")\s*"
+        r"(?:,|\.\.\.|…|(?=[.;:!?]))",
+        re.IGNORECASE | re.MULTILINE
+    )
+    return siempre, entre_pausas
+
+
+def _reemplazo_sonido(m: "re.Match") -> str:
+    # "cloroplastos, eh, este," conserva la coma para que "este" siga delimitada
+    return ", " if m.group(0).startswith(",") else " "
+
+
+def _reemplazo_pausa(m: "re.Match") -> str:
+    # ", este," desaparece con sus dos comas; tras un punto o al inicio se conserva la pausa previa
+    antes = m.group("antes")
+    return " " if antes in ("", ",") else f"{antes} "
+
+
+_PATRONES: Dict[str, Tuple[Pattern, Pattern]] = {idioma: _compilar(idioma) for idioma in MULETILLAS}
+
+# Repeticiones de 4, 3, 2 y 1 palabras, en ese orden
+_REPETICIONES = [
+    re.compile(r"\b(" + r"\w+\s+" * (n - 1) + r"\w+)(?:[\s,]+\1\b)+", re.IGNORECASE)
+    for n in range(4, 0, -1)
+]
+
+
+def _ordenar_puntuacion(texto: str) -> str:
+    texto = re.sub(r"\s+([,.;:!?…])", r"\1", texto)
+    texto = re.sub(r"([¿¡])\s+", r"\1", texto)
+    texto = re.sub(r",\s*(?:,\s*)+", ", ", texto)
+    texto = re.sub(r",\s*([.;:!?])", r"\1", texto)
+    texto = re.sub(r"(^|[.!?¿¡]\s*)[,;:]\s*", r"\1", texto)
+    texto = re.sub(r"¿\?|¡!", "", texto)
+    texto = re.sub(r"[ \t]{2,}", " ", texto).strip()
+    texto = re.sub(r"(^|[.!?]\s+)([a-záéíóúüñàèìòùâêîôûäöçãõ])", lambda m: m.group(1) + m.group(2).upper(), texto)
+    return texto.strip()
+
+
+def colapsar_repeticiones(texto: str) -> str:
+    """Reduce "el el proceso" o "la fase, la fase" a una sola aparición"""
+    for patron in _REPETICIONES:
+        texto = patron.sub(r"\1", texto)
+    return texto
+
+
+def quitar_muletillas(texto: str, idioma: str = "es") -> str:
+    siempre, entre_pausas = _PATRONES.get(idioma, _PATRONES["es"])
+    texto = siempre.sub(_reemplazo_sonido, texto)
+    # Se aplica dos veces por si al quitar una muletilla queda otra entre pausas
+    for _ in range(2):
+        texto = entre_pausas.sub(_reemplazo_pausa, texto)
+    return texto
+
+
+def limpiar_local(texto: str, idioma: str = "es") -> str:
+    """Limpieza determinista en milisegundos: muletillas, repeticiones y puntuación"""
+    texto = quitar_muletillas(texto, idioma)
+    texto = colapsar_repeticiones(texto)
+    return _ordenar_puntuacion(texto)
+
+
+def detectar_problemas(texto: str) -> List[str]:
+    """Heurísticas que sugieren errores de transcripción que solo un LLM puede corregir"""
+    motivos = []
+    minusculas = texto.lower()
+
+    if any(frase in minusculas for frase in ALUCINACIONES_WHISPER):
+        motivos.append("frase típica de alucinación de Whisper")
+
+    if MARCADORES_INAUDIBLE.search(texto):
+        motivos.append("fragmentos inaudibles")
+
+    # Bucles: una frase de 3+ palabras repetida 3 o más veces seguidas
+    if re.search(r"\b((?:\w+\W+){3,8}?)(?:\1){2,}", minusculas + " "):
+        motivos.append("frases repetidas en bucle")
+
+    palabras = re.findall(r"\w+", minusculas)
+    if palabras:
+        sueltas = [p for p in palabras if len(p) == 1 and p not in ("y", "o", "a", "e", "u", "i")]
+        if len(sueltas) / len(palabras) > 0.15:
+            motivos.append("muchas letras sueltas")
+
+    caracteres = [c for c in texto if not c.isspace()]
+    if caracteres:
+        raros = [c for c in caracteres if not (c.isalnum() or c in ".,;:!?¿¡…'\"-()%/+=°²³₂")]
+        if len(raros) / len(caracteres) > 0.05:
+            motivos.append("caracteres inusuales")
+
+    return motivos
+
+
+def _oraciones(texto: str, tamano: int) -> List[str]:
+    oraciones = []
+    for oracion in _PATRON_ORACIONES.split(texto.strip()):
+        # Sin puntuación Whisper puede dar una "oración" enorme: se corta en el último espacio
+        while len(oracion) > tamano:
+            corte = oracion.rfind(" ", 0, tamano)
+            corte = corte if corte > 0 else tamano
+            oraciones.append(oracion[:corte])
+            oracion = oracion[corte:].strip()
+        if oracion:
+            oraciones.append(oracion)
+    return oraciones
+
+
+def dividir_en_bloques(
+    texto: str,
+    tamano: int = TAMANO_BLOQUE,
+    contexto: int = ORACIONES_CONTEXTO
+) -> List[Dict[str, str]]:
+    """
+    Bloques de oraciones completas de hasta `tamano` caracteres: {"texto", "contexto"}.
+    El contexto son las últimas `contexto` oraciones del bloque anterior (el solape),
+    para que el LLM no corrija el inicio de un bloque sin saber qué venía antes
+    """
+    grupos: List[List[str]] = []
+    actual: List[str] = []
+    largo = 0
+    for oracion in _oraciones(texto, tamano):
+        if actual and largo + len(oracion) + 1 > tamano:
+            grupos.append(actual)
+            actual, largo = [], 0
+        actual.append(oracion)
+        largo += len(oracion) + 1
+    if actual:
+        grupos.append(actual)
+
+    return [
+        {"texto": " ".join(grupo), "contexto": " ".join(grupos[i - 1][-contexto:]) if i and contexto else ""}
+        for i, grupo in enumerate(grupos)
+    ]
+
+
+def unir_bloques(bloques: List[str]) -> str:
+    """Une los bloques limpios en orden; si el LLM repitió el contexto al inicio de un bloque, se quita"""
+    texto = ""
+    for bloque in bloques:
+        bloque = bloque.strip()
+        if texto:
+            bloque = quitar_solape_texto(texto, bloque)
+        texto = f"{texto} {bloque}".strip()
+    return texto
+
+
+def conserva_contenido(original: str, limpio: str, minima: float = PROPORCION_MINIMA) -> bool:
+    """La limpieza quita muletillas y repeticiones, no ideas: un texto mucho más corto perdió contenido"""
+    return len(limpio.strip()) >= minima * len(original.strip())
@@ -0,0 +1,199 @@
+"""
+Instrumentación del pipeline de evaluación
+Cada etapa (transcripción, limpieza, conceptos, análisis, calificación, feedback) registra
+latencia, tokens, proveedor, modelo, intentos y resultado, y los envía a sumideros intercambiables
+"""
+import json
+import time
+import logging
+import threading
+import contextvars
+import statistics
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESULTADOS_ETAPA = ("ok", "error", "cache")
+
+
+@dataclass
+class RegistroEtapa:
+    etapa: str
+    proveedor: str
+    modelo: str
+    inicio: float = field(default_factory=time.time)
+    duracion_s: float = 0.0
+    resultado: str = "ok"
+    tokens_prompt: int = 0
+    tokens_completion: int = 0
+    intentos: int = 1
+    duplicada: bool = False  # se lanzó también a otro proveedor (hedging o conmutación)
+    primer_campo_s: Optional[float] = None  # con streaming: segundos hasta el primer campo completo
+    error: Optional[str] = None
+
+    def a_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SumideroLog:
+    """Escribe cada etapa en el logger del módulo (nivel DEBUG, WARNING si falló)"""
+
+    def escribir(self, registro: RegistroEtapa):
+        nivel = logging.WARNING if registro.resultado == "error" else logging.DEBUG
+        logger.log(
+            nivel,
+            "%s [%s/%s] %s en %.2fs (tokens %d+%d, intentos %d)%s",
+            registro.etapa, registro.proveedor, registro.modelo, registro.resultado,
+            registro.duracion_s, registro.tokens_prompt, registro.tokens_completion, registro.intentos,
+            f": {registro.error}" if registro.error else ""
+        )
+
+
+class SumideroJSONL:
+    """Añade una línea JSON por etapa a un archivo"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+
+    def escribir(self, registro: RegistroEtapa):
+        linea = json.dumps(registro.a_dict(), ensure_ascii=False)
+        with self._lock:
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+
+
+class AgregadorMemoria:
+    """Acumula duraciones y tokens por etapa para resumir una sesión o un lote"""
+
+    def __init__(self, max_muestras: int = 1000):
+        self.max_muestras = max_muestras
+        self._etapas: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def escribir(self, registro: RegistroEtapa):
+        with self._lock:
+            datos = self._etapas.setdefault(registro.etapa, {
+                "llamadas": 0, "errores": 0, "cache": 0, "reintentos": 0, "duplicadas": 0,
+                "tokens_prompt": 0, "tokens_completion": 0, "duraciones": []
+            })
+            datos["llamadas"] += 1
+            datos["errores"] += registro.resultado == "error"
+            datos["cache"] += registro.resultado == "cache"
+            datos["reintentos"] += max(registro.intentos - 1, 0)
+            datos["duplicadas"] += registro.duplicada
+            datos["tokens_prompt"] += registro.tokens_prompt
+            datos["tokens_completion"] += registro.tokens_completion
+            datos["duraciones"].append(registro.duracion_s)
+            del datos["duraciones"][:-self.max_muestras]
+
+    def resumen(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            resumen = {}
+            for etapa, datos in self._etapas.items():
+                duraciones = sorted(datos["duraciones"])
+                resumen[etapa] = {
+                    **{k: v for k, v in datos.items() if k != "duraciones"},
+                    "duracion_media_s": round(statistics.mean(duraciones), 3),
+                    "duracion_p95_s": round(duraciones[min(len(duraciones) - 1, int(len(duraciones) * 0.95))], 3),
+                    "duracion_total_s": round(sum(duraciones), 3)
+                }
+            return resumen
+
+    def reiniciar(self):
+        with self._lock:
+            self._etapas.clear()
+
+
+class Recolector:
+    """Registros de una sola evaluación; se convierte en el bloque metricas_rendimiento"""
+
+    def __init__(self):
+        self.registros: List[RegistroEtapa] = []
+        self.inicio = time.perf_counter()
+        self.fin: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def agregar(self, registro: RegistroEtapa):
+        with self._lock:
+            self.registros.append(registro)
+
+    def resumen(self) -> Dict[str, Any]:
+        fin = self.fin if self.fin is not None else time.perf_counter()
+        with self._lock:
+            registros = list(self.registros)
+
+        por_etapa: Dict[str, Dict[str, Any]] = {}
+        for r in registros:
+            datos = por_etapa.setdefault(r.etapa, {"duracion_s": 0.0, "tokens_prompt": 0, "tokens_completion": 0, "llamadas": 0})
+            datos["duracion_s"] = round(datos["duracion_s"] + r.duracion_s, 3)
+            datos["tokens_prompt"] += r.tokens_prompt
+            datos["tokens_completion"] += r.tokens_completion
+            datos["llamadas"] += 1
+
+        return {
+            "duracion_total_s": round(fin - self.inicio, 3),
+            "tokens_prompt": sum(r.tokens_prompt for r in registros),
+            "tokens_completion": sum(r.tokens_completion for r in registros),
+            "reintentos": sum(max(r.intentos - 1, 0) for r in registros),
+            "errores": sum(r.resultado == "error" for r in registros),
+            "duplicadas": sum(r.duplicada for r in registros),
+            "por_etapa": por_etapa,
+            "etapas": [
+                {k: v for k, v in r.a_dict().items() if k != "inicio"}
+                for r in registros
+            ]
+        }
+
+
+# Recolectores activos en el contexto actual (hilo o tarea asyncio); se anidan
+_recolectores: contextvars.ContextVar[Tuple[Recolector, ...]] = contextvars.ContextVar("recolectores", default=())
+
+
+class Trazador:
+    """Mide etapas y reparte los registros entre los sumideros y los recolectores activos"""
+
+    def __init__(self, sumideros: Optional[List[Any]] = None):
+        self.sumideros = list(sumideros) if sumideros is not None else [SumideroLog()]
+
+    def agregar_sumidero(self, sumidero: Any):
+        self.sumideros.append(sumidero)
+
+    def registrar(self, registro: RegistroEtapa):
+        for recolector in _recolectores.get():
+            recolector.agregar(registro)
+        for sumidero in self.sumideros:
+            try:
+                sumidero.escribir(registro)
+            except Exception as e:
+                # Un sumidero roto no debe tumbar la evaluación
+                logger.error("Error en sumidero de métricas %s: %s", type(sumidero).__name__, e)
+
+    @contextmanager
+    def etapa(self, nombre: str, proveedor: str, modelo: str) -> Iterator[RegistroEtapa]:
+        """Mide el bloque; quien lo usa completa tokens, intentos o resultado en el registro"""
+        registro = RegistroEtapa(etapa=nombre, proveedor=proveedor, modelo=modelo)
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        except BaseException as e:
+            registro.resultado = "error"
+            registro.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            registro.duracion_s = round(time.perf_counter() - inicio, 4)
+            self.registrar(registro)
+
+    @contextmanager
+    def recolectar(self) -> Iterator[Recolector]:
+        """Agrupa los registros de las etapas ejecutadas dentro del bloque"""
+        recolector = Recolector()
+        token = _recolectores.set(_recolectores.get() + (recolector,))
+        try:
+            yield recolector
+        finally:
+            recolector.fin = time.perf_counter()
+            _recolectores.reset(token)
+
@@ -0,0 +1,288 @@
+"""
+Planificador de peticiones a los proveedores (Groq, Gemini, Whisper)
+Cubos de tokens por solicitudes y tokens por minuto, reintentos con espera exponencial
+con jitter y respeto de Retry-After. Las evaluaciones concurrentes hacen cola en lugar
+de lanzar todas las peticiones a la vez y recibir 429
+"""
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Callable, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_REINTENTABLES = {408, 409, 425, 429, 500, 502, 503, 504}
+# Errores de red y de tiempo de espera de los SDK, que no traen código HTTP
+ERRORES_RED = {
+    "APIConnectionError", "APITimeoutError", "ConnectError", "ConnectTimeout", "ReadTimeout",
+    "RemoteProtocolError", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",
+    "ResourceExhausted", "TooManyRequests"
+}
+
+
+@dataclass
+class LimitesProveedor:
+    rpm: int
+    tpm: int = 0  # 0: sin límite de tokens (p. ej. Whisper)
+
+
+def _entero_env(nombre: str, defecto: int) -> int:
+    try:
+        return int(os.getenv(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+def limites_por_defecto() -> Dict[str, LimitesProveedor]:
+    """Límites del plan gratuito; se ajustan con GROQ_RPM, GROQ_TPM, WHISPER_RPM, GOOGLE_RPM y GOOGLE_TPM"""
+    return {
+        "groq": LimitesProveedor(rpm=_entero_env("GROQ_RPM", 30), tpm=_entero_env("GROQ_TPM", 6000)),
+        "whisper": LimitesProveedor(rpm=_entero_env("WHISPER_RPM", 20)),
+        "google": LimitesProveedor(rpm=_entero_env("GOOGLE_RPM", 15), tpm=_entero_env("GOOGLE_TPM", 1000000)),
+    }
+
+
+class ErrorProveedor(Exception):
+    """El proveedor no respondió tras agotar los reintentos (o devolvió un error no reintentable)"""
+
+    def __init__(self, recurso: str, intentos: int, causa: Exception, estado: Optional[int] = None):
+        self.recurso = recurso
+        self.intentos = intentos
+        self.causa = causa
+        self.estado = estado
+        detalle = f"HTTP {estado}" if estado else type(causa).__name__
+        super().__init__(f"{recurso} falló tras {intentos} intento(s) ({detalle}): {causa}")
+
+
+class LlamadaCancelada(Exception):
+    """Quien pidió la llamada ya no necesita el resultado (p. ej. ganó otro proveedor)"""
+
+
+class CuboTokens:
+    """
+    Cubo de tokens con reserva: cada petición descuenta su costo aunque el saldo quede
+    negativo y recibe el tiempo que debe esperar. Así las peticiones salen en orden de llegada
+    y al ritmo que permite el proveedor
+    """
+
+    def __init__(self, capacidad: float, por_minuto: float):
+        self.capacidad = capacidad
+        self.por_segundo = por_minuto / 60.0
+        self.saldo = capacidad
+        self.actualizado = time.monotonic()
+        self.pausado_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def _reponer(self, ahora: float):
+        self.saldo = min(self.capacidad, self.saldo + (ahora - self.actualizado) * self.por_segundo)
+        self.actualizado = ahora
+
+    def reservar(self, cantidad: float) -> float:
+        """Descuenta `cantidad` y devuelve los segundos a esperar antes de usarla"""
+        with self._lock:
+            ahora = time.monotonic()
+            self._reponer(ahora)
+            self.saldo -= min(cantidad, self.capacidad)
+            espera = 0.0 if self.saldo >= 0 else -self.saldo / self.por_segundo
+            return max(espera, self.pausado_hasta - ahora)
+
+    def devolver(self, cantidad: float):
+        """Corrige una reserva estimada por exceso (o por defecto si `cantidad` es negativa)"""
+        with self._lock:
+            self._reponer(time.monotonic())
+            self.saldo = min(self.capacidad, self.saldo + cantidad)
+
+    def pausar(self, segundos: float):
+        """Nadie usa el cubo durante `segundos` (p. ej. tras un 429 con Retry-After)"""
+        with self._lock:
+            self.pausado_hasta = max(self.pausado_hasta, time.monotonic() + segundos)
+
+
+def estado_http(error: Exception) -> Optional[int]:
+    for atributo in ("status_code", "code", "status"):
+        valor = getattr(error, atributo, None)
+        if isinstance(valor, int):
+            return valor
+    respuesta = getattr(error, "response", None)
+    valor = getattr(respuesta, "status_code", None)
+    return valor if isinstance(valor, int) else None
+
+
+def es_reintentable(error: Exception) -> bool:
+    estado = estado_http(error)
+    if estado is not None:
+        return estado in ESTADOS_REINTENTABLES
+    return type(error).__name__ in ERRORES_RED or isinstance(error, (ConnectionError, TimeoutError))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Segundos indicados por el proveedor (cabecera Retry-After o texto "retry in Xs" de Gemini)"""
+    respuesta = getattr(error, "response", None)
+    cabeceras = getattr(respuesta, "headers", None) or {}
+    for nombre in ("retry-after-ms", "retry-after"):
+        valor = cabeceras.get(nombre) if hasattr(cabeceras, "get") else None
+        if not valor:
+            continue
+        try:
+            segundos = float(valor)
+            return segundos / 1000 if nombre == "retry-after-ms" else segundos
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+            except (TypeError, ValueError):
+                continue
+
+    coincidencia = re.search(r"retry in ([\d.]+)\s*s", str(error), re.IGNORECASE)
+    return float(coincidencia.group(1)) if coincidencia else None
+
+
+def estimar_tokens(*textos: str) -> int:
+    """Estimación rápida (~4 caracteres por token) para reservar antes de llamar"""
+    return sum(len(t) for t in textos if t) // 4 + 1
+
+
+class Planificador:
+    """Cola compartida por proveedor: limita el ritmo y reintenta los errores transitorios"""
+
+    def __init__(
+        self,
+        limites: Optional[Dict[str, LimitesProveedor]] = None,
+        max_intentos: int = 5,
+        espera_base: float = 1.0,
+        espera_maxima: float = 60.0
+    ):
+        self.limites = limites or limites_por_defecto()
+        self.max_intentos = max_intentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self._cubos_solicitudes: Dict[str, CuboTokens] = {}
+        self._cubos_tokens: Dict[str, CuboTokens] = {}
+        for recurso, limite in self.limites.items():
+            self._cubos_solicitudes[recurso] = CuboTokens(max(1, limite.rpm // 6), limite.rpm)
+            if limite.tpm:
+                self._cubos_tokens[recurso] = CuboTokens(limite.tpm, limite.tpm)
+
+    def _espera_turno(self, recurso: str, tokens: int) -> float:
+        espera = 0.0
+        if recurso in self._cubos_solicitudes:
+            espera = self._cubos_solicitudes[recurso].reservar(1)
+        if tokens and recurso in self._cubos_tokens:
+            espera = max(espera, self._cubos_tokens[recurso].reservar(tokens))
+        return espera
+
+    def _espera_reintento(self, recurso: str, error: Exception, intento: int) -> float:
+        indicada = retry_after(error)
+        if indicada is not None:
+            # El proveedor pide pausa: se aplica a todas las peticiones del recurso, no solo a esta
+            if recurso in self._cubos_solicitudes:
+                self._cubos_solicitudes[recurso].pausar(indicada)
+            return min(indicada, self.espera_maxima)
+        # Full jitter: evita que los reintentos de varias evaluaciones coincidan
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** (intento - 1)))
+
+    def _fallo(self, recurso: str, error: Exception, intento: int) -> Optional[float]:
+        """Segundos a esperar antes de reintentar, o None si hay que abandonar"""
+        if not es_reintentable(error) or intento >= self.max_intentos:
+            return None
+        espera = self._espera_reintento(recurso, error, intento)
+        logger.warning(f"{recurso}: {type(error).__name__} (intento {intento}/{self.max_intentos}), reintentando en {espera:.1f}s")
+        return espera
+
+    def _devolver_turno(self, recurso: str, tokens: int, solicitud: bool = False):
+        """Libera la reserva de un intento que no llegó a consumirla (falló, se canceló o se reintenta)"""
+        if tokens and recurso in self._cubos_tokens:
+            self._cubos_tokens[recurso].devolver(tokens)
+        if solicitud and recurso in self._cubos_solicitudes:
+            self._cubos_solicitudes[recurso].devolver(1)
+
+    def corregir_tokens(self, recurso: str, estimados: int, reales: int):
+        """Ajusta el cubo de tokens con el consumo que informó el proveedor"""
+        if reales and recurso in self._cubos_tokens:
+            self._cubos_tokens[recurso].devolver(estimados - reales)
+
+    def ejecutar(
+        self,
+        recurso: str,
+        funcion: Callable[[], Any],
+        tokens: int = 0,
+        registro: Any = None,
+        cancelar: Optional[threading.Event] = None,
+        al_enviar: Optional[Callable[[], None]] = None
+    ) -> Any:
+        """`al_enviar` se llama justo antes de cada intento, tras la espera de turno (p. ej. para medir latencia)"""
+        cancelar = cancelar or threading.Event()
+        for intento in range(1, self.max_intentos + 1):
+            if registro is not None:
+                registro.intentos = intento
+            espera = self._espera_turno(recurso, tokens)
+            if espera > 0:
+                cancelar.wait(espera)
+            if cancelar.is_set():
+                self._devolver_turno(recurso, tokens, solicitud=True)
+                raise LlamadaCancelada(recurso)
+            if al_enviar is not None:
+                al_enviar()
+            try:
+                return funcion()
+            except LlamadaCancelada:
+                # Cancelación de quien pidió la llamada (p. ej. un stream cortado al ganar otro proveedor)
+                self._devolver_turno(recurso, tokens)
+                raise
+            except Exception as e:
+                # Cada intento reserva de nuevo: la reserva del fallido vuelve al cubo, se reintente o no
+                self._devolver_turno(recurso, tokens)
+                espera = self._fallo(recurso, e, intento)
+                if espera is None:
+                    raise ErrorProveedor(recurso, intento, e, estado_http(e)) from e
+                cancelar.wait(espera)
+
+    async def aejecutar(
+        self,
+        recurso: str,
+        funcion: Callable[[], Awaitable[Any]],
+        tokens: int = 0,
+        registro: Any = None,
+        al_enviar: Optional[Callable[[], None]] = None
+    ) -> Any:
+        for intento in range(1, self.max_intentos + 1):
+            if registro is not None:
+                registro.intentos = intento
+            espera = self._espera_turno(recurso, tokens)
+            try:
+                if espera > 0:
+                    await asyncio.sleep(espera)
+            except asyncio.CancelledError:
+                self._devolver_turno(recurso, tokens, solicitud=True)
+                raise
+            if al_enviar is not None:
+                al_enviar()
+            try:
+                return await funcion()
+            except asyncio.CancelledError:
+                self._devolver_turno(recurso, tokens)
+                raise
+            except Exception as e:
+                self._devolver_turno(recurso, tokens)
+                espera = self._fallo(recurso, e, intento)
+                if espera is None:
+                    raise ErrorProveedor(recurso, intento, e, estado_http(e)) from e
+                await asyncio.sleep(espera)
+
+
+_planificador_compartido: Optional[Planificador] = None
+_lock_compartido = threading.Lock()
+
+
+def planificador_compartido() -> Planificador:
+    """Planificador único del proceso: todos los evaluadores comparten los límites del proveedor"""
+    global _planificador_compartido
+    with _lock_compartido:
+        if _planificador_compartido is None:
+            _planificador_compartido = Planificador()
+        return _planificador_compartido
@@ -0,0 +1,75 @@
+"""
+Pool de evaluadores del proceso
+Un EvaluadorEngine por proveedor y credenciales, compartido entre reruns y sesiones de
+Streamlit (y entre peticiones del servidor), con sus clientes HTTP y conexiones abiertas
+"""
+import os
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from engine import EvaluadorEngine
+
+logger = logging.getLogger(__name__)
+
+_evaluadores: Dict[Tuple[str, str, str, str], EvaluadorEngine] = {}
+_lock = threading.Lock()
+
+
+def _huella(valor: Optional[str]) -> str:
+    # Las claves de API no se guardan en claro como clave del diccionario
+    return hashlib.sha256(valor.encode("utf-8")).hexdigest()[:16] if valor else ""
+
+
+def obtener_evaluador(
+    api_key: Optional[str] = None,
+    proveedor: str = "groq",
+    google_api_key: Optional[str] = None,
+    calentar: bool = True,
+    transcriptor: str = "groq"
+) -> EvaluadorEngine:
+    """
+    Devuelve el evaluador compartido para estas credenciales, creándolo la primera vez.
+    Al crearlo se precalientan las conexiones en segundo plano
+    """
+    proveedor = proveedor.lower()
+    api_key = api_key or os.getenv("GROQ_API_KEY")
+    if proveedor in ("google", "multi"):
+        google_api_key = google_api_key or os.getenv("GOOGLE_API_KEY")
+    else:
+        google_api_key = None
+
+    clave = (proveedor, transcriptor, _huella(api_key), _huella(google_api_key))
+    with _lock:
+        evaluador = _evaluadores.get(clave)
+        if evaluador is not None:
+            return evaluador
+        # La clave de Gemini es global al proceso (genai.configure): un segundo evaluador con otra
+        # clave cambiaría la de los que ya están en el pool y les cobraría a otra cuenta
+        claves_google = {c[3] for c in _evaluadores if c[3]}
+        if clave[3] and claves_google and clave[3] not in claves_google:
+            raise ValueError(
+                "El pool ya tiene un evaluador de Gemini con otra GOOGLE_API_KEY; "
+                "solo se admite una por proceso (vacía el pool con vaciar_pool() para cambiarla)"
+            )
+
+        evaluador = EvaluadorEngine(
+            api_key=api_key, proveedor=proveedor, google_api_key=google_api_key, transcriptor=transcriptor
+        )
+        _evaluadores[clave] = evaluador
+        logger.debug(f"Nuevo evaluador en el pool ({proveedor}, transcripción {transcriptor}); total: {len(_evaluadores)}")
+
+    if calentar:
+        threading.Thread(target=evaluador.calentar, name="calentar-evaluador", daemon=True).start()
+    return evaluador
+
+
+def vaciar_pool() -> int:
+    """Cierra y descarta todos los evaluadores (p. ej. al rotar claves); devuelve cuántos había"""
+    with _lock:
+        evaluadores = list(_evaluadores.values())
+        _evaluadores.clear()
+    for evaluador in evaluadores:
+        evaluador.cerrar()
+    return len(evaluadores)
@@ -0,0 +1,174 @@
+"""
+Exámenes orales de varias preguntas
+Divide la transcripción en respuestas (marcadores como "segunda pregunta" o pausas largas entre
+segmentos de Whisper) y asigna cada respuesta a su ítem de la rúbrica, para que cada pregunta
+se analice y califique con un prompt propio y en paralelo
+"""
+import re
+import unicodedata
+from typing import Dict, Any, List, Optional
+
+from recuperacion import IndiceBM25
+from rubrica import parsear_rubrica
+
+# Silencio entre segmentos de Whisper que se toma como cambio de pregunta
+PAUSA_PREGUNTA_S = 4.0
+# Un corte que deja una respuesta más corta que esto se descarta (una pausa dentro de una frase)
+MIN_CARACTERES_RESPUESTA = 40
+# Palabras del inicio de un segmento que se buscan en el texto para ubicar el corte
+PALABRAS_ANCLA = 3
+
+_NUMEROS = {
+    "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6, "siete": 7, "ocho": 8, "nueve": 9, "diez": 10,
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "primera": 1, "segunda": 2, "tercera": 3, "cuarta": 4, "quinta": 5, "sexta": 6, "septima": 7, "octava": 8,
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6
+}
+_PATRON_MARCADOR = re.compile(
+    r"\b(?:(?:pregunta|ejercicio|question)\s+(?:n[uú]mero\s+|number\s+)?(?P<numero>\d+|[a-z]+)"
+    r"|(?P<ordinal>[a-zéáíú]+)\s+(?=pregunta\b|question\b))",
+    re.IGNORECASE
+)
+_ORDINALES_SIN_NUMERO = {"siguiente", "otra", "ultima", "next", "last", "another"}
+_PATRON_INICIO_ORACION = re.compile(r"[.!?¿¡\n]")
+
+
+def _normalizar(palabra: str) -> str:
+    palabra = unicodedata.normalize("NFKD", palabra.lower())
+    return re.sub(r"[^\w]", "", "".join(c for c in palabra if not unicodedata.combining(c)))
+
+
+def items_rubrica(rubrica: str) -> List[Dict[str, Any]]:
+    """
+    Criterios de primer nivel de la rúbrica (ver rubrica.parsear_rubrica), uno por pregunta.
+    Cada ítem: {"numero", "texto", "puntos"}; "puntos" es None si el ítem no los indica
+    """
+    return [
+        {"numero": i, "texto": criterio.texto_completo(), "puntos": criterio.maximo or None}
+        for i, criterio in enumerate(parsear_rubrica(rubrica).criterios, 1)
+    ]
+
+
+def _numero_marcador(coincidencia: "re.Match") -> Optional[int]:
+    valor = _normalizar(coincidencia.group("numero") or coincidencia.group("ordinal") or "")
+    if valor.isdigit():
+        return int(valor)
+    return _NUMEROS.get(valor)
+
+
+def _es_marcador(coincidencia: "re.Match") -> bool:
+    valor = _normalizar(coincidencia.group("numero") or coincidencia.group("ordinal") or "")
+    return valor.isdigit() or valor in _NUMEROS or valor in _ORDINALES_SIN_NUMERO
+
+
+def _cortes_por_marcadores(texto: str) -> Dict[int, Optional[int]]:
+    """Posición de inicio de la oración de cada marcador -> número de pregunta (si lo dice)"""
+    cortes: Dict[int, Optional[int]] = {}
+    for coincidencia in _PATRON_MARCADOR.finditer(texto):
+        if not _es_marcador(coincidencia):
+            continue
+        anteriores = list(_PATRON_INICIO_ORACION.finditer(texto, 0, coincidencia.start()))
+        inicio = anteriores[-1].end() if anteriores else 0
+        # "¿" abre la pregunta del examinador: el corte va antes del signo
+        if anteriores and anteriores[-1].group() in "¿¡":
+            inicio = anteriores[-1].start()
+        cortes.setdefault(inicio, _numero_marcador(coincidencia))
+    return cortes
+
+
+def _cortes_por_pausas(texto: str, segmentos: List[Dict[str, Any]], pausa_s: float) -> List[int]:
+    """Ubica en el texto el inicio de cada segmento que sigue a una pausa larga"""
+    palabras = [(m.start(), _normalizar(m.group())) for m in re.finditer(r"\S+", texto)]
+    normalizadas = [p for _, p in palabras]
+    cortes = []
+    posicion = 0
+    for anterior, segmento in zip(segmentos, segmentos[1:]):
+        if segmento["inicio"] - anterior["fin"] < pausa_s:
+            continue
+        ancla = [p for p in (_normalizar(w) for w in segmento["texto"].split()) if p][:PALABRAS_ANCLA]
+        if not ancla:
+            continue
+        for i in range(posicion, len(normalizadas) - len(ancla) + 1):
+            if normalizadas[i:i + len(ancla)] == ancla:
+                cortes.append(palabras[i][0])
+                posicion = i + len(ancla)
+                break
+    return cortes
+
+
+def dividir_respuestas(
+    texto: str,
+    segmentos: Optional[List[Dict[str, Any]]] = None,
+    pausa_s: float = PAUSA_PREGUNTA_S
+) -> List[Dict[str, Any]]:
+    """
+    Respuestas en el orden del examen: [{"texto", "numero"}], con "numero" si un marcador
+    dice qué pregunta empieza ("pregunta 3", "segunda pregunta")
+    """
+    cortes = _cortes_por_marcadores(texto)
+    for corte in _cortes_por_pausas(texto, segmentos or [], pausa_s):
+        cortes.setdefault(corte, None)
+
+    respuestas: List[Dict[str, Any]] = []
+    limites = sorted(set(cortes) | {0})
+    for inicio, fin in zip(limites, limites[1:] + [len(texto)]):
+        fragmento = texto[inicio:fin].strip()
+        if not fragmento:
+            continue
+        if respuestas and len(fragmento) < MIN_CARACTERES_RESPUESTA:
+            respuestas[-1]["texto"] = f"{respuestas[-1]['texto']} {fragmento}"
+            continue
+        if respuestas and len(respuestas[-1]["texto"]) < MIN_CARACTERES_RESPUESTA and respuestas[-1]["numero"] is None:
+            respuestas[-1] = {"texto": f"{respuestas[-1]['texto']} {fragmento}", "numero": cortes.get(inicio)}
+            continue
+        respuestas.append({"texto": fragmento, "numero": cortes.get(inicio)})
+    return respuestas
+
+
+def asignar_respuestas(
+    respuestas: List[Dict[str, Any]],
+    items: List[Dict[str, Any]],
+    idioma: str = "es"
+) -> List[Dict[str, Any]]:
+    """
+    Una entrada por ítem de la rúbrica: {"numero", "criterio", "puntos", "respuesta"}.
+    Orden de preferencia: el número que dijo el examinador, la posición si hay tantas respuestas
+    como ítems y, si no, el ítem más parecido (BM25); las respuestas sin ítem claro van con la anterior
+    """
+    asignadas: List[List[str]] = [[] for _ in items]
+    posicional = len(respuestas) == len(items)
+    numeradas = {r["numero"] - 1 for r in respuestas if r.get("numero") is not None and 1 <= r["numero"] <= len(items)}
+    indice = IndiceBM25([item["texto"] for item in items], idioma)
+    ultimo = 0
+    for i, respuesta in enumerate(respuestas):
+        numero = respuesta.get("numero")
+        if numero is not None and 1 <= numero <= len(items):
+            destino = numero - 1
+        elif posicional and i not in numeradas:
+            destino = i
+        else:
+            puntajes = indice.puntajes(respuesta["texto"])
+            mejor = max(range(len(items)), key=lambda j: puntajes[j])
+            destino = mejor if puntajes[mejor] > 0 else ultimo
+        asignadas[destino].append(respuesta["texto"])
+        ultimo = destino
+    return [
+        {"numero": item["numero"], "criterio": item["texto"], "puntos": item["puntos"], "respuesta": " ".join(textos)}
+        for item, textos in zip(items, asignadas)
+    ]
+
+
+def preguntas_del_examen(
+    texto: str,
+    rubrica: str,
+    segmentos: Optional[List[Dict[str, Any]]] = None,
+    idioma: str = "es"
+) -> List[Dict[str, Any]]:
+    """Preguntas con su respuesta; vacío si la rúbrica o la transcripción no se dejan dividir"""
+    items = items_rubrica(rubrica)
+    if len(items) < 2:
+        return []
+    respuestas = dividir_respuestas(texto, segmentos)
+    if len(respuestas) < 2:
+        return []
+    return asignar_respuestas(respuestas, items, idioma)
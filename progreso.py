@@ -0,0 +1,40 @@
+"""
+Eventos de progreso del pipeline de evaluación
+proceso_completo los emite a medida que termina cada etapa, con el resultado de esa etapa
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any
+
+# Etapas en orden; "completado" y "error" cierran el flujo de eventos
+ETAPAS_PROGRESO = ("transcripcion", "limpieza", "conceptos", "analisis", "calificacion", "feedback")
+ETAPAS_FINALES = ("completado", "error")
+# Campo suelto de una etapa aún en curso (respuesta transmitida): datos = {"etapa", "ruta", "valor"}
+ETAPA_PARCIAL = "parcial"
+
+
+class ProcesoCancelado(Exception):
+    """Quien recibía los eventos dejó de escucharlos: el pipeline se corta al terminar la etapa en curso"""
+
+
+@dataclass
+class EventoProgreso:
+    etapa: str
+    datos: Dict[str, Any]
+    instante: float = field(default_factory=time.time)
+
+    @property
+    def paso(self) -> int:
+        """Número de la etapa (1..6); las etapas finales cuentan como la última"""
+        etapa = self.datos.get("etapa") if self.etapa == ETAPA_PARCIAL else self.etapa
+        if etapa in ETAPAS_PROGRESO:
+            return ETAPAS_PROGRESO.index(etapa) + 1
+        return len(ETAPAS_PROGRESO)
+
+    @property
+    def total_pasos(self) -> int:
+        return len(ETAPAS_PROGRESO)
+
+    @property
+    def final(self) -> bool:
+        return self.etapa in ETAPAS_FINALES
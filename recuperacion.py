@@ -0,0 +1,125 @@
+"""
+Recuperación local sobre el material de referencia
+Divide el material en fragmentos y los indexa con BM25 (raíces de indice_conceptos), una vez
+por material. Los prompts de análisis y calificación llevan solo los fragmentos relevantes
+para la respuesta del alumno y la rúbrica, con un presupuesto fijo de caracteres
+"""
+import re
+import math
+from collections import Counter
+from functools import lru_cache
+from typing import List, Tuple
+
+from indice_conceptos import raices
+
+TAMANO_FRAGMENTO = 800
+MAX_FRAGMENTOS = 4
+MAX_CARACTERES = 3200
+
+_PATRON_PARRAFOS = re.compile(r"\n\s*\n")
+_PATRON_ORACIONES = re.compile(r"(?<=[.!?;:])\s+")
+
+
+def dividir_material(texto: str, tamano: int = TAMANO_FRAGMENTO) -> List[str]:
+    """
+    Fragmentos de hasta `tamano` caracteres que respetan párrafos y, si un párrafo es
+    más largo, oraciones. Los párrafos cortos consecutivos se agrupan
+    """
+    piezas: List[str] = []
+    for parrafo in _PATRON_PARRAFOS.split(texto):
+        parrafo = " ".join(parrafo.split())
+        if not parrafo:
+            continue
+        if len(parrafo) <= tamano:
+            piezas.append(parrafo)
+            continue
+        piezas.extend(o for o in _PATRON_ORACIONES.split(parrafo) if o)
+
+    fragmentos: List[str] = []
+    actual = ""
+    for pieza in piezas:
+        if actual and len(actual) + len(pieza) + 1 > tamano:
+            fragmentos.append(actual)
+            actual = ""
+        # Una oración más larga que el fragmento se corta en trozos fijos
+        while len(pieza) > tamano:
+            fragmentos.append(pieza[:tamano])
+            pieza = pieza[tamano:]
+        actual = f"{actual} {pieza}".strip()
+    if actual:
+        fragmentos.append(actual)
+    return fragmentos
+
+
+class IndiceBM25:
+    """Índice BM25 en memoria sobre las raíces de cada fragmento"""
+
+    def __init__(self, fragmentos: List[str], idioma: str = "es", k1: float = 1.5, b: float = 0.75):
+        self.fragmentos = fragmentos
+        self.idioma = idioma
+        self.k1 = k1
+        self.b = b
+        self.frecuencias = [Counter(raices(f, self.idioma)) for f in fragmentos]
+        self.longitudes = [sum(f.values()) for f in self.frecuencias]
+        self.longitud_media = (sum(self.longitudes) / len(self.longitudes)) if self.longitudes else 0.0
+        documentos = Counter()
+        for frecuencia in self.frecuencias:
+            documentos.update(frecuencia.keys())
+        total = len(fragmentos)
+        self.idf = {
+            termino: math.log(1 + (total - n + 0.5) / (n + 0.5))
+            for termino, n in documentos.items()
+        }
+
+    def puntajes(self, consulta: str) -> List[float]:
+        terminos = set(raices(consulta, self.idioma)) & self.idf.keys()
+        resultado = []
+        for frecuencia, longitud in zip(self.frecuencias, self.longitudes):
+            normalizacion = self.k1 * (1 - self.b + self.b * longitud / (self.longitud_media or 1))
+            puntaje = 0.0
+            for termino in terminos:
+                tf = frecuencia.get(termino, 0)
+                if tf:
+                    puntaje += self.idf[termino] * tf * (self.k1 + 1) / (tf + normalizacion)
+            resultado.append(puntaje)
+        return resultado
+
+    def buscar(self, consulta: str, k: int = MAX_FRAGMENTOS) -> List[Tuple[int, float]]:
+        """Los k fragmentos con mayor puntaje (índice, puntaje), descartando los que no comparten términos"""
+        puntajes = self.puntajes(consulta)
+        orden = sorted(range(len(puntajes)), key=lambda i: -puntajes[i])
+        return [(i, puntajes[i]) for i in orden[:k] if puntajes[i] > 0]
+
+
+@lru_cache(maxsize=32)
+def indice_material(material: str, idioma: str = "es", tamano: int = TAMANO_FRAGMENTO) -> IndiceBM25:
+    """El índice se construye una sola vez por material (los alumnos de un examen lo comparten)"""
+    return IndiceBM25(dividir_material(material, tamano), idioma)
+
+
+def fragmentos_relevantes(
+    material: str,
+    consulta: str,
+    idioma: str = "es",
+    k: int = MAX_FRAGMENTOS,
+    max_caracteres: int = MAX_CARACTERES
+) -> List[str]:
+    """
+    Fragmentos del material más relevantes para la consulta, en su orden original y sin
+    pasar de `max_caracteres`. Si el material entero cabe, se devuelve completo
+    """
+    if not material.strip():
+        return []
+    indice = indice_material(material, idioma)
+    if sum(len(f) for f in indice.fragmentos) <= max_caracteres:
+        return list(indice.fragmentos)
+
+    elegidos: List[int] = []
+    usados = 0
+    for posicion, _ in indice.buscar(consulta, k):
+        largo = len(indice.fragmentos[posicion])
+        if usados + largo > max_caracteres:
+            continue
+        elegidos.append(posicion)
+        usados += largo
+    return [indice.fragmentos[i] for i in sorted(elegidos)]
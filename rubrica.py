@@ -0,0 +1,308 @@
+"""
+Rúbrica estructurada
+Convierte el texto de la rúbrica ("2. Fase luminosa (3 pts) – Ubicación (1 pt)") en un árbol de
+criterios con puntos, más las reglas de penalización y bonificación. El LLM solo valora cada
+criterio hoja; la nota final, las penalizaciones y las bonificaciones se suman aquí
+"""
+import re
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+_NUMERO = r"(\d+(?:[.,]\d+)?)"
+# "(3 pts)", "(1 punto)", "(2)", "3 puntos", "- 2 pts"
+_PATRON_PUNTOS = re.compile(
+    rf"\(\s*{_NUMERO}\s*(?:puntos?|pts?\.?|points?)?\s*\)|(?<![\w.,]){_NUMERO}\s*(?:puntos?|pts?\.?|points?)\b",
+    re.IGNORECASE
+)
+_PATRON_ITEM = re.compile(
+    r"^(?P<sangria>\s*)(?P<marca>(?:pregunta|criterio|ejercicio|question)\s+\d+\s*[:.)-]|\d+(?:\.\d+)*[.)]?|[a-zA-Z][.)]|[-•*·–—])"
+    r"\s+(?P<texto>\S.*)$",
+    re.IGNORECASE
+)
+_PATRON_TOTAL = re.compile(rf"^\s*total\b[^\d]*{_NUMERO}", re.IGNORECASE)
+# "sobre 10 puntos", "de 20 puntos": escala de la nota, no un criterio
+_PATRON_ESCALA = re.compile(rf"\b(?:sobre|de|del|hasta)\s+{_NUMERO}\s*(?:puntos?|pts?\.?|points?)\b", re.IGNORECASE)
+# Una línea de prosa con un solo puntaje cuenta como criterio solo si es corta ("Claridad: 2 puntos")
+MAX_CARACTERES_CRITERIO_PROSA = 100
+# Diferencia tolerada entre el total que declara la rúbrica y la suma de sus criterios
+TOLERANCIA_TOTAL = 0.01
+# Una regla se reconoce por el signo pegado al número ("-0.5", "+1") o por una palabra inequívoca;
+# "Resta correcta (2 pts)" o "Extra: ..." son criterios
+_PATRON_PENALIZACION = re.compile(
+    rf"^(?:[-−–]{_NUMERO}|−\s+{_NUMERO}|(?:penaliza\w*|penalizaci[oó]n|se\s+restan?)\b)",
+    re.IGNORECASE
+)
+_PATRON_BONIFICACION = re.compile(rf"^(?:\+\s?{_NUMERO}|(?:bonifica\w*|bonificaci[oó]n|bonus|se\s+suman?)\b)", re.IGNORECASE)
+# Encabezado de una sección de reglas ("Penalizaciones:", "### Bonificaciones"); sus líneas con número son reglas
+_PATRON_SECCION_AJUSTES = re.compile(
+    r"^(?:(?P<penalizacion>penalizaci[oó]n(?:es)?|penalidades|descuentos)|"
+    r"(?P<bonificacion>bonificaci[oó]n(?:es)?|bonus|puntos?\s+(?:extras?|adicionales)))\b[^\d]*$",
+    re.IGNORECASE
+)
+# Formato markdown que no forma parte del texto: "## Rúbrica", "**Total: 10 puntos**", "_Claridad_"
+_PATRON_ENCABEZADO = re.compile(r"^(\s*)#{1,6}\s+")
+_PATRON_ENFASIS = re.compile(r"(?<![\w*])(\*{1,3}|_{1,3})(?=\S)(.+?)(?<=\S)\1(?![\w*])")
+# Varios criterios con puntos en una sola línea: "Fase luminosa (3 pts) – Ubicación (1 pt)"
+_PATRON_SEPARADOR = re.compile(r"\s+[–—-]\s+|\s*;\s*|,\s+(?=[^\d])")
+
+
+def _numero(texto: str) -> float:
+    return float(texto.replace(",", "."))
+
+
+def _puntos(texto: str) -> Tuple[Optional[float], str]:
+    """Puntos del texto y el texto sin la anotación; una anotación con unidad manda sobre "(1789)" """
+    coincidencias = list(_PATRON_PUNTOS.finditer(texto))
+    if not coincidencias:
+        return None, texto.strip(" :.-–—")
+    coincidencia = next((c for c in coincidencias if re.search(r"[a-z]", c.group(), re.IGNORECASE)), coincidencias[0])
+    valor = _numero(coincidencia.group(1) or coincidencia.group(2))
+    limpio = (texto[:coincidencia.start()] + texto[coincidencia.end():]).strip(" :.-–—,")
+    return valor, re.sub(r"\s{2,}", " ", limpio)
+
+
+def _sin_markdown(linea: str) -> str:
+    """La línea sin encabezados ni énfasis markdown; conserva la sangría y las viñetas"""
+    linea = _PATRON_ENCABEZADO.sub(r"\1", linea)
+    return _PATRON_ENFASIS.sub(r"\2", linea)
+
+
+@dataclass
+class Criterio:
+    texto: str
+    puntos: Optional[float] = None
+    id: str = ""
+    hijos: List["Criterio"] = field(default_factory=list)
+
+    @property
+    def maximo(self) -> float:
+        if self.puntos is not None:
+            return self.puntos
+        return sum(h.maximo for h in self.hijos)
+
+    def hojas(self, ruta: str = "") -> List[Tuple["Criterio", str]]:
+        """(criterio, ruta legible) de cada hoja; la ruta antepone los criterios padre"""
+        ruta = f"{ruta} › {self.texto}" if ruta else self.texto
+        if not self.hijos:
+            return [(self, ruta)]
+        return [hoja for hijo in self.hijos for hoja in hijo.hojas(ruta)]
+
+    def texto_completo(self) -> str:
+        if not self.hijos:
+            return self.texto
+        return f"{self.texto}: " + "; ".join(h.texto_completo() for h in self.hijos)
+
+
+@dataclass
+class ReglaAjuste:
+    """Penalización o bonificación de la rúbrica; `puntos` por cada vez que se aplica"""
+    id: str
+    texto: str
+    puntos: float
+
+
+@dataclass
+class Rubrica:
+    criterios: List[Criterio] = field(default_factory=list)
+    penalizaciones: List[ReglaAjuste] = field(default_factory=list)
+    bonificaciones: List[ReglaAjuste] = field(default_factory=list)
+    total_declarado: Optional[float] = None
+
+    def hojas(self) -> List[Tuple[Criterio, str]]:
+        return [hoja for criterio in self.criterios for hoja in criterio.hojas()]
+
+    @property
+    def total(self) -> float:
+        return sum(c.maximo for c in self.criterios)
+
+    @property
+    def calificable(self) -> bool:
+        """
+        La nota se puede sumar localmente: al menos dos hojas, todas con puntos y, si la rúbrica
+        declara un total, que coincida con la suma de los criterios (si no, el árbol está mal leído)
+        """
+        hojas = self.hojas()
+        if len(hojas) < 2 or not all(h.puntos for h, _ in hojas):
+            return False
+        return self.total_declarado is None or abs(self.total_declarado - self.total) <= TOLERANCIA_TOTAL
+
+    def reglas(self) -> Dict[str, ReglaAjuste]:
+        return {r.id: r for r in [*self.penalizaciones, *self.bonificaciones]}
+
+
+def _partes_con_puntos(texto: str) -> List[Tuple[str, float]]:
+    """Criterios de una línea con varios puntajes; vacío si la línea tiene uno o ninguno"""
+    partes = []
+    for parte in _PATRON_SEPARADOR.split(texto):
+        puntos, limpio = _puntos(parte)
+        if puntos is not None and limpio:
+            partes.append((limpio, puntos))
+    return partes if len(partes) >= 2 else []
+
+
+def _criterio_de_linea(texto: str) -> Criterio:
+    partes = _partes_con_puntos(texto)
+    if partes:
+        # "Fases: luminosa (3 pts) – oscura (3 pts)": el título antes de los dos puntos agrupa las partes
+        titulo = texto.split(":", 1)[0].strip() if ":" in texto.split("(", 1)[0] else " / ".join(p for p, _ in partes)
+        if ":" in titulo or titulo == texto:
+            titulo = " / ".join(p for p, _ in partes)
+        primera = partes[0][0]
+        if ":" in primera:
+            partes[0] = (primera.split(":", 1)[1].strip(), partes[0][1])
+        return Criterio(titulo, hijos=[Criterio(p, puntos) for p, puntos in partes])
+    puntos, limpio = _puntos(texto)
+    return Criterio(limpio, puntos)
+
+
+def _tipo_marca(marca: str) -> Tuple[str, int]:
+    if not marca[0].isdigit() and marca[-1] in ":.)-" and any(c.isdigit() for c in marca):
+        return "numero", 1
+    if marca[0].isdigit():
+        return "numero", marca.rstrip(".)").count(".") + 1
+    if marca[0].isalpha():
+        return "letra", 0
+    return "vineta", 0
+
+
+def _asignar_ids(criterios: List[Criterio], prefijo: str = ""):
+    for i, criterio in enumerate(criterios, 1):
+        criterio.id = f"{prefijo}{i}"
+        _asignar_ids(criterio.hijos, f"{criterio.id}.")
+
+
+def _repartir(criterio: Criterio):
+    """Los hijos sin puntos de un criterio con puntos se reparten lo que falta a partes iguales"""
+    for hijo in criterio.hijos:
+        _repartir(hijo)
+    sin_puntos = [h for h in criterio.hijos if h.puntos is None and not h.hijos]
+    if criterio.puntos is not None and sin_puntos:
+        restante = criterio.puntos - sum(h.maximo for h in criterio.hijos if h not in sin_puntos)
+        if restante > 0:
+            for hijo in sin_puntos:
+                hijo.puntos = round(restante / len(sin_puntos), 2)
+
+
+def _signo_regla(contenido: str, seccion: Optional[str]) -> Optional[str]:
+    """"P" o "B" si la línea es una penalización o una bonificación; None si es un criterio"""
+    if _PATRON_PENALIZACION.match(contenido):
+        return "P"
+    if _PATRON_BONIFICACION.match(contenido):
+        return "B"
+    if seccion is not None and re.search(r"\d", contenido):
+        return seccion
+    return None
+
+
+@lru_cache(maxsize=64)
+def parsear_rubrica(texto: str) -> Rubrica:
+    """
+    Árbol de criterios de la rúbrica. El anidamiento sale de la sangría y de las marcas
+    ("2." > "2.1" > "a)" > "-"); las líneas de prosa sin puntos son instrucciones y se ignoran.
+    El resultado se comparte entre llamadas (caché): no modificarlo
+    """
+    rubrica = Rubrica()
+    # Pila de (sangría, tipo de marca, criterio) de los ítems abiertos
+    pila: List[Tuple[int, Tuple[str, int], Criterio]] = []
+    # "P" o "B" dentro de una sección "Penalizaciones:" / "Bonificaciones:"
+    seccion: Optional[str] = None
+
+    for linea in texto.splitlines():
+        if _PATRON_ENCABEZADO.match(linea):
+            # Un encabezado markdown cierra los ítems y la sección de reglas abiertos
+            pila.clear()
+            seccion = None
+        linea = _sin_markdown(linea)
+        if not linea.strip():
+            continue
+        total = _PATRON_TOTAL.match(linea)
+        if total:
+            rubrica.total_declarado = _numero(total.group(1))
+            continue
+        item = _PATRON_ITEM.match(linea)
+        contenido = item.group("texto").strip() if item else linea.strip()
+        encabezado = _PATRON_SECCION_AJUSTES.match(contenido)
+        if encabezado:
+            seccion = "P" if encabezado.group("penalizacion") else "B"
+            pila.clear()
+            continue
+        if item is None and not re.search(r"\d", contenido):
+            # Un título o una instrucción sin números cierra la sección de reglas
+            seccion = None
+
+        if item is not None:
+            sangria = len(item.group("sangria").expandtabs(4))
+            tipo = _tipo_marca(item.group("marca"))
+            while pila:
+                sangria_abierta = pila[-1][0]
+                hermano = any(s == sangria and t == tipo for s, t, _ in pila)
+                if sangria_abierta > sangria or (sangria_abierta == sangria and hermano):
+                    pila.pop()
+                    continue
+                break
+
+        # Lo que cuelga de un criterio con puntos es un subcriterio, empiece como empiece
+        anidado = item is not None and any(c.puntos is not None for _, _, c in pila)
+        signo = None if anidado else _signo_regla(contenido, seccion)
+        if signo is not None:
+            destino = rubrica.penalizaciones if signo == "P" else rubrica.bonificaciones
+            puntos, _ = _puntos(contenido.lstrip(" -+−–"))
+            if puntos is None:
+                numero = re.search(_NUMERO, contenido)
+                puntos = _numero(numero.group(1)) if numero else None
+            if puntos:
+                destino.append(ReglaAjuste(f"{signo}{len(destino) + 1}", contenido, puntos))
+            continue
+
+        if item is None:
+            # Prosa: solo cuenta si trae puntos ("Precisión técnica (4), claridad (2)")
+            partes = _partes_con_puntos(contenido)
+            if partes:
+                rubrica.criterios.extend(Criterio(p, puntos) for p, puntos in partes)
+            elif (
+                _PATRON_PUNTOS.search(contenido)
+                and len(contenido) <= MAX_CARACTERES_CRITERIO_PROSA
+                and not _PATRON_ESCALA.search(contenido)
+            ):
+                rubrica.criterios.append(_criterio_de_linea(contenido))
+            continue
+
+        criterio = _criterio_de_linea(contenido)
+        (pila[-1][2].hijos if pila else rubrica.criterios).append(criterio)
+        pila.append((sangria, tipo, criterio))
+
+    for criterio in rubrica.criterios:
+        _repartir(criterio)
+    _asignar_ids(rubrica.criterios)
+    return rubrica
+
+
+def sumar_calificacion(
+    rubrica: Rubrica,
+    puntajes: Dict[str, float],
+    penalizaciones: List[Dict[str, Any]],
+    bonificaciones: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Nota sobre 10 a partir de los puntajes de cada hoja (por id) y de los ajustes
+    ({"razon", "puntos_restados"} / {"razon", "puntos_agregados"}, en puntos de la rúbrica).
+    Cada puntaje se recorta a su máximo y el total a [0, total de la rúbrica]
+    """
+    por_criterio = []
+    obtenido = 0.0
+    for hoja, ruta in rubrica.hojas():
+        puntaje = round(min(max(puntajes.get(hoja.id, 0.0), 0.0), hoja.puntos), 2)
+        obtenido += puntaje
+        por_criterio.append({"id": hoja.id, "criterio": ruta, "puntaje": puntaje, "maximo": hoja.puntos})
+    restado = sum(p["puntos_restados"] for p in penalizaciones)
+    agregado = sum(b["puntos_agregados"] for b in bonificaciones)
+    total = rubrica.total
+    neto = min(max(obtenido - restado + agregado, 0.0), total)
+    return {
+        "calificacion_final": round(10 * neto / total, 2) if total else 0.0,
+        "por_criterio": por_criterio,
+        "obtenido": round(obtenido, 2),
+        "neto": round(neto, 2),
+        "total": total
+    }
@@ -0,0 +1,471 @@
+"""
+Servicio HTTP de evaluación sin interfaz
+Los exámenes enviados se guardan en una cola SQLite local y los procesa un grupo de
+trabajadores con el evaluador compartido (pool_evaluadores), de modo que varios docentes
+o un LMS pueden enviar a la vez sin bloquearse entre sí
+
+Uso:
+    python servidor.py --puerto 8000 --workers 4
+
+    POST /trabajos                    audio + material + rubrica -> {"id", "estado", ...} (202)
+    GET  /trabajos/<id>               estado, etapa en curso y posición en la cola
+    GET  /trabajos/<id>/resultado     resultado de proceso_completo cuando el trabajo termina
+    GET  /salud                       trabajadores y trabajos por estado
+
+POST acepta multipart/form-data (campo de archivo "audio" y campos de texto o archivo
+"material" y "rubrica") o JSON con el audio en base64 ("audio_base64", "nombre_audio").
+Opcionales en ambos: "modo", "idioma", "limpieza" y "limpiar"
+"""
+import os
+import sys
+import json
+import hmac
+import time
+import uuid
+import base64
+import sqlite3
+import logging
+import argparse
+import binascii
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional, Tuple
+
+from engine import MODOS_EVALUACION, PROVEEDORES_LLM, TRANSCRIPTORES
+from limpieza import MODOS_LIMPIEZA
+from progreso import ETAPAS_PROGRESO
+from batch import EXTENSIONES_AUDIO
+from pool_evaluadores import obtener_evaluador
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_TRABAJOS_DEFECTO = (
+    os.getenv("EVALUADOR_TRABAJOS_DIR")
+    or os.path.join(os.path.expanduser("~"), ".evaluador_trabajos")
+)
+ESTADOS_TRABAJO = ("pendiente", "en_proceso", "completado", "error")
+# Tamaño máximo de una solicitud (audio incluido)
+MAX_BYTES_SOLICITUD = 200 * 1024 * 1024
+# Cada cuánto revisa la cola un trabajador ocioso (además del aviso al encolar)
+INTERVALO_SONDEO_S = 2.0
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    etapa TEXT,
+    creado REAL NOT NULL,
+    iniciado REAL,
+    terminado REAL,
+    ruta_audio TEXT NOT NULL,
+    parametros TEXT NOT NULL,
+    resultado TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS trabajos_por_estado ON trabajos (estado, creado);
+"""
+
+
+class ColaTrabajos:
+    """
+    Cola persistente de evaluaciones en SQLite; los audios se guardan en el directorio.
+    Los trabajos que quedaron en proceso al cerrar el servidor vuelven a la cola al abrirla
+    """
+
+    def __init__(self, directorio: str = DIRECTORIO_TRABAJOS_DEFECTO):
+        self.directorio_audios = os.path.join(directorio, "audios")
+        os.makedirs(self.directorio_audios, exist_ok=True)
+        self._conexion = sqlite3.connect(os.path.join(directorio, "trabajos.sqlite3"), check_same_thread=False)
+        self._conexion.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._hay_trabajo = threading.Condition(self._lock)
+        with self._lock, self._conexion:
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.executescript(_ESQUEMA)
+            recuperados = self._conexion.execute(
+                "UPDATE trabajos SET estado = 'pendiente', etapa = NULL, iniciado = NULL WHERE estado = 'en_proceso'"
+            ).rowcount
+        if recuperados:
+            logger.warning(f"{recuperados} trabajos interrumpidos vuelven a la cola")
+
+    def encolar(self, audio: bytes, nombre_audio: str, material_referencia: str, rubrica: str, **opciones: Any) -> str:
+        """Guarda el audio y registra el trabajo como pendiente; devuelve su id"""
+        id_trabajo = uuid.uuid4().hex
+        extension = os.path.splitext(nombre_audio)[1].lower()
+        ruta_audio = os.path.join(self.directorio_audios, f"{id_trabajo}{extension}")
+        with open(ruta_audio, "wb") as f:
+            f.write(audio)
+
+        parametros = {"material_referencia": material_referencia, "rubrica": rubrica, "nombre_audio": nombre_audio, **opciones}
+        with self._hay_trabajo:
+            with self._conexion:
+                self._conexion.execute(
+                    "INSERT INTO trabajos (id, estado, creado, ruta_audio, parametros) VALUES (?, 'pendiente', ?, ?, ?)",
+                    (id_trabajo, time.time(), ruta_audio, json.dumps(parametros, ensure_ascii=False))
+                )
+            self._hay_trabajo.notify()
+        return id_trabajo
+
+    def tomar(self, espera_s: float = INTERVALO_SONDEO_S) -> Optional[Dict[str, Any]]:
+        """El trabajo pendiente más antiguo, ya marcado en proceso; None si no llega ninguno en `espera_s`"""
+        with self._hay_trabajo:
+            for intento in range(2):
+                fila = self._conexion.execute(
+                    "SELECT id, ruta_audio, parametros FROM trabajos WHERE estado = 'pendiente' ORDER BY creado LIMIT 1"
+                ).fetchone()
+                if fila is not None:
+                    with self._conexion:
+                        self._conexion.execute(
+                            "UPDATE trabajos SET estado = 'en_proceso', iniciado = ? WHERE id = ?", (time.time(), fila["id"])
+                        )
+                    return {"id": fila["id"], "ruta_audio": fila["ruta_audio"], **json.loads(fila["parametros"])}
+                if intento == 0:
+                    self._hay_trabajo.wait(espera_s)
+        return None
+
+    def actualizar_etapa(self, id_trabajo: str, etapa: str) -> None:
+        with self._lock, self._conexion:
+            self._conexion.execute("UPDATE trabajos SET etapa = ? WHERE id = ?", (etapa, id_trabajo))
+
+    def terminar(self, id_trabajo: str, resultado: Dict[str, Any]) -> None:
+        exitoso = bool(resultado.get("success"))
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                "UPDATE trabajos SET estado = ?, etapa = NULL, terminado = ?, resultado = ?, error = ? WHERE id = ?",
+                (
+                    "completado" if exitoso else "error",
+                    time.time(),
+                    json.dumps(resultado, ensure_ascii=False, default=str),
+                    None if exitoso else resultado.get("error", "Error desconocido"),
+                    id_trabajo
+                )
+            )
+
+    def estado(self, id_trabajo: str) -> Optional[Dict[str, Any]]:
+        """Estado del trabajo sin el resultado; None si no existe"""
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT id, estado, etapa, creado, iniciado, terminado, error, parametros FROM trabajos WHERE id = ?",
+                (id_trabajo,)
+            ).fetchone()
+            if fila is None:
+                return None
+            estado = {
+                "id": fila["id"],
+                "estado": fila["estado"],
+                "etapa": fila["etapa"],
+                "archivo": json.loads(fila["parametros"]).get("nombre_audio"),
+                "creado": fila["creado"],
+                "iniciado": fila["iniciado"],
+                "terminado": fila["terminado"]
+            }
+            if fila["estado"] == "pendiente":
+                estado["posicion"] = self._conexion.execute(
+                    "SELECT COUNT(*) FROM trabajos WHERE estado = 'pendiente' AND creado <= ?", (fila["creado"],)
+                ).fetchone()[0]
+        if fila["terminado"] and fila["iniciado"]:
+            estado["tiempo_proceso"] = round(fila["terminado"] - fila["iniciado"], 2)
+        if fila["error"]:
+            estado["error"] = fila["error"]
+        return estado
+
+    def resultado(self, id_trabajo: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            fila = self._conexion.execute("SELECT resultado FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+        if fila is None or fila["resultado"] is None:
+            return None
+        return json.loads(fila["resultado"])
+
+    def contar(self) -> Dict[str, int]:
+        with self._lock:
+            filas = self._conexion.execute("SELECT estado, COUNT(*) FROM trabajos GROUP BY estado").fetchall()
+        return {**{estado: 0 for estado in ESTADOS_TRABAJO}, **{fila[0]: fila[1] for fila in filas}}
+
+
+class PoolTrabajadores:
+    """Hilos que toman trabajos de la cola y los evalúan con proceso_completo"""
+
+    def __init__(self, cola: ColaTrabajos, num_trabajadores: int = 2, proveedor: str = "groq", transcriptor: str = "groq"):
+        self.cola = cola
+        self.num_trabajadores = num_trabajadores
+        self.proveedor = proveedor
+        self.transcriptor = transcriptor
+        self._detener = threading.Event()
+        self._hilos: List[threading.Thread] = []
+
+    def iniciar(self) -> None:
+        for i in range(self.num_trabajadores):
+            hilo = threading.Thread(target=self._trabajar, name=f"trabajador-{i + 1}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def detener(self) -> None:
+        """Deja de tomar trabajos; los que estén en curso vuelven a la cola al reiniciar"""
+        self._detener.set()
+
+    def _trabajar(self) -> None:
+        while not self._detener.is_set():
+            trabajo = self.cola.tomar()
+            if trabajo is not None:
+                self._procesar(trabajo)
+
+    def _procesar(self, trabajo: Dict[str, Any]) -> None:
+        id_trabajo = trabajo["id"]
+        logger.info(f"Trabajo {id_trabajo} ({trabajo['nombre_audio']}) en proceso")
+
+        def al_progresar(evento):
+            if evento.etapa in ETAPAS_PROGRESO:
+                self.cola.actualizar_etapa(id_trabajo, evento.etapa)
+
+        try:
+            evaluador = obtener_evaluador(proveedor=self.proveedor, transcriptor=self.transcriptor)
+            resultado = evaluador.proceso_completo(
+                trabajo["ruta_audio"],
+                trabajo["material_referencia"],
+                trabajo["rubrica"],
+                limpiar=trabajo.get("limpiar", True),
+                idioma=trabajo.get("idioma", "es"),
+                modo=trabajo.get("modo", "completo"),
+                modo_limpieza=trabajo.get("modo_limpieza", "auto"),
+                al_progresar=al_progresar
+            )
+        except Exception as e:
+            logger.exception(f"Trabajo {id_trabajo} falló")
+            resultado = {
+                "success": False,
+                "error": f"Error inesperado: {str(e)}"
+            }
+
+        self.cola.terminar(id_trabajo, resultado)
+        try:
+            os.remove(trabajo["ruta_audio"])
+        except OSError:
+            pass
+        logger.info(f"Trabajo {id_trabajo} terminado ({'completado' if resultado.get('success') else 'error'})")
+
+
+class ErrorSolicitud(Exception):
+    def __init__(self, codigo: int, mensaje: str):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+def _campos_multipart(tipo: str, cuerpo: bytes) -> Dict[str, Tuple[Optional[str], bytes]]:
+    """Campos de un multipart/form-data: nombre -> (nombre de archivo o None, contenido)"""
+    mensaje = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + tipo.encode("latin-1") + b"\r\n\r\n" + cuerpo
+    )
+    if not mensaje.is_multipart():
+        raise ErrorSolicitud(400, "Cuerpo multipart inválido")
+    campos = {}
+    for parte in mensaje.iter_parts():
+        nombre = parte.get_param("name", header="content-disposition")
+        if nombre:
+            campos[nombre] = (parte.get_filename(), parte.get_payload(decode=True) or b"")
+    return campos
+
+
+def _leer_envio(tipo: str, cuerpo: bytes) -> Dict[str, Any]:
+    """Audio, material, rúbrica y opciones de un POST /trabajos, validados"""
+    if tipo.startswith("multipart/form-data"):
+        campos = _campos_multipart(tipo, cuerpo)
+        nombre_audio, audio = campos.get("audio", (None, b""))
+        datos = {
+            nombre: contenido.decode("utf-8", errors="replace")
+            for nombre, (_, contenido) in campos.items() if nombre != "audio"
+        }
+    elif tipo.startswith("application/json"):
+        try:
+            datos = json.loads(cuerpo)
+            # b64decode rechaza con TypeError lo que no es texto ("audio_base64": 5)
+            audio = base64.b64decode(datos.pop("audio_base64", ""), validate=True)
+        except (json.JSONDecodeError, UnicodeDecodeError, binascii.Error, AttributeError, TypeError) as e:
+            raise ErrorSolicitud(400, f"JSON inválido: {e}")
+        nombre_audio = datos.pop("nombre_audio", None)
+        if nombre_audio is not None and not isinstance(nombre_audio, str):
+            raise ErrorSolicitud(400, "JSON inválido: 'nombre_audio' debe ser texto")
+    else:
+        raise ErrorSolicitud(415, "Usa multipart/form-data o application/json")
+
+    nombre_audio = os.path.basename(nombre_audio or "")
+    if not audio:
+        raise ErrorSolicitud(400, "Falta el audio")
+    if not nombre_audio.lower().endswith(EXTENSIONES_AUDIO):
+        raise ErrorSolicitud(400, f"El audio debe ser {', '.join(EXTENSIONES_AUDIO)}")
+    for campo in ("material", "rubrica"):
+        valor = datos.get(campo, "")
+        if not isinstance(valor, str):
+            raise ErrorSolicitud(400, f"El campo '{campo}' debe ser texto")
+        if not valor.strip():
+            raise ErrorSolicitud(400, f"Falta el campo '{campo}'")
+
+    modo = datos.get("modo", "completo")
+    modo_limpieza = datos.get("limpieza", "auto")
+    if modo not in MODOS_EVALUACION:
+        raise ErrorSolicitud(400, f"Modo '{modo}' no válido: {', '.join(MODOS_EVALUACION)}")
+    if modo_limpieza not in MODOS_LIMPIEZA:
+        raise ErrorSolicitud(400, f"Limpieza '{modo_limpieza}' no válida: {', '.join(MODOS_LIMPIEZA)}")
+    limpiar = datos.get("limpiar", True)
+    if isinstance(limpiar, str):
+        limpiar = limpiar.strip().lower() not in ("0", "false", "no")
+
+    return {
+        "audio": audio,
+        "nombre_audio": nombre_audio,
+        "material_referencia": datos["material"],
+        "rubrica": datos["rubrica"],
+        "modo": modo,
+        "modo_limpieza": modo_limpieza,
+        "idioma": datos.get("idioma", "es"),
+        "limpiar": bool(limpiar)
+    }
+
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    server: "ServidorEvaluacion"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato: str, *args: Any) -> None:
+        logger.debug(f"{self.address_string()} {formato % args}")
+
+    def _responder(self, codigo: int, datos: Dict[str, Any], cabeceras: Optional[Dict[str, str]] = None) -> None:
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _autorizado(self) -> bool:
+        token = self.server.token
+        if not token:
+            return True
+        enviado = self.headers.get("Authorization", "")
+        return hmac.compare_digest(enviado.encode("utf-8"), f"Bearer {token}".encode("utf-8"))
+
+    def _ruta(self) -> List[str]:
+        return [parte for parte in self.path.split("?", 1)[0].split("/") if parte]
+
+    def do_GET(self) -> None:
+        ruta = self._ruta()
+        if ruta == ["salud"]:
+            self._responder(200, {
+                "estado": "ok",
+                "trabajadores": self.server.trabajadores.num_trabajadores,
+                "trabajos": self.server.cola.contar()
+            })
+            return
+        if not self._autorizado():
+            self._responder(401, {"error": "Token no válido"})
+            return
+        if len(ruta) not in (2, 3) or ruta[0] != "trabajos" or (len(ruta) == 3 and ruta[2] != "resultado"):
+            self._responder(404, {"error": "Ruta no encontrada"})
+            return
+
+        estado = self.server.cola.estado(ruta[1])
+        if estado is None:
+            self._responder(404, {"error": "Trabajo no encontrado"})
+        elif len(ruta) == 2:
+            self._responder(200, estado)
+        elif estado["estado"] in ("pendiente", "en_proceso"):
+            self._responder(409, {"error": "El trabajo aún no termina", **estado}, {"Retry-After": "5"})
+        else:
+            self._responder(200, self.server.cola.resultado(ruta[1]) or {})
+
+    def do_POST(self) -> None:
+        if self._ruta() != ["trabajos"]:
+            self._responder(404, {"error": "Ruta no encontrada"})
+            return
+        if not self._autorizado():
+            self._responder(401, {"error": "Token no válido"})
+            return
+        try:
+            longitud = int(self.headers.get("Content-Length", 0))
+            if longitud < 0:
+                # rfile.read(-n) esperaría al cierre de la conexión
+                self.close_connection = True
+                raise ErrorSolicitud(400, "Content-Length inválido")
+            if longitud > MAX_BYTES_SOLICITUD:
+                # El cuerpo no se lee: la conexión no puede reutilizarse
+                self.close_connection = True
+                raise ErrorSolicitud(413, f"La solicitud supera {MAX_BYTES_SOLICITUD // (1024 * 1024)} MB")
+            envio = _leer_envio(self.headers.get("Content-Type", ""), self.rfile.read(longitud))
+        except ErrorSolicitud as e:
+            self._responder(e.codigo, {"error": str(e)})
+            return
+        except ValueError:
+            self._responder(400, {"error": "Content-Length inválido"})
+            return
+
+        id_trabajo = self.server.cola.encolar(
+            envio.pop("audio"), envio.pop("nombre_audio"), envio.pop("material_referencia"), envio.pop("rubrica"), **envio
+        )
+        url = f"/trabajos/{id_trabajo}"
+        self._responder(
+            202,
+            {"id": id_trabajo, "estado": "pendiente", "url_estado": url, "url_resultado": f"{url}/resultado"},
+            {"Location": url}
+        )
+
+
+class ServidorEvaluacion(ThreadingHTTPServer):
+    """Servidor HTTP con su cola de trabajos y su grupo de trabajadores"""
+    daemon_threads = True
+
+    def __init__(
+        self,
+        direccion: Tuple[str, int],
+        cola: ColaTrabajos,
+        trabajadores: PoolTrabajadores,
+        token: Optional[str] = None
+    ):
+        super().__init__(direccion, ManejadorAPI)
+        self.cola = cola
+        self.trabajadores = trabajadores
+        self.token = token
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP de evaluación de exámenes orales con cola de trabajos")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección en la que escuchar")
+    parser.add_argument("--puerto", type=int, default=8000, help="Puerto HTTP")
+    parser.add_argument("--workers", type=int, default=2, help="Evaluaciones simultáneas")
+    parser.add_argument("--proveedor", default="groq", choices=PROVEEDORES_LLM, help="Proveedor LLM")
+    parser.add_argument("--transcriptor", default="groq", choices=TRANSCRIPTORES, help="Backend de transcripción")
+    parser.add_argument("--directorio", default=DIRECTORIO_TRABAJOS_DEFECTO, help="Directorio de la cola y los audios")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar cada solicitud y etapa")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    try:
+        # Falla al arrancar, no en el primer trabajo, si faltan claves o dependencias
+        obtener_evaluador(proveedor=args.proveedor, transcriptor=args.transcriptor)
+    except (ValueError, ImportError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    cola = ColaTrabajos(args.directorio)
+    trabajadores = PoolTrabajadores(cola, args.workers, args.proveedor, args.transcriptor)
+    token = os.getenv("EVALUADOR_TOKEN")
+    servidor = ServidorEvaluacion((args.host, args.puerto), cola, trabajadores, token)
+    trabajadores.iniciar()
+
+    print(f"📍 Servicio de evaluación en http://{args.host}:{args.puerto} ({args.workers} trabajadores)")
+    if not token:
+        print("⚠️ Sin EVALUADOR_TOKEN: cualquiera con acceso a la red puede enviar trabajos")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        trabajadores.detener()
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
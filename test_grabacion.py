@@ -0,0 +1,64 @@
+"""Pruebas de grabacion.py: una evaluación grabada se reproduce sin red con el mismo resultado"""
+import pytest
+
+from backends import MODELOS_LLM, SolicitudLLM
+from benchmark_pipeline import BackendSimulado, TranscriptorSimulado, texto_sintetico
+from engine import EvaluadorEngine
+from grabacion import (
+    BackendLLMGrabado, BackendTranscripcionGrabado, GrabacionNoEncontrada, LatenciaSimulada, evaluador_grabado
+)
+from planificador import Planificador
+from test_rubrica import rubrica_de_ejemplo
+
+MATERIAL = "La fotosíntesis ocurre en los cloroplastos y transforma la energía luminosa en energía química."
+
+
+class BackendGroqSimulado(BackendSimulado):
+    """El simulado con el modelo de groq, para que la reproducción busque las mismas claves"""
+    modelo = MODELOS_LLM["groq"]
+
+
+def grabar(directorio, rubrica, transcripcion, modo="completo"):
+    motor = EvaluadorEngine(
+        proveedor="groq",
+        usar_cache=False,
+        planificador=Planificador(),
+        backends_llm={"groq": BackendLLMGrabado(directorio, BackendGroqSimulado(LatenciaSimulada()), "grabar")},
+        backend_transcripcion=BackendTranscripcionGrabado(directorio, TranscriptorSimulado(), "grabar")
+    )
+    return motor.evaluar_examen(MATERIAL, rubrica, transcripcion, modo=modo)
+
+
+@pytest.mark.parametrize("modo", ["completo", "rapido"])
+def test_reproducir_evaluar_examen(tmp_path, modo):
+    rubrica = rubrica_de_ejemplo("biologia")
+    transcripcion = texto_sintetico(300)
+    grabado = grabar(str(tmp_path), rubrica, transcripcion, modo)
+    assert grabado["success"]
+
+    reproducido = evaluador_grabado(str(tmp_path), "reproducir").evaluar_examen(MATERIAL, rubrica, transcripcion, modo=modo)
+    assert reproducido["success"]
+    assert reproducido["evaluacion"] == grabado["evaluacion"]
+    assert reproducido["evaluacion"]["calificacion_final"] is not None
+
+
+def test_reproducir_sin_grabacion_falla(tmp_path):
+    rubrica = rubrica_de_ejemplo("biologia")
+    grabar(str(tmp_path), rubrica, texto_sintetico(300))
+
+    motor = evaluador_grabado(str(tmp_path), "reproducir")
+    with pytest.raises(GrabacionNoEncontrada):
+        motor.backends_llm["groq"].completar(SolicitudLLM("Una etapa que no se grabó", "nada"))
+
+
+def test_reproduce_con_el_transcriptor_que_grabo(tmp_path):
+    audio = tmp_path / "examen.mp3"
+    audio.write_bytes(b"audio de prueba")
+    grabado = BackendTranscripcionGrabado(str(tmp_path), TranscriptorSimulado(), "grabar").transcribir(str(audio), "es")
+
+    motor = evaluador_grabado(str(tmp_path), "reproducir")
+    assert motor.transcriptor.nombre == TranscriptorSimulado.nombre
+    assert motor.transcriptor.transcribir(str(audio), "es").texto == grabado.texto
+
+    with pytest.raises(ValueError):
+        evaluador_grabado(str(tmp_path), "reproducir", transcriptor="local")
@@ -0,0 +1,61 @@
+"""Pruebas de json_incremental.py: valores emitidos por ruta a medida que llega el texto"""
+import json
+
+import pytest
+
+from json_incremental import ParserJSONIncremental
+
+RESPUESTA = json.dumps({
+    "calificacion_por_criterio": [
+        {"criterio": "Precisión \"técnica\"", "puntaje": 2.5, "comentario": "Bien: {sin} [llaves]"},
+        {"criterio": "Claridad", "puntaje": 3, "comentario": "Línea\nnueva"}
+    ],
+    "penalizaciones": [],
+    "aprobado": True,
+    "nota_extra": None
+}, ensure_ascii=False)
+
+
+def alimentar_por_trozos(parser, texto, tamano):
+    emitidos = []
+    for i in range(0, len(texto), tamano):
+        emitidos.extend(parser.alimentar(texto[i:i + tamano]))
+    return emitidos
+
+
+@pytest.mark.parametrize("tamano", [1, 3, 7, len(RESPUESTA)])
+def test_resultado_igual_a_json_loads(tamano):
+    parser = ParserJSONIncremental()
+    emitidos = alimentar_por_trozos(parser, RESPUESTA, tamano)
+    assert parser.resultado == json.loads(RESPUESTA)
+    assert ("calificacion_por_criterio.0.puntaje", 2.5) in emitidos
+    assert ("calificacion_por_criterio.1.comentario", "Línea\nnueva") in emitidos
+    assert ("aprobado", True) in emitidos
+    assert ("nota_extra", None) in emitidos
+
+
+def test_hojas_antes_que_sus_contenedores():
+    parser = ParserJSONIncremental()
+    rutas = [ruta for ruta, _ in alimentar_por_trozos(parser, RESPUESTA, 1)]
+    assert rutas.index("calificacion_por_criterio.0.puntaje") < rutas.index("calificacion_por_criterio.0")
+    assert rutas.index("calificacion_por_criterio.0") < rutas.index("calificacion_por_criterio.1.criterio")
+    assert rutas.index("calificacion_por_criterio.1") < rutas.index("calificacion_por_criterio")
+    assert dict(alimentar_por_trozos(ParserJSONIncremental(), RESPUESTA, 5))["penalizaciones"] == []
+
+
+def test_sin_contenedores_solo_emite_escalares():
+    parser = ParserJSONIncremental(emitir_contenedores=False)
+    emitidos = alimentar_por_trozos(parser, RESPUESTA, 4)
+    assert all(not isinstance(valor, (dict, list)) for _, valor in emitidos)
+    assert [ruta for ruta, _ in emitidos if ruta.startswith("calificacion_por_criterio.0.")] == [
+        "calificacion_por_criterio.0.criterio", "calificacion_por_criterio.0.puntaje",
+        "calificacion_por_criterio.0.comentario"
+    ]
+    assert parser.resultado == json.loads(RESPUESTA)
+
+
+def test_ignora_el_bloque_de_codigo_alrededor():
+    parser = ParserJSONIncremental()
+    emitidos = alimentar_por_trozos(parser, f"```json\n{RESPUESTA}\n```", 2)
+    assert parser.resultado == json.loads(RESPUESTA)
+    assert ("calificacion_por_criterio.1.puntaje", 3) in emitidos
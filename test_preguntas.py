@@ -0,0 +1,62 @@
+"""Pruebas de preguntas.py: división de la transcripción en respuestas y asignación a los ítems de la rúbrica"""
+from preguntas import dividir_respuestas, asignar_respuestas, items_rubrica
+from test_rubrica import rubrica_de_ejemplo
+
+DEFINICION = "La fotosíntesis transforma la luz en energía química dentro de la planta verde."
+UBICACION = "Ocurre en los cloroplastos, que tienen clorofila para captar la luz del sol."
+
+ITEMS = [
+    {"numero": 1, "texto": "Definición de fotosíntesis: energía química a partir de la luz", "puntos": 5},
+    {"numero": 2, "texto": "Ubicación del proceso: cloroplastos y clorofila", "puntos": 5}
+]
+
+
+def test_divide_por_marcadores_numericos():
+    respuestas = dividir_respuestas(f"Pregunta 1. {DEFINICION} Pregunta 2. {UBICACION}")
+    assert [r["numero"] for r in respuestas] == [1, 2]
+    assert respuestas[0]["texto"] == f"Pregunta 1. {DEFINICION}"
+    assert respuestas[1]["texto"] == f"Pregunta 2. {UBICACION}"
+
+
+def test_divide_por_marcadores_ordinales():
+    respuestas = dividir_respuestas(f"Bueno, {DEFINICION} ¿Y la segunda pregunta? {UBICACION}")
+    assert [r["numero"] for r in respuestas] == [None, 2]
+    assert respuestas[1]["texto"].endswith(UBICACION)
+
+
+def test_divide_por_pausas_largas():
+    segmentos = [
+        {"inicio": 0.0, "fin": 5.0, "texto": DEFINICION},
+        {"inicio": 11.0, "fin": 15.0, "texto": UBICACION}
+    ]
+    texto = f"{DEFINICION} {UBICACION}"
+    assert [r["texto"] for r in dividir_respuestas(texto, segmentos)] == [DEFINICION, UBICACION]
+    # Una pausa menor que el umbral no separa respuestas
+    assert [r["texto"] for r in dividir_respuestas(texto, segmentos, pausa_s=10)] == [texto]
+
+
+def test_sin_marcadores_ni_pausas_es_una_sola_respuesta():
+    assert dividir_respuestas(f"{DEFINICION} {UBICACION}") == [{"texto": f"{DEFINICION} {UBICACION}", "numero": None}]
+
+
+def test_asigna_por_numero_dicho():
+    asignadas = asignar_respuestas([{"texto": "B", "numero": 2}, {"texto": "A", "numero": 1}], ITEMS)
+    assert [(a["numero"], a["respuesta"], a["puntos"]) for a in asignadas] == [(1, "A", 5), (2, "B", 5)]
+
+
+def test_asigna_por_posicion_si_coinciden_en_cantidad():
+    asignadas = asignar_respuestas([{"texto": "A", "numero": None}, {"texto": "B", "numero": None}], ITEMS)
+    assert [a["respuesta"] for a in asignadas] == ["A", "B"]
+
+
+def test_asigna_por_similitud_lexica():
+    asignadas = asignar_respuestas([{"texto": "Sucede en los cloroplastos gracias a la clorofila", "numero": None}], ITEMS)
+    assert asignadas[0]["respuesta"] == ""
+    assert asignadas[1]["respuesta"] == "Sucede en los cloroplastos gracias a la clorofila"
+
+
+def test_items_de_una_rubrica_de_ejemplo():
+    items = items_rubrica(rubrica_de_ejemplo("matematicas"))
+    assert [i["numero"] for i in items] == [1, 2, 3, 4, 5]
+    assert items[0]["texto"].startswith("Enunciado del teorema")
+    assert sum(i["puntos"] for i in items) == 10
@@ -0,0 +1,153 @@
+"""Pruebas de rubrica.py: árbol de criterios, reglas de ajuste y suma local de la nota"""
+import os
+
+import pytest
+
+from rubrica import parsear_rubrica, sumar_calificacion
+
+DIRECTORIO_EJEMPLOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ejemplos")
+
+
+def rubrica_de_ejemplo(nombre: str) -> str:
+    """La sección "## Rúbrica de Evaluación" de ejemplos/ejemplo_<nombre>.md, como la pegaría el docente"""
+    with open(os.path.join(DIRECTORIO_EJEMPLOS, f"ejemplo_{nombre}.md"), encoding="utf-8") as f:
+        texto = f.read()
+    return texto.split("## Rúbrica de Evaluación", 1)[1].split("\n## ", 1)[0]
+
+
+def nota(rubrica, puntajes=None, penalizaciones=(), bonificaciones=()):
+    if puntajes is None:
+        puntajes = {hoja.id: hoja.puntos for hoja, _ in rubrica.hojas()}
+    return sumar_calificacion(rubrica, puntajes, list(penalizaciones), list(bonificaciones))["calificacion_final"]
+
+
+@pytest.mark.parametrize("nombre", ["biologia", "historia", "matematicas"])
+def test_rubricas_de_ejemplo(nombre):
+    rubrica = parsear_rubrica(rubrica_de_ejemplo(nombre))
+    assert rubrica.total_declarado == 10
+    assert rubrica.total == 10
+    assert rubrica.calificable
+    assert not rubrica.penalizaciones and not rubrica.bonificaciones
+    for hoja, ruta in rubrica.hojas():
+        assert "Total" not in ruta
+        assert "*" not in ruta
+    # Quien obtiene todos los puntos de los criterios tiene un 10
+    assert nota(rubrica) == 10
+
+
+def test_arbol_de_matematicas():
+    rubrica = parsear_rubrica(rubrica_de_ejemplo("matematicas"))
+    assert [c.texto for c in rubrica.criterios] == [
+        "Enunciado del teorema", "Fórmula correcta", "Identificación de elementos",
+        "Ejemplo numérico correcto", "Aplicación práctica"
+    ]
+    assert [(h.id, h.puntos) for h, _ in rubrica.hojas()] == [
+        ("1.1", 1), ("1.2", 1), ("2.1", 2), ("3.1", 1), ("3.2", 1), ("4.1", 1), ("4.2", 1), ("4.3", 1), ("5.1", 1)
+    ]
+
+
+def test_un_anio_entre_parentesis_no_son_puntos():
+    rubrica = parsear_rubrica(rubrica_de_ejemplo("historia"))
+    bastilla = [(h, ruta) for h, ruta in rubrica.hojas() if "Bastilla" in ruta]
+    assert len(bastilla) == 1
+    hoja, _ = bastilla[0]
+    assert hoja.puntos == 1
+    assert hoja.texto == "Toma de la Bastilla (1789)"
+
+
+def test_total_en_markdown_no_es_criterio():
+    rubrica = parsear_rubrica("## Rúbrica\n\n**Total: 10 puntos**\n\n1. **Precisión** (6 puntos)\n2. _Claridad_ (4 puntos)")
+    assert rubrica.total_declarado == 10
+    assert [(c.texto, c.puntos) for c in rubrica.criterios] == [("Precisión", 6), ("Claridad", 4)]
+
+
+def test_total_declarado_distinto_no_se_suma_localmente():
+    rubrica = parsear_rubrica("Total: 10 puntos\n1. Precisión (6 puntos)\n2. Claridad (2 puntos)")
+    assert rubrica.total == 8
+    assert not rubrica.calificable
+
+
+def test_subcriterios_que_parecen_reglas_son_criterios():
+    rubrica = parsear_rubrica(
+        "1. Operaciones (4 pts)\n"
+        "   - Suma correcta (2 pts)\n"
+        "   - Resta correcta (2 pts)\n"
+        "2. Extra: notación (2 pts)\n"
+        "3. Adicional: unidades (1 pt)"
+    )
+    assert [(h.texto, h.puntos) for h, _ in rubrica.hojas()] == [
+        ("Suma correcta", 2), ("Resta correcta", 2), ("Extra: notación", 2), ("Adicional: unidades", 1)
+    ]
+    assert rubrica.total == 7
+    assert not rubrica.penalizaciones and not rubrica.bonificaciones
+
+
+def test_reglas_con_signo_o_palabra_clave():
+    rubrica = parsear_rubrica(
+        "1. Precisión (6 pts)\n"
+        "2. Claridad (4 pts)\n"
+        "-0.5 por cada muletilla\n"
+        "+1 si da un ejemplo propio\n"
+        "Penalización: confundir estomas con estroma (1 punto)\n"
+        "Se restan 2 puntos por copiar del material"
+    )
+    assert rubrica.total == 10
+    assert [(r.id, r.puntos) for r in rubrica.penalizaciones] == [("P1", 0.5), ("P2", 1), ("P3", 2)]
+    assert [(r.id, r.puntos) for r in rubrica.bonificaciones] == [("B1", 1)]
+
+
+def test_reglas_bajo_encabezado():
+    rubrica = parsear_rubrica(
+        "1. Precisión (6 pts)\n"
+        "2. Claridad (4 pts)\n"
+        "\n"
+        "### Penalizaciones\n"
+        "- Confunde mitocondrias con cloroplastos (1 punto)\n"
+        "- Resta mal (0.5 pts)\n"
+        "Bonificaciones:\n"
+        "- Relaciona con la respiración celular (0.5 pts)"
+    )
+    assert [c.texto for c in rubrica.criterios] == ["Precisión", "Claridad"]
+    assert [(r.texto, r.puntos) for r in rubrica.penalizaciones] == [
+        ("Confunde mitocondrias con cloroplastos (1 punto)", 1), ("Resta mal (0.5 pts)", 0.5)
+    ]
+    assert [r.puntos for r in rubrica.bonificaciones] == [0.5]
+
+
+def test_varios_criterios_en_una_linea():
+    rubrica = parsear_rubrica("1. Fases: luminosa (3 pts) – oscura (3 pts)\n2. Lugar (4 pts)")
+    fases = rubrica.criterios[0]
+    assert fases.texto == "Fases"
+    assert [(h.texto, h.puntos) for h in fases.hijos] == [("luminosa", 3), ("oscura", 3)]
+    assert rubrica.total == 10
+
+
+def test_hijos_sin_puntos_se_reparten_lo_que_falta():
+    rubrica = parsear_rubrica("1. Fases (4 pts)\n   - Luminosa\n   - Oscura\n2. Lugar (6 pts)")
+    assert [h.puntos for h, _ in rubrica.hojas()] == [2, 2, 6]
+
+
+def test_prosa_sin_puntos_no_es_calificable():
+    rubrica = parsear_rubrica("Evalúa la precisión técnica y la claridad de la explicación del alumno.")
+    assert not rubrica.criterios
+    assert not rubrica.calificable
+
+
+def test_sumar_calificacion_recorta_y_aplica_ajustes():
+    rubrica = parsear_rubrica("1. Precisión (6 pts)\n2. Claridad (4 pts)")
+    suma = sumar_calificacion(
+        rubrica, {"1": 9.0, "2": 2.0}, [{"razon": "muletillas", "puntos_restados": 1.0}], []
+    )
+    # La precisión se recorta a 6: 6 + 2 - 1 = 7 de 10
+    assert [c["puntaje"] for c in suma["por_criterio"]] == [6, 2]
+    assert suma["obtenido"] == 8
+    assert suma["neto"] == 7
+    assert suma["calificacion_final"] == 7
+
+    assert nota(rubrica, {"1": 1.0, "2": 0.0}, [{"razon": "plagio", "puntos_restados": 5.0}]) == 0
+    assert nota(rubrica, None, [], [{"razon": "ejemplo propio", "puntos_agregados": 2.0}]) == 10
+
+
+def test_escala_sobre_veinte():
+    rubrica = parsear_rubrica("1. Precisión (12 pts)\n2. Claridad (8 pts)")
+    assert nota(rubrica, {"1": 12.0, "2": 4.0}) == 8